@@ -0,0 +1,94 @@
+"""Benchmark decoding and compiling ``/flags/definitions`` payloads.
+
+Compares the original path (``json.loads`` of the text, full
+``ExperimentationFlags`` validation, compile everything) with the
+``DefinitionsCompiler`` path on a cold cache and on an unchanged payload.
+
+    python benchmarks/definitions_parsing.py
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+
+from mixpanel.flags.plans import DefinitionsCompiler, compile_definitions
+from mixpanel.flags.types import ExperimentationFlags
+
+FLAG_COUNTS = (10, 100, 1000, 5000)
+REPEATS = 5
+
+
+def make_payload(flag_count: int) -> bytes:
+    flags = [
+        {
+            "id": f"id-{index}",
+            "name": f"Flag {index}",
+            "key": f"flag_{index}",
+            "status": "active",
+            "project_id": 1,
+            "context": "distinct_id",
+            "ruleset": {
+                "variants": [
+                    {"key": "control", "value": False, "is_control": True, "split": 50},
+                    {
+                        "key": "treatment",
+                        "value": True,
+                        "is_control": False,
+                        "split": 50,
+                    },
+                ],
+                "rollout": [
+                    {
+                        "rollout_percentage": 100,
+                        "runtime_evaluation_rule": {"==": [{"var": "plan"}, "premium"]},
+                    }
+                ],
+                "test": {"users": {"qa-user": "treatment"}},
+            },
+            "hash_salt": f"salt{index}",
+        }
+        for index in range(flag_count)
+    ]
+    return json.dumps({"flags": flags}).encode("utf-8")
+
+
+def baseline(content: bytes) -> None:
+    flags = ExperimentationFlags.model_validate(json.loads(content.decode())).flags
+    compile_definitions(flags)
+
+
+def measure(function, content: bytes) -> tuple[float, float]:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(content)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings) * 1000, peak / 1024
+
+
+def main() -> None:
+    print(f"{'flags':>6} {'path':<10} {'best ms':>9} {'peak KiB':>10}")
+    for flag_count in FLAG_COUNTS:
+        content = make_payload(flag_count)
+
+        warm_compiler = DefinitionsCompiler()
+        warm_compiler.compile_payload(content)
+        paths = {
+            "baseline": baseline,
+            "cold": lambda payload: DefinitionsCompiler().compile_payload(payload),
+            "unchanged": warm_compiler.compile_payload,
+        }
+        for name, function in paths.items():
+            millis, peak_kib = measure(function, content)
+            print(f"{flag_count:>6} {name:<10} {millis:>9.2f} {peak_kib:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
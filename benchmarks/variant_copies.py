@@ -0,0 +1,115 @@
+"""Benchmark the per-evaluation variant copies and remote response decoding.
+
+Compares ``model_copy(update=...)``, which ``with_source`` and
+``as_fallback`` used to call, with the current tagged copy, and the
+original remote decoding (``json.loads``, ``model_validate``, then one
+``with_source`` copy per flag) with ``_handle_response``.
+
+    python benchmarks/variant_copies.py
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+
+import httpx
+
+from mixpanel.flags.remote_feature_flags import RemoteFeatureFlagsProvider
+from mixpanel.flags.types import (
+    FallbackReason,
+    RemoteFlagsConfig,
+    RemoteFlagsResponse,
+    SelectedVariant,
+    VariantSource,
+)
+
+COPIES = 100_000
+RESPONSES = 2_000
+FLAGS_PER_RESPONSE = 50
+
+VARIANT = SelectedVariant(
+    variant_key="treatment",
+    variant_value=True,
+    experiment_id="exp",
+    is_experiment_active=True,
+    variant_source=VariantSource.LOCAL,
+)
+
+
+def model_copy_fallback(variant: SelectedVariant) -> SelectedVariant:
+    return variant.model_copy(
+        update={
+            "variant_source": VariantSource.FALLBACK,
+            "fallback_reason": FallbackReason.no_rollout_match(),
+        }
+    )
+
+
+def tagged_fallback(variant: SelectedVariant) -> SelectedVariant:
+    return variant.as_fallback(FallbackReason.no_rollout_match())
+
+
+def make_response() -> httpx.Response:
+    flags = {
+        f"flag_{index}": {
+            "variant_key": "treatment",
+            "variant_value": True,
+            "experiment_id": f"exp-{index}",
+            "is_experiment_active": True,
+        }
+        for index in range(FLAGS_PER_RESPONSE)
+    }
+    return httpx.Response(
+        200,
+        content=json.dumps({"code": 200, "flags": flags}).encode(),
+        request=httpx.Request("GET", "https://api.mixpanel.com/flags"),
+    )
+
+
+def original_decoding(response: httpx.Response) -> dict[str, SelectedVariant]:
+    flags = RemoteFlagsResponse.model_validate(response.json()).flags
+    return {
+        key: variant.model_copy(
+            update={"variant_source": VariantSource.REMOTE, "fallback_reason": None}
+        )
+        for key, variant in flags.items()
+    }
+
+
+def measure(function, argument, iterations: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    micros = (time.perf_counter() - start) / iterations * 1_000_000
+
+    tracemalloc.start()
+    results = [function(argument) for _ in range(100)]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return micros, peak / 100
+
+
+def main() -> None:
+    provider = RemoteFeatureFlagsProvider(
+        "token", RemoteFlagsConfig(), "1.0.0", lambda *_args: None
+    )
+    response = make_response()
+    cases = [
+        ("variant model_copy", model_copy_fallback, VARIANT, COPIES),
+        ("variant tagged copy", tagged_fallback, VARIANT, COPIES),
+        ("response original", original_decoding, response, RESPONSES),
+        ("response current", provider._handle_response, response, RESPONSES),  # noqa: SLF001
+    ]
+
+    print(f"{'case':<22} {'us/call':>9} {'bytes/call':>11}")
+    for name, function, argument, iterations in cases:
+        micros, allocated = measure(function, argument, iterations)
+        print(f"{name:<22} {micros:>9.2f} {allocated:>11.0f}")
+    provider.shutdown()
+
+
+if __name__ == "__main__":
+    main()
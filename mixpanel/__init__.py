@@ -27,6 +27,7 @@ from requests.auth import HTTPBasicAuth
 
 from .credentials import ServiceAccountCredentials
 from .flags.local_feature_flags import LocalFeatureFlagsProvider
+from .flags.manager import LocalFlagsManager
 from .flags.remote_feature_flags import RemoteFeatureFlagsProvider
 from .flags.types import LocalFlagsConfig, RemoteFlagsConfig
 
@@ -34,6 +35,9 @@ __version__ = "5.3.0"
 
 logger = logging.getLogger(__name__)
 
+# Most events the /track endpoint accepts in one request.
+MAX_EVENTS_PER_REQUEST = 50
+
 
 class DatetimeSerializer(json.JSONEncoder):
     def default(self, obj):
@@ -59,6 +63,9 @@ class Mixpanel:
         JSON serialization (default :class:`~.DatetimeSerializer`)
     :param ServiceAccountCredentials credentials: Optional service account
         credentials for authentication. Recommended for server-side integrations.
+    :param LocalFlagsManager flags_manager: Optional manager that polls the
+        local flag definitions of many projects with one thread and one HTTP
+        connection pool, used instead of a thread and clients per instance.
 
     See `Built-in consumers`_ for details about the consumer interface.
 
@@ -74,6 +81,7 @@ class Mixpanel:
         local_flags_config: Optional[LocalFlagsConfig] = None,
         remote_flags_config: Optional[RemoteFlagsConfig] = None,
         credentials: Optional[ServiceAccountCredentials] = None,
+        flags_manager: Optional[LocalFlagsManager] = None,
     ):
         self._token = token
         self._credentials = credentials
@@ -94,12 +102,23 @@ class Mixpanel:
 
         if local_flags_config:
             self._local_flags_provider = LocalFeatureFlagsProvider(
-                self._token, local_flags_config, __version__, self.track, credentials
+                self._token,
+                local_flags_config,
+                __version__,
+                self.track,
+                credentials,
+                batch_tracker=self._track_batch,
+                manager=flags_manager,
             )
 
         if remote_flags_config:
             self._remote_flags_provider = RemoteFeatureFlagsProvider(
-                self._token, remote_flags_config, __version__, self.track, credentials
+                self._token,
+                remote_flags_config,
+                __version__,
+                self.track,
+                credentials,
+                batch_tracker=self._track_batch,
             )
 
     def _now(self):
@@ -139,6 +158,36 @@ class Mixpanel:
         aspects of the source or user associated with it. ``meta`` is used
         (rarely) to override special values sent in the event object.
         """
+        event = self._make_event(distinct_id, event_name, properties, meta)
+        self._consumer.send("events", json_dumps(event, cls=self._serializer))
+
+    def _track_batch(self, event_name, events):
+        """Record many events with the same name in as few requests as possible.
+
+        The events are sent in batches of up to 50 when using the default
+        :class:`~.Consumer`; other consumers receive them one at a time and
+        may buffer them on their own.
+
+        :param str event_name: a name describing the events
+        :param list events: ``(distinct_id, properties)`` pairs, one per event
+        """
+        messages = [
+            json_dumps(
+                self._make_event(distinct_id, event_name, properties),
+                cls=self._serializer,
+            )
+            for distinct_id, properties in events
+        ]
+        if not isinstance(self._consumer, Consumer):
+            for message in messages:
+                self._consumer.send("events", message)
+            return
+
+        for start in range(0, len(messages), MAX_EVENTS_PER_REQUEST):
+            batch = messages[start : start + MAX_EVENTS_PER_REQUEST]
+            self._consumer.send("events", "[{}]".format(",".join(batch)))
+
+    def _make_event(self, distinct_id, event_name, properties=None, meta=None):
         all_properties = {
             "token": self._token,
             "distinct_id": distinct_id,
@@ -155,7 +204,7 @@ class Mixpanel:
         }
         if meta:
             event.update(meta)
-        self._consumer.send("events", json_dumps(event, cls=self._serializer))
+        return event
 
     def import_data(
         self,
@@ -0,0 +1,118 @@
+"""NumPy-vectorized variant assignment for many context values at once.
+
+NumPy is an optional dependency (``pip install mixpanel[numpy]``); it is
+only imported when one of these helpers is called.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from .utils import FNV1A64_OFFSET_BASIS, FNV1A64_PRIME
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import numpy as np
+
+    from .plans import RolloutPlan
+
+# Variant index used for values that are not assigned any variant.
+NO_VARIANT = -1
+
+# Rows hashed per batch; bounds the size of the padded byte matrix.
+_CHUNK_SIZE = 1 << 16
+
+
+class BulkAssignment(NamedTuple):
+    """Variant assignments for a batch of context values.
+
+    ``variant_indices[i]`` indexes into ``variant_keys`` for the i-th input
+    value, or is ``NO_VARIANT`` when the value falls back.
+    """
+
+    variant_keys: tuple[str, ...]
+    variant_indices: np.ndarray
+
+
+def import_numpy() -> Any:
+    try:
+        import numpy as np  # noqa: PLC0415 - optional dependency
+    except ImportError as exc:
+        raise ImportError(
+            "Bulk flag assignment requires numpy. "
+            "Install it with 'pip install mixpanel[numpy]'."
+        ) from exc
+    return np
+
+
+def fnv1a64_many(values: Sequence[str]) -> np.ndarray:
+    """FNV-1a 64-bit state of each UTF-8 encoded value, as a uint64 array.
+
+    The returned states can be extended with a salt via ``extend_fnv1a64_many``.
+    """
+    np = import_numpy()
+    states = np.empty(len(values), dtype=np.uint64)
+    for start in range(0, len(values), _CHUNK_SIZE):
+        chunk = values[start : start + _CHUNK_SIZE]
+        states[start : start + len(chunk)] = _fnv1a64_chunk(np, chunk)
+    return states
+
+
+def extend_fnv1a64_many(states: np.ndarray, data: bytes) -> np.ndarray:
+    """Continue FNV-1a hashing of every state in ``states`` with ``data``."""
+    np = import_numpy()
+    prime = np.uint64(FNV1A64_PRIME)
+    extended = states.copy()
+    for byte in data:
+        extended ^= np.uint64(byte)
+        extended *= prime
+    return extended
+
+
+def normalized_hash_many(states: np.ndarray, salt: bytes) -> np.ndarray:
+    """Vectorized ``normalized_hash_from_state`` for states from ``fnv1a64_many``."""
+    np = import_numpy()
+    hashed = extend_fnv1a64_many(states, salt)
+    return (hashed % np.uint64(100)).astype(np.float64) / 100.0
+
+
+def select_variants_many(
+    rollout_plan: RolloutPlan, variant_hashes: np.ndarray
+) -> np.ndarray:
+    """Vectorized ``select_variant``: split table index for each variant hash."""
+    np = import_numpy()
+    thresholds = np.array([cumulative for cumulative, _ in rollout_plan.split_table])
+    below = variant_hashes[:, None] < thresholds
+    return np.where(below.any(axis=1), below.argmax(axis=1), len(thresholds) - 1)
+
+
+def _fnv1a64_chunk(np: Any, values: Sequence[str]) -> np.ndarray:
+    encoded = [value.encode("utf-8") for value in values]
+    lengths = np.fromiter(map(len, encoded), dtype=np.intp, count=len(encoded))
+
+    # Longest values first, so the rows still consuming bytes at column `i`
+    # are always a prefix of the batch.
+    order = np.argsort(-lengths, kind="stable")
+    lengths = lengths[order]
+    max_length = int(lengths[0]) if len(lengths) else 0
+
+    padded = np.zeros((len(encoded), max_length), dtype=np.uint8)
+    mask = np.arange(max_length) < lengths[:, None]
+    padded[mask] = np.frombuffer(
+        b"".join(encoded[index] for index in order), dtype=np.uint8
+    )
+
+    prime = np.uint64(FNV1A64_PRIME)
+    sorted_states = np.full(len(encoded), FNV1A64_OFFSET_BASIS, dtype=np.uint64)
+    # Number of values longer than each column index.
+    active_rows = np.searchsorted(-lengths, -np.arange(max_length), side="left")
+    for column in range(max_length):
+        active = int(active_rows[column])
+        rows = sorted_states[:active]
+        rows ^= padded[:active, column]
+        rows *= prime
+
+    states = np.empty_like(sorted_states)
+    states[order] = sorted_states
+    return states
@@ -0,0 +1,189 @@
+"""Bounded caches of local flag evaluation results and remote flag responses."""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_ABSENT = ("absent",)
+
+
+class EvaluationCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    hit_ratio: float
+    # Size of the cache's keys and bookkeeping; cached variants are shared
+    # with the compiled definitions and not counted.
+    approximate_size_in_bytes: int
+
+
+def properties_fingerprint(
+    properties: dict[str, Any], keys: frozenset[str] | None
+) -> tuple:
+    """Hashable, order-independent fingerprint of some of ``properties``.
+
+    Values that compare equal but differ in type, such as ``1`` and ``True``,
+    get different fingerprints because rules may treat them differently.
+
+    :param dict properties: The properties a rule is evaluated against
+    :param frozenset keys: The keys to include, or None to include all of them
+    :raises TypeError: If a value cannot be serialized to JSON
+    :raises ValueError: If a value cannot be serialized to JSON
+    """
+    if keys is None:
+        keys = frozenset(properties)
+    return tuple(
+        (key, _fingerprint_value(properties[key]) if key in properties else _ABSENT)
+        for key in sorted(keys)
+    )
+
+
+def _fingerprint_value(value: Any) -> tuple:
+    if isinstance(value, _SCALAR_TYPES):
+        return (type(value).__name__, value)
+    return (type(value).__name__, json.dumps(value, sort_keys=True))
+
+
+class EvaluationCache:
+    """LRU cache of evaluation results that expire after ``ttl_in_seconds``.
+
+    At most ``max_entries`` results are kept; the least recently used are
+    evicted first.
+    """
+
+    def __init__(self, max_entries: int, ttl_in_seconds: float) -> None:
+        self._max_entries = max_entries
+        self._ttl_in_seconds = ttl_in_seconds
+        # key -> (expiry time, result), least recently used first.
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached result for ``key``, or ``default`` if there is none."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, result: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl_in_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached results, keeping the hit and miss counts."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> EvaluationCacheStats:
+        with self._lock:
+            lookups = self._hits + self._misses
+            size = sys.getsizeof(self._entries) + sum(
+                _deep_size_of(key) + sys.getsizeof(entry)
+                for key, entry in self._entries.items()
+            )
+            return EvaluationCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                entries=len(self._entries),
+                hit_ratio=self._hits / lookups if lookups else 0.0,
+                approximate_size_in_bytes=size,
+            )
+
+
+def _deep_size_of(value: Any) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, tuple):
+        size += sum(_deep_size_of(item) for item in value)
+    return size
+
+
+def canonical_context(context: dict[str, Any]) -> str:
+    """Serialization of a context that is the same for equal contexts.
+
+    :raises TypeError: If a value cannot be serialized to JSON
+    :raises ValueError: If a value cannot be serialized to JSON
+    """
+    return json.dumps(context, sort_keys=True, separators=(",", ":"))
+
+
+class ResponseCache:
+    """LRU cache of remote flag responses that expire after ``ttl_in_seconds``.
+
+    Expired responses are kept for another ``stale_if_error_in_seconds`` so
+    they can be served while the backend fails. At most ``max_entries``
+    responses are kept; the least recently used are evicted first.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_in_seconds: float,
+        stale_if_error_in_seconds: float = 0,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl_in_seconds = ttl_in_seconds
+        self._stale_if_error_in_seconds = stale_if_error_in_seconds
+        # key -> (fresh until, stale until, response), least recently used first.
+        self._entries: OrderedDict[Hashable, tuple[float, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the fresh response for ``key``, or None if there is none."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def get_stale(self, key: Hashable) -> Any:
+        """Return the response for ``key`` if it may be served after an error, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                return None
+            return entry[2]
+
+    def put(self, key: Hashable, response: Any) -> None:
+        fresh_until = time.monotonic() + self._ttl_in_seconds
+        stale_until = fresh_until + self._stale_if_error_in_seconds
+        with self._lock:
+            self._entries[key] = (fresh_until, stale_until, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,322 @@
+r"""Export the variant assignments of many ids for offline analysis.
+
+Definitions come from a payload file (e.g. a provider's ``snapshot_path``)
+or a single fetch. The id file, one id per line, is split into byte ranges
+that worker processes assign independently with
+``LocalFeatureFlagsProvider.assign_many`` and write to their own part file,
+so throughput grows with the number of workers. No exposure events are
+tracked. Rollouts with runtime rules never match, as there are no custom
+properties. Each part file has one ``id,flag_key,variant_key`` row per
+assigned variant; ids outside every rollout have no row.
+
+    python -m mixpanel.flags.export --definitions snapshot.json \
+        --ids distinct_ids.txt --output assignments/ --format parquet
+
+Requires numpy (``pip install mixpanel[numpy]``), and pyarrow for Parquet
+output (``pip install mixpanel[parquet]``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from mixpanel import __version__
+
+from .bulk import NO_VARIANT, fnv1a64_many, import_numpy
+from .local_feature_flags import LocalFeatureFlagsProvider
+from .types import LocalFlagsConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "parquet")
+DEFAULT_SHARD_SIZE_IN_BYTES = 64 * 1024 * 1024
+COLUMNS = ("id", "flag_key", "variant_key")
+
+# Set in each worker process by _initialize_worker.
+_worker_provider: LocalFeatureFlagsProvider | None = None
+
+
+class Shard(NamedTuple):
+    index: int
+    # Byte range of the id file; lines starting in [start, end) belong here.
+    start: int
+    end: int
+
+
+def plan_shards(path: str, shard_size_in_bytes: int) -> list[Shard]:
+    """Split a file into byte ranges of about ``shard_size_in_bytes``."""
+    size = Path(path).stat().st_size
+    return [
+        Shard(index, start, min(start + shard_size_in_bytes, size))
+        for index, start in enumerate(range(0, size, shard_size_in_bytes))
+    ]
+
+
+def read_shard_ids(path: str, shard: Shard) -> list[str]:
+    """Read the ids on the lines that start within the shard's byte range."""
+    ids = []
+    with Path(path).open("rb") as id_file:
+        position = shard.start
+        if position > 0:
+            # Skip the line in progress unless the range starts a new line.
+            id_file.seek(position - 1)
+            position += len(id_file.readline()) - 1
+        while position < shard.end:
+            line = id_file.readline()
+            if not line:
+                break
+            position += len(line)
+            if value := line.strip().decode("utf-8"):
+                ids.append(value)
+    return ids
+
+
+def load_provider(definitions_path: str) -> LocalFeatureFlagsProvider:
+    """Create a provider serving the definitions payload in ``definitions_path``."""
+    config = LocalFlagsConfig(
+        enable_polling=False, definitions_file_path=definitions_path
+    )
+    provider = LocalFeatureFlagsProvider("", config, __version__, _no_tracking)
+    provider.start_polling_for_definitions()
+    if not provider.are_flags_ready():
+        provider.shutdown()
+        raise ValueError("Failed to load flag definitions from the definitions file")
+    return provider
+
+
+def fetch_definitions(token: str, api_host: str, path: str) -> None:
+    """Fetch the project's definitions once and write the payload to ``path``."""
+    config = LocalFlagsConfig(
+        enable_polling=False, api_host=api_host, snapshot_path=path
+    )
+    provider = LocalFeatureFlagsProvider(token, config, __version__, _no_tracking)
+    try:
+        provider.start_polling_for_definitions()
+    finally:
+        provider.shutdown()
+    if not Path(path).exists():
+        raise ValueError("Failed to fetch flag definitions")
+
+
+def export_shard(
+    ids_path: str,
+    shard: Shard,
+    flag_keys: Sequence[str],
+    output_dir: str,
+    output_format: str,
+) -> int:
+    """Assign the shard's ids and write them to a part file; runs in a worker.
+
+    The ids are hashed once for all flags, and each flag's rows are written
+    as soon as they are assigned, so memory holds one flag's rows at a time.
+
+    :return: The number of rows written
+    """
+    np = import_numpy()
+    ids = read_shard_ids(ids_path, shard)
+    ids_array = np.array(ids, dtype=object)
+    states = fnv1a64_many(ids)
+
+    part_path = Path(output_dir) / f"part-{shard.index:05d}.{output_format}"
+    writer_type = _ParquetPartWriter if output_format == "parquet" else _CsvPartWriter
+    rows = 0
+    with writer_type(part_path) as writer:
+        for flag_key in flag_keys:
+            assignment = _worker_provider.assign_many(
+                flag_key, ids, context_states=states
+            )
+            assigned = assignment.variant_indices != NO_VARIANT
+            if not assigned.any():
+                continue
+            variant_keys = np.take(
+                np.array(assignment.variant_keys, dtype=object),
+                assignment.variant_indices[assigned],
+            )
+            writer.write(ids_array[assigned], flag_key, variant_keys)
+            rows += len(variant_keys)
+    return rows
+
+
+def export_assignments(
+    definitions_path: str,
+    ids_path: str,
+    output_dir: str,
+    output_format: str = "csv",
+    flag_keys: Sequence[str] | None = None,
+    context: str = "distinct_id",
+    workers: int | None = None,
+    shard_size_in_bytes: int = DEFAULT_SHARD_SIZE_IN_BYTES,
+) -> int:
+    """Export the assignments of every id in ``ids_path`` to part files.
+
+    :param str definitions_path: Path of a flag definitions payload
+    :param str ids_path: Path of a file with one context value per line
+    :param str output_dir: Directory the part files are written to
+    :param str output_format: Either "csv" or "parquet"
+    :param Sequence[str] flag_keys: Flags to export; defaults to every flag evaluated on ``context``
+    :param str context: Context attribute the ids are values of
+    :param int workers: Number of worker processes; defaults to the number of CPUs
+    :param int shard_size_in_bytes: Approximate size of the id file range each task assigns
+    :return: The number of rows written
+    """
+    if output_format not in FORMATS:
+        raise ValueError("Output format must be 'csv' or 'parquet'")
+
+    provider = load_provider(definitions_path)
+    try:
+        if flag_keys is None:
+            flag_keys = provider.flag_keys(context)
+    finally:
+        provider.shutdown()
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    shards = plan_shards(ids_path, shard_size_in_bytes)
+    logger.info(
+        "Exporting %s flags for %s shards of '%s'",
+        len(flag_keys),
+        len(shards),
+        ids_path,
+    )
+
+    total_rows = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_initialize_worker,
+        initargs=(definitions_path,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                export_shard, ids_path, shard, flag_keys, output_dir, output_format
+            )
+            for shard in shards
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            total_rows += future.result()
+            logger.info("Exported %s of %s shards", done, len(shards))
+    return total_rows
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m mixpanel.flags.export",
+        description="Export local flag variant assignments for a file of ids.",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--definitions", help="Path of a flag definitions payload")
+    source.add_argument("--token", help="Project token to fetch definitions with")
+    parser.add_argument("--api-host", default=LocalFlagsConfig().api_host)
+    parser.add_argument("--ids", required=True, help="File with one id per line")
+    parser.add_argument("--output", required=True, help="Output directory")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument(
+        "--flag", action="append", dest="flag_keys", help="Flag to export; repeatable"
+    )
+    parser.add_argument("--context", default="distinct_id")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE_IN_BYTES,
+        help="Bytes of the id file per task",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        definitions_path = args.definitions
+        if definitions_path is None:
+            definitions_path = str(Path(temporary_dir) / "definitions.json")
+            fetch_definitions(args.token, args.api_host, definitions_path)
+
+        rows = export_assignments(
+            definitions_path,
+            args.ids,
+            args.output,
+            output_format=args.format,
+            flag_keys=args.flag_keys,
+            context=args.context,
+            workers=args.workers,
+            shard_size_in_bytes=args.shard_size,
+        )
+    logger.info("Wrote %s assignments to '%s'", rows, args.output)
+    return 0
+
+
+def _initialize_worker(definitions_path: str) -> None:
+    global _worker_provider  # noqa: PLW0603 - one provider per worker process
+    _worker_provider = load_provider(definitions_path)
+
+
+class _CsvPartWriter:
+    """Writes rows to a CSV part file that stays open for the whole shard."""
+
+    def __init__(self, path: Path) -> None:
+        self._file = path.open("w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, ids: np.ndarray, flag_key: str, variant_keys: np.ndarray) -> None:
+        self._writer.writerows(zip(ids, repeat(flag_key), variant_keys))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._file.close()
+
+
+class _ParquetPartWriter:
+    """Writes rows to a Parquet part file, one row group per flag."""
+
+    def __init__(self, path: Path) -> None:
+        try:
+            import pyarrow as pa  # noqa: PLC0415 - optional dependency
+            import pyarrow.parquet as pq  # noqa: PLC0415 - optional dependency
+        except ImportError as exc:
+            raise ImportError(
+                "Parquet export requires pyarrow. "
+                "Install it with 'pip install mixpanel[parquet]'."
+            ) from exc
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.string()) for column in COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, ids: np.ndarray, flag_key: str, variant_keys: np.ndarray) -> None:
+        pa = self._pa
+        table = pa.table(
+            [
+                pa.array(ids, type=pa.string()),
+                pa.repeat(pa.scalar(flag_key, type=pa.string()), len(ids)),
+                pa.array(variant_keys, type=pa.string()),
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._writer.close()
+
+
+def _no_tracking(*_args: Any) -> None:
+    """Tracker of the export's providers, which never track exposures."""
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Deduplication and batched delivery of flag exposure events."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Optional
+
+from .utils import EXPOSURE_EVENT
+
+if TYPE_CHECKING:
+    from .types import FlagsConfig, SelectedVariant
+
+logger = logging.getLogger(__name__)
+
+_ExposureKey = tuple[str, str, Optional[str], Optional[str]]
+# (distinct_id, properties) of one exposure event.
+Exposure = tuple[str, dict[str, Any]]
+
+_STOP: Any = object()
+
+
+class ExposureDeduplicator:
+    """Remembers recently tracked exposures so that repeats can be skipped.
+
+    An exposure is identified by its distinct_id, flag key, variant key and
+    experiment id, and is tracked again once ``ttl_in_seconds`` have passed.
+    At most ``max_entries`` exposures are remembered; the oldest are
+    forgotten first. With no TTL every exposure is tracked.
+    """
+
+    def __init__(self, ttl_in_seconds: float | None, max_entries: int) -> None:
+        self._ttl_in_seconds = ttl_in_seconds
+        self._max_entries = max_entries
+        # Expiry time of each exposure, oldest first.
+        self._expires_at: OrderedDict[_ExposureKey, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_exposure(
+        self, distinct_id: str, flag_key: str, variant: SelectedVariant
+    ) -> bool:
+        """Record an exposure, returning False if it was tracked within the TTL."""
+        if self._ttl_in_seconds is None:
+            return True
+
+        key = (distinct_id, flag_key, variant.variant_key, variant.experiment_id)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._expires_at.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+
+            self._expires_at[key] = now + self._ttl_in_seconds
+            self._expires_at.move_to_end(key)
+            self._evict(now)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._expires_at)
+
+    def _evict(self, now: float) -> None:
+        # Entries share one TTL, so insertion order is expiry order.
+        expires_at = self._expires_at
+        while expires_at and (
+            len(expires_at) > self._max_entries
+            or next(iter(expires_at.values())) <= now
+        ):
+            expires_at.popitem(last=False)
+
+
+def create_exposure_pipeline(
+    config: FlagsConfig, tracker: Callable, batch_tracker: Callable | None
+) -> ExposurePipeline | None:
+    """Create the exposure pipeline configured by ``config``, if any.
+
+    :param FlagsConfig config: The provider's configuration
+    :param Callable tracker: Tracks one event, used if there is no batch tracker
+    :param Callable batch_tracker: Tracks a list of ``(distinct_id, properties)`` events with one name
+    """
+    if config.exposure_queue_size is None:
+        return None
+
+    def send_batch(exposures: list[Exposure]) -> None:
+        if batch_tracker is not None:
+            batch_tracker(EXPOSURE_EVENT, exposures)
+            return
+        for distinct_id, properties in exposures:
+            tracker(distinct_id, EXPOSURE_EVENT, properties)
+
+    return ExposurePipeline(
+        send_batch,
+        config.exposure_queue_size,
+        config.exposure_batch_size,
+        config.exposure_flush_interval_in_seconds,
+    )
+
+
+class ExposurePipelineStats(NamedTuple):
+    queued: int
+    sent: int
+    dropped: int
+    failed: int
+
+
+class ExposurePipeline:
+    """Bounded queue of exposure events sent in batches by a worker thread.
+
+    ``submit`` never blocks: when ``max_queue_size`` exposures are already
+    waiting, the new one is dropped and counted. The worker sends up to
+    ``batch_size`` exposures per ``send_batch`` call, waiting at most
+    ``flush_interval_in_seconds`` for a batch to fill.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[list[Exposure]], None],
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_in_seconds: float,
+    ) -> None:
+        self._send_batch = send_batch
+        self._batch_size = batch_size
+        self._flush_interval_in_seconds = flush_interval_in_seconds
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._counts_lock = threading.Lock()
+        self._sent = 0
+        self._dropped = 0
+        self._failed = 0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, distinct_id: str, properties: dict[str, Any]) -> bool:
+        """Queue an exposure, returning False if the queue is full and it was dropped.
+
+        The exposure's ``time`` property is set to now unless it has one, so
+        the event is not stamped with the later time its batch is sent.
+        """
+        if "time" not in properties:
+            properties = {**properties, "time": time.time()}
+        try:
+            self._queue.put_nowait((distinct_id, properties))
+        except queue.Full:
+            with self._counts_lock:
+                self._dropped += 1
+            return False
+        return True
+
+    def stats(self) -> ExposurePipelineStats:
+        with self._counts_lock:
+            return ExposurePipelineStats(
+                queued=self._queue.qsize(),
+                sent=self._sent,
+                dropped=self._dropped,
+                failed=self._failed,
+            )
+
+    def close(self, timeout_in_seconds: float = 5.0) -> None:
+        """Send the queued exposures and stop the worker."""
+        if not self._worker.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout_in_seconds)
+        except queue.Full:
+            logger.warning("Exposure queue did not drain before shutdown")
+            return
+        self._worker.join(timeout_in_seconds)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            exposure = self._queue.get()
+            if exposure is _STOP:
+                return
+
+            batch = [exposure]
+            deadline = time.monotonic() + self._flush_interval_in_seconds
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    exposure = self._queue.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    break
+                if exposure is _STOP:
+                    stopping = True
+                    break
+                batch.append(exposure)
+
+            self._send(batch)
+
+    def _send(self, batch: list[Exposure]) -> None:
+        try:
+            self._send_batch(batch)
+        except Exception:
+            logger.exception("Failed to send %s exposure events", len(batch))
+            with self._counts_lock:
+                self._failed += len(batch)
+        else:
+            with self._counts_lock:
+                self._sent += len(batch)
@@ -1,41 +1,111 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import hashlib
+import inspect
 import logging
 import threading
 import time
+from collections.abc import Mapping
 from datetime import datetime, timedelta
-from typing import Any, Callable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
 
 import httpx
-import json_logic
+from asgiref.sync import sync_to_async
 
 from mixpanel.credentials import ServiceAccountCredentials
 
+from .bulk import (
+    NO_VARIANT,
+    BulkAssignment,
+    fnv1a64_many,
+    import_numpy,
+    normalized_hash_many,
+    select_variants_many,
+)
+from .cache import EvaluationCache, EvaluationCacheStats, properties_fingerprint
+from .exposures import (
+    ExposureDeduplicator,
+    ExposurePipelineStats,
+    create_exposure_pipeline,
+)
+from .metrics import (
+    DEFINITIONS_AGE,
+    DEFINITIONS_FETCH_DURATION,
+    DEFINITIONS_FETCH_ERRORS,
+    DEFINITIONS_PARSE_DURATION,
+    DEFINITIONS_PAYLOAD_SIZE,
+    create_flag_metrics,
+)
+from .plans import (
+    EMPTY_DEFINITIONS,
+    CompiledDefinitions,
+    DefinitionsChange,
+    DefinitionsCompiler,
+    FlagPlan,
+    RolloutPlan,
+    diff_definitions,
+    flag_key_filter,
+    select_variant,
+)
+from .rules import casefold_keys_and_values, casefold_leaf_nodes
+from .shared import publish_shared_definitions, read_shared_definitions
+from .streaming import ServerSentEvent, ServerSentEventDecoder
 from .types import (
-    ExperimentationFlag,
-    ExperimentationFlags,
     FallbackReason,
     LocalFlagsConfig,
     Rollout,
     SelectedVariant,
-    VariantSource,
 )
 from .utils import (
     REQUEST_HEADERS,
+    backoff_delay,
     close_async_client_from_sync,
     dispatch_exposure,
+    fnv1a64_state,
     generate_traceparent,
-    normalized_hash,
+    normalized_hash_from_state,
+    polling_delay,
     prepare_common_query_params,
+    write_file_atomically,
 )
 
+if TYPE_CHECKING:
+    from collections.abc import Collection, Sequence
+
+    import numpy as np
+
+    from .manager import LocalFlagsManager
+
 logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.ERROR)
 
 
+# Streaming responses that mean the endpoint will not become available.
+_STREAMING_UNSUPPORTED_STATUS_CODES = frozenset(
+    {
+        httpx.codes.NOT_FOUND,
+        httpx.codes.METHOD_NOT_ALLOWED,
+        httpx.codes.NOT_IMPLEMENTED,
+    }
+)
+
+
+class _StreamingUnsupportedError(Exception):
+    pass
+
+
 class LocalFeatureFlagsProvider:
     FLAGS_DEFINITIONS_URL_PATH = "/flags/definitions"
+    FLAGS_DEFINITIONS_STREAM_URL_PATH = "/flags/definitions/stream"
+    # The stream is considered dead if not even a keep-alive arrives this often.
+    STREAM_READ_TIMEOUT_IN_SECONDS = 120
+    STREAM_RECONNECT_BASE_DELAY_IN_SECONDS = 1
+    # Stream event types whose data is a definitions payload; "message" is
+    # the type of events that do not name one.
+    STREAM_DEFINITIONS_EVENTS = frozenset({"put", "message"})
 
     def __init__(
         self,
@@ -44,6 +114,8 @@ class LocalFeatureFlagsProvider:
         version: str,
         tracker: Callable,
         credentials: ServiceAccountCredentials | None = None,
+        batch_tracker: Callable | None = None,
+        manager: LocalFlagsManager | None = None,
     ) -> None:
         """Initialize the LocalFeatureFlagsProvider.
 
@@ -52,15 +124,62 @@ class LocalFeatureFlagsProvider:
         :param str version: the version of the Mixpanel library being used, just for tracking
         :param Callable tracker: A function used to track flags exposure events to mixpanel
         :param ServiceAccountCredentials credentials: Optional service account credentials for authentication.
+        :param Callable batch_tracker: Optional function tracking a list of (distinct_id, properties) events with one name at once, used to send queued exposure events
+        :param LocalFlagsManager manager: Optional manager whose HTTP client and polling thread this provider shares; see LocalFlagsManager.add_project
         """
         self._token: str = token
+        self._manager = manager
         self._config: LocalFlagsConfig = config
         self._version = version
         self._tracker: Callable = tracker
         self._credentials = credentials
+        self._exposures = ExposureDeduplicator(
+            config.exposure_dedup_ttl_in_seconds, config.exposure_dedup_max_entries
+        )
+        self._exposure_pipeline = create_exposure_pipeline(
+            config, tracker, batch_tracker
+        )
+        self._metrics = create_flag_metrics(config)
 
-        self._flag_definitions: dict[str, ExperimentationFlag] = {}
+        self._evaluation_cache: EvaluationCache | None = None
+        if config.evaluation_cache_max_entries is not None:
+            self._evaluation_cache = EvaluationCache(
+                config.evaluation_cache_max_entries,
+                config.evaluation_cache_ttl_in_seconds,
+            )
+
+        self._definitions: CompiledDefinitions = EMPTY_DEFINITIONS
         self._are_flags_ready = False
+        # Set once definitions are first loaded successfully; unlike
+        # _are_flags_ready, not by a fetch whose payload failed to parse.
+        self._ready = threading.Event()
+        # (loop, future) of each await_ready call still waiting.
+        self._ready_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._ready_lock = threading.Lock()
+        # time.monotonic() at which the current definitions were last known
+        # to be up to date.
+        self._definitions_refreshed_at: float | None = None
+        # Validators of the last successfully parsed definitions payload.
+        self._definitions_etag: str | None = None
+        self._definitions_last_modified: str | None = None
+        self._definitions_content_hash: bytes | None = None
+        self._definitions_compiler = DefinitionsCompiler(
+            flag_key_filter(config.flag_keys, config.flag_key_prefixes)
+        )
+        # Modification time and size of the definitions file last loaded.
+        self._definitions_file_version: tuple[int, int] | None = None
+        # Version of the shared definitions last loaded.
+        self._shared_definitions_version: int | None = None
+        # Payload last published to the shared definitions file, kept to
+        # republish it if the file goes missing.
+        self._published_content: bytes | None = None
+        # (listener, event loop to run it on if it is a coroutine function).
+        self._definitions_listeners: list[
+            tuple[Callable, asyncio.AbstractEventLoop | None]
+        ] = []
+        # Running background fetches and async listener tasks, referenced
+        # until they finish.
+        self._background_tasks: set[asyncio.Task] = set()
 
         # Build httpx client parameters
         if credentials:
@@ -80,29 +199,59 @@ class LocalFeatureFlagsProvider:
         self._request_params = prepare_common_query_params(
             self._token, self._version, project_id
         )
+        if config.flag_keys is not None:
+            self._request_params["flag_keys"] = ",".join(config.flag_keys)
+        if config.flag_key_prefixes is not None:
+            self._request_params["flag_key_prefixes"] = ",".join(
+                config.flag_key_prefixes
+            )
 
-        self._async_client: httpx.AsyncClient = httpx.AsyncClient(
-            **httpx_client_parameters
-        )
-        self._sync_client: httpx.Client = httpx.Client(**httpx_client_parameters)
+        self._async_client: httpx.AsyncClient | None = None
+        if manager is not None:
+            # The manager's client is shared between projects, so the
+            # credentials are sent with each request instead.
+            self._request_auth: Any = auth
+            self._sync_client: httpx.Client = manager.http_client(config.api_host)
+        else:
+            self._request_auth = httpx.USE_CLIENT_DEFAULT
+            self._async_client = httpx.AsyncClient(**httpx_client_parameters)
+            self._sync_client = httpx.Client(**httpx_client_parameters)
 
         self._async_polling_task: asyncio.Task | None = None
         self._sync_polling_task: threading.Thread | None = None
 
         self._sync_stop_event = threading.Event()
 
-    def start_polling_for_definitions(self):
+    def start_polling_for_definitions(self, blocking: bool = True):
         """Fetch flag definitions for the current project.
 
         If configured by the caller, starts a background thread to poll for updates at regular intervals, if one does not already exist.
+        When a snapshot is loaded and polling is enabled, the fetch happens on that thread instead, so this call returns without waiting on the network.
+        :param bool blocking: Wait for the first fetch; when False it happens in the background, and wait_until_ready tells when it is done
         """
-        self._fetch_flag_definitions()
+        snapshot_loaded = self._load_snapshot()
+        fetch_first = (snapshot_loaded or not blocking) and self._config.enable_polling
+        if not fetch_first:
+            if blocking:
+                self._fetch_flag_definitions()
+            else:
+                threading.Thread(
+                    target=self._fetch_flag_definitions, daemon=True
+                ).start()
 
         if self._config.enable_polling:
-            if not self._sync_polling_task and not self._async_polling_task:
+            if self._manager is not None:
+                self._manager.schedule_polling(
+                    self, self._config.polling_interval_in_seconds, fetch_first
+                )
+            elif not self._sync_polling_task and not self._async_polling_task:
                 self._sync_stop_event.clear()
                 self._sync_polling_task = threading.Thread(
-                    target=self._start_continuous_polling, daemon=True
+                    target=self._start_streaming
+                    if self._uses_streaming()
+                    else self._start_continuous_polling,
+                    args=(fetch_first,),
+                    daemon=True,
                 )
                 self._sync_polling_task.start()
             else:
@@ -113,64 +262,331 @@ class LocalFeatureFlagsProvider:
 
         Once stopped, the polling thread cannot be restarted.
         """
-        if self._sync_polling_task:
+        if self._manager is not None:
+            if not self._manager.cancel_polling(self):
+                logger.info("There is no polling task to cancel.")
+        elif self._sync_polling_task:
             self._sync_stop_event.set()
             self._sync_polling_task = None
         else:
             logger.info("There is no polling task to cancel.")
 
-    async def astart_polling_for_definitions(self):
+    async def astart_polling_for_definitions(self, blocking: bool = True):
         """Fetch flag definitions for the current project.
 
         If configured by the caller, starts an async task on the event loop to poll for updates at regular intervals, if one does not already exist.
+        When a snapshot is loaded and polling is enabled, the fetch happens in that task instead, so this call returns without waiting on the network.
+        Providers created by a LocalFlagsManager fetch on a worker thread and are polled by the manager instead.
+        :param bool blocking: Wait for the first fetch; when False it happens in the background, and await_ready tells when it is done
         """
-        await self._afetch_flag_definitions()
+        if self._manager is not None:
+            await sync_to_async(
+                self.start_polling_for_definitions, thread_sensitive=False
+            )(blocking=blocking)
+            return
+
+        snapshot_loaded = self._load_snapshot()
+        fetch_first = (snapshot_loaded or not blocking) and self._config.enable_polling
+        if not fetch_first:
+            if blocking:
+                await self._afetch_flag_definitions()
+            else:
+                task = asyncio.create_task(self._afetch_flag_definitions())
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
 
         if self._config.enable_polling:
             if not self._sync_polling_task and not self._async_polling_task:
                 self._async_polling_task = asyncio.create_task(
-                    self._astart_continuous_polling()
+                    self._astart_streaming(fetch_first)
+                    if self._uses_streaming()
+                    else self._astart_continuous_polling(fetch_first)
                 )
             else:
                 logger.error("A polling task is already running")
 
     async def astop_polling_for_definitions(self):
         """If there exists an async task to poll for flag definition updates, cancel the task and clear the reference to it."""
-        if self._async_polling_task:
+        if self._manager is not None:
+            self.stop_polling_for_definitions()
+        elif self._async_polling_task:
             self._async_polling_task.cancel()
             self._async_polling_task = None
         else:
             logger.info("There is no polling task to cancel.")
 
-    async def _astart_continuous_polling(self):
+    async def _astart_continuous_polling(self, fetch_first: bool = False):
         logger.info(
             "Initialized async polling for flag definition updates every '%s' seconds",
             self._config.polling_interval_in_seconds,
         )
         try:
+            failures = 0
+            if fetch_first and not await self._afetch_flag_definitions():
+                failures = 1
             while True:
-                await asyncio.sleep(self._config.polling_interval_in_seconds)
-                await self._afetch_flag_definitions()
+                await asyncio.sleep(self._polling_delay(failures))
+                if await self._afetch_flag_definitions():
+                    failures = 0
+                else:
+                    failures += 1
         except asyncio.CancelledError:
             logger.info("Async polling was cancelled")
 
-    def _start_continuous_polling(self):
+    def _start_continuous_polling(self, fetch_first: bool = False):
         logger.info(
             "Initialized sync polling for flag definition updates every '%s' seconds",
             self._config.polling_interval_in_seconds,
         )
+        failures = 0
+        if fetch_first and not self._fetch_flag_definitions():
+            failures = 1
+        while not self._sync_stop_event.is_set():
+            if self._sync_stop_event.wait(timeout=self._polling_delay(failures)):
+                break
+
+            if self._fetch_flag_definitions():
+                failures = 0
+            else:
+                failures += 1
+
+    def _polling_delay(self, consecutive_failures: int) -> float:
+        return polling_delay(
+            self._config.polling_interval_in_seconds, consecutive_failures
+        )
+
+    async def _astart_streaming(self, fetch_first: bool = False):
+        logger.info("Initialized async streaming of flag definition updates")
+        try:
+            if fetch_first:
+                await self._afetch_flag_definitions()
+            attempt = 0
+            while True:
+                try:
+                    if await self._astream_flag_definitions():
+                        attempt = 0
+                except _StreamingUnsupportedError:
+                    logger.warning(
+                        "Flag definitions streaming is unavailable, falling back to polling"
+                    )
+                    await self._astart_continuous_polling()
+                    return
+                except Exception:
+                    logger.exception("Flag definitions stream failed")
+
+                # Catch up on updates missed while disconnected.
+                await self._afetch_flag_definitions()
+                await asyncio.sleep(self._stream_reconnect_delay(attempt))
+                attempt += 1
+        except asyncio.CancelledError:
+            logger.info("Async streaming was cancelled")
+
+    def _start_streaming(self, fetch_first: bool = False):
+        logger.info("Initialized sync streaming of flag definition updates")
+        if fetch_first:
+            self._fetch_flag_definitions()
+        attempt = 0
         while not self._sync_stop_event.is_set():
+            try:
+                if self._stream_flag_definitions():
+                    attempt = 0
+            except _StreamingUnsupportedError:
+                logger.warning(
+                    "Flag definitions streaming is unavailable, falling back to polling"
+                )
+                self._start_continuous_polling()
+                return
+            except Exception:
+                logger.exception("Flag definitions stream failed")
+
+            if self._sync_stop_event.is_set():
+                break
+            # Catch up on updates missed while disconnected.
+            self._fetch_flag_definitions()
             if self._sync_stop_event.wait(
-                timeout=self._config.polling_interval_in_seconds
+                timeout=self._stream_reconnect_delay(attempt)
             ):
                 break
+            attempt += 1
 
-            self._fetch_flag_definitions()
+    async def _astream_flag_definitions(self) -> bool:
+        """Apply definitions received on the stream until it ends.
+
+        :return: Whether the stream was established
+        """
+        connected = False
+        decoder = ServerSentEventDecoder()
+        async with self._async_client.stream(
+            "GET",
+            self.FLAGS_DEFINITIONS_STREAM_URL_PATH,
+            params=self._request_params,
+            headers=self._stream_request_headers(),
+            timeout=self._stream_timeout(),
+        ) as response:
+            self._check_stream_response(response)
+            async for line in response.aiter_lines():
+                connected = True
+                if event := decoder.feed(line):
+                    self._handle_stream_event(event)
+        return connected
+
+    def _stream_flag_definitions(self) -> bool:
+        """Apply definitions received on the stream until it ends or polling stops.
+
+        :return: Whether the stream was established
+        """
+        connected = False
+        decoder = ServerSentEventDecoder()
+        with self._sync_client.stream(
+            "GET",
+            self.FLAGS_DEFINITIONS_STREAM_URL_PATH,
+            params=self._request_params,
+            headers=self._stream_request_headers(),
+            timeout=self._stream_timeout(),
+        ) as response:
+            self._check_stream_response(response)
+            for line in response.iter_lines():
+                connected = True
+                if self._sync_stop_event.is_set():
+                    break
+                if event := decoder.feed(line):
+                    self._handle_stream_event(event)
+        return connected
+
+    def _uses_streaming(self) -> bool:
+        return (
+            self._config.enable_streaming
+            and self._manager is None
+            and not self._has_local_definitions()
+        )
+
+    def _stream_request_headers(self) -> dict[str, str]:
+        return {"traceparent": generate_traceparent(), "Accept": "text/event-stream"}
+
+    def _stream_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            self._config.request_timeout_in_seconds,
+            read=self.STREAM_READ_TIMEOUT_IN_SECONDS,
+        )
+
+    def _stream_reconnect_delay(self, attempt: int) -> float:
+        base = self.STREAM_RECONNECT_BASE_DELAY_IN_SECONDS
+        cap = max(base, self._config.polling_interval_in_seconds)
+        return backoff_delay(attempt, base, cap)
+
+    def _check_stream_response(self, response: httpx.Response) -> None:
+        if response.status_code in _STREAMING_UNSUPPORTED_STATUS_CODES:
+            raise _StreamingUnsupportedError(response.status_code)
+        response.raise_for_status()
+
+    def _handle_stream_event(self, event: ServerSentEvent) -> None:
+        if event.event not in self.STREAM_DEFINITIONS_EVENTS:
+            logger.debug("Ignoring flag definitions stream event '%s'", event.event)
+            return
+
+        content = event.data.encode("utf-8")
+        try:
+            changed = self._load_definitions(content)
+        except Exception:
+            logger.exception("Failed to parse streamed flag definitions")
+            return
+
+        self._mark_definitions_current()
+        if changed:
+            # The validators describe the last fetched payload, not this one;
+            # keeping them could turn the next fetch into a 304 for it.
+            self._definitions_etag = None
+            self._definitions_last_modified = None
+            self._write_snapshot(content)
+        self._publish_definitions(content)
+
+    def refresh_definitions(self) -> bool:
+        """Fetch the flag definitions once from their configured source.
+
+        :return: Whether the definitions in use are up to date
+        """
+        return self._fetch_flag_definitions()
 
     def are_flags_ready(self) -> bool:
         """Check if the call to fetch flag definitions has been made successfully."""
         return self._are_flags_ready
 
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """Block until flag definitions are first loaded successfully.
+
+        :param float timeout: Maximum number of seconds to wait, or None to wait indefinitely
+        :return: Whether the flags are ready
+        """
+        return self._ready.wait(timeout)
+
+    async def await_ready(self, timeout: float | None = None) -> bool:
+        """Wait without blocking the event loop until flag definitions are first loaded successfully.
+
+        :param float timeout: Maximum number of seconds to wait, or None to wait indefinitely
+        :return: Whether the flags are ready
+        """
+        if self._ready.is_set():
+            return True
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._ready_lock:
+            if self._ready.is_set():
+                return True
+            self._ready_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._ready_lock:
+                if waiter in self._ready_waiters:
+                    self._ready_waiters.remove(waiter)
+        return True
+
+    def _mark_ready(self) -> None:
+        if self._ready.is_set():
+            return
+        with self._ready_lock:
+            self._ready.set()
+            waiters, self._ready_waiters = self._ready_waiters, []
+        for loop, future in waiters:
+            # Waiters may be on other threads' loops, or on closed ones.
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(_resolve_ready_waiter, future)
+
+    def flag_keys(self, context: str | None = None) -> list[str]:
+        """Keys of the loaded feature flags.
+
+        :param str context: Only return flags evaluated on this context attribute (e.g. "distinct_id")
+        """
+        return [
+            flag_key
+            for flag_key, plan in self._definitions.flags.items()
+            if context is None or plan.context == context
+        ]
+
+    def definitions_version(self) -> int:
+        """Version of the flag definitions in use.
+
+        Starts at 0 and increases by one each time changed definitions are loaded; re-fetching unchanged definitions keeps the version. Variants evaluated under the same version and context are identical, so the version can key caches of evaluation results.
+        """
+        return self._definitions.version
+
+    def definitions_age_in_seconds(self) -> float | None:
+        """Seconds since the flag definitions in use were last known to be up to date.
+
+        Failed fetches do not reset the age, so it grows while the definitions endpoint is unreachable and evaluation keeps using the last good definitions.
+        :return: The age, or None if no definitions were loaded yet
+        """
+        if self._definitions_refreshed_at is None:
+            return None
+        return time.monotonic() - self._definitions_refreshed_at
+
+    def _mark_definitions_current(self, age_in_seconds: float = 0.0) -> None:
+        self._are_flags_ready = True
+        self._mark_ready()
+        self._definitions_refreshed_at = time.monotonic() - age_in_seconds
+
     def get_all_variants(self, context: dict[str, Any]) -> dict[str, SelectedVariant]:
         """Get the selected variant for all feature flags that the current user context is in the rollout for.
 
@@ -178,14 +594,14 @@ class LocalFeatureFlagsProvider:
         :param Dict[str, Any] context: The user context to evaluate against the feature flags
         """
         variants: dict[str, SelectedVariant] = {}
-        fallback = SelectedVariant(variant_key=None, variant_value=None)
+        evaluation = _EvaluationContext(context)
 
-        for flag_key in self._flag_definitions:
-            variant = self.get_variant(
-                flag_key, fallback, context, report_exposure=False
-            )
-            if variant.variant_key is not None:
-                variants[flag_key] = variant
+        for context_key, plans in self._definitions.by_context.items():
+            if not (context_value := context.get(context_key)):
+                continue
+            for plan in plans:
+                if variant := self._select_variant(plan, context_value, evaluation):
+                    variants[plan.flag.key] = variant.detached_copy()
 
         return variants
 
@@ -223,38 +639,60 @@ class LocalFeatureFlagsProvider:
 
         :param str flag_key: The key of the feature flag to evaluate
         :param SelectedVariant fallback_value: The default variant to return if evaluation fails
-        :param Dict[str, Any] context: Context dictionary containing user's distinct_id and any other attributes needed for rollout evaluation
+        :param Dict[str, Any] context: Context dictionary containing user's distinct_id and any other attributes needed for rollout evaluation. Values in context["custom_properties"] may be callables, called only if a runtime rule reads their key, and custom_properties may be any mapping
         :param bool report_exposure: Whether to track an exposure event for this flag evaluation. Defaults to True.
         """
+        if self._metrics is None:
+            return self._get_variant(flag_key, fallback_value, context, report_exposure)
+
         start_time = time.perf_counter()
-        flag_definition = self._flag_definitions.get(flag_key)
+        variant = self._get_variant(flag_key, fallback_value, context, report_exposure)
+        self._metrics.evaluation(
+            "local", flag_key, variant, time.perf_counter() - start_time
+        )
+        return variant
 
-        if not flag_definition:
-            logger.warning("Cannot find flag definition for key: '%s'", flag_key)
+    def _get_variant(
+        self,
+        flag_key: str,
+        fallback_value: SelectedVariant,
+        context: dict[str, Any],
+        report_exposure: bool,
+    ) -> SelectedVariant:
+        start_time = time.perf_counter()
+        definitions = self._definitions
+        plan = definitions.flags.get(flag_key)
+
+        # Logged at debug level since this runs on every evaluation; the
+        # fallback reasons are counted by the evaluation metrics.
+        if plan is None:
+            logger.debug("Cannot find flag definition for key: '%s'", flag_key)
             return fallback_value.as_fallback(FallbackReason.flag_not_found())
 
-        if not (context_value := context.get(flag_definition.context)):
-            logger.warning(
+        if not (context_value := context.get(plan.context)):
+            logger.debug(
                 "The rollout context, '%s' for flag, '%s' is not present in the supplied context dictionary",
-                flag_definition.context,
+                plan.context,
                 flag_key,
             )
             return fallback_value.as_fallback(
-                FallbackReason.missing_context_key(flag_definition.context)
+                FallbackReason.missing_context_key(plan.context)
             )
 
-        selected_variant: SelectedVariant | None = None
-
-        if test_user_variant := self._get_variant_override_for_test_user(
-            flag_definition, context
-        ):
-            selected_variant = test_user_variant
-        elif rollout := self._get_assigned_rollout(
-            flag_definition, context_value, context
-        ):
-            selected_variant = self._get_assigned_variant(
-                flag_definition, context_value, flag_key, rollout
+        evaluation = _EvaluationContext(context)
+        cache_key = None
+        selected_variant = _UNRESOLVED
+        if self._evaluation_cache is not None:
+            cache_key = self._evaluation_cache_key(
+                definitions, plan, context_value, evaluation
             )
+            if cache_key is not None:
+                selected_variant = self._evaluation_cache.get(cache_key, _UNRESOLVED)
+
+        if selected_variant is _UNRESOLVED:
+            selected_variant = self._select_variant(plan, context_value, evaluation)
+            if cache_key is not None:
+                self._evaluation_cache.put(cache_key, selected_variant)
 
         if selected_variant is not None:
             if report_exposure:
@@ -262,16 +700,163 @@ class LocalFeatureFlagsProvider:
                 self._track_exposure(
                     flag_key, selected_variant, context, end_time - start_time
                 )
-            return selected_variant.with_source(VariantSource.LOCAL)
+            # Plan variants are already tagged LOCAL; hand out a copy so
+            # callers cannot mutate the shared instance or its value.
+            return selected_variant.detached_copy()
 
         logger.debug(
             "%s context %s not eligible for any rollout for flag: %s",
-            flag_definition.context,
+            plan.context,
             context_value,
             flag_key,
         )
         return fallback_value.as_fallback(FallbackReason.no_rollout_match())
 
+    def evaluation_cache_stats(self) -> EvaluationCacheStats | None:
+        """Hits, misses, entries and approximate memory use of the evaluation cache.
+
+        :return: The statistics, or None unless the cache is enabled (see evaluation_cache_max_entries)
+        """
+        if self._evaluation_cache is None:
+            return None
+        return self._evaluation_cache.stats()
+
+    def _evaluation_cache_key(
+        self,
+        definitions: CompiledDefinitions,
+        plan: FlagPlan,
+        context_value: Any,
+        evaluation: _EvaluationContext,
+    ) -> tuple | None:
+        """Key of everything the plan's result depends on, or None if it cannot be cached."""
+        distinct_id = None
+        if plan.test_users:
+            distinct_id = evaluation.context.get("distinct_id")
+
+        properties = None
+        if plan.has_runtime_rules:
+            runtime_parameters = evaluation.runtime_parameters(plan.runtime_properties)
+            if runtime_parameters is not None:
+                try:
+                    properties = properties_fingerprint(
+                        runtime_parameters, plan.runtime_properties
+                    )
+                except (TypeError, ValueError):
+                    return None
+
+        return (
+            plan.flag.key,
+            definitions.version,
+            str(context_value),
+            distinct_id,
+            properties,
+        )
+
+    def assign_many(
+        self,
+        flag_key: str,
+        context_values: Sequence[Any],
+        custom_properties: Sequence[dict[str, Any] | None] | None = None,
+        context_states: np.ndarray | None = None,
+    ) -> BulkAssignment:
+        """Assign the variants of one feature flag to many context values at once.
+
+        Hashing and split selection are vectorized with NumPy, an optional dependency, and agree with `get_variant` for every value. Exposure events are not tracked. Test user overrides apply only to flags whose context is `distinct_id`.
+
+        :param str flag_key: The key of the feature flag to evaluate
+        :param Sequence[Any] context_values: Values of the flag's context attribute (e.g. distinct_ids), one per assignment
+        :param Sequence[Dict[str, Any]] custom_properties: Optional custom properties aligned with context_values, used by rollouts with runtime rules
+        :param np.ndarray context_states: Optional fnv1a64_many states of the context values, so values assigned for several flags are hashed once
+        :return: The flag's variant keys and, per context value, the index of its assigned variant or NO_VARIANT
+        """
+        np = import_numpy()
+        indices = np.full(len(context_values), NO_VARIANT, dtype=np.int16)
+        plan = self._definitions.flags.get(flag_key)
+
+        if plan is None:
+            logger.warning("Cannot find flag definition for key: '%s'", flag_key)
+            return BulkAssignment(variant_keys=(), variant_indices=indices)
+
+        variant_keys = tuple(variant.key for variant in plan.flag.ruleset.variants)
+        # Keep the first index when variant keys repeat.
+        positions = {
+            key: index for index, key in reversed(tuple(enumerate(variant_keys)))
+        }
+
+        pending = np.fromiter(
+            (bool(value) for value in context_values),
+            dtype=bool,
+            count=len(context_values),
+        )
+        states = context_states
+        if states is None:
+            states = fnv1a64_many(
+                [str(value) if value else "" for value in context_values]
+            )
+
+        if plan.test_users and plan.context == "distinct_id":
+            self._assign_bulk_test_users(
+                plan, context_values, positions, indices, pending
+            )
+
+        variant_hashes = None
+        for rollout_plan in plan.rollouts:
+            if not pending.any():
+                break
+
+            rollout_hashes = normalized_hash_many(states, rollout_plan.salt)
+            assigned = pending & (rollout_hashes < rollout_plan.rollout_percentage)
+
+            if (
+                rollout_plan.rule is not None
+                or rollout_plan.rollout.runtime_evaluation_definition
+            ):
+                self._filter_bulk_runtime_rule_matches(
+                    rollout_plan, assigned, custom_properties
+                )
+
+            pending &= ~assigned
+
+            if rollout_plan.override is not None:
+                indices[assigned] = positions[rollout_plan.override.variant_key]
+                continue
+
+            if variant_hashes is None:
+                variant_hashes = normalized_hash_many(states, plan.variant_salt)
+            indices[assigned] = select_variants_many(
+                rollout_plan, variant_hashes[assigned]
+            )
+
+        return BulkAssignment(variant_keys=variant_keys, variant_indices=indices)
+
+    def _assign_bulk_test_users(
+        self,
+        plan: FlagPlan,
+        context_values: Sequence[Any],
+        positions: dict[str, int],
+        indices: Any,
+        pending: Any,
+    ) -> None:
+        for index, value in enumerate(context_values):
+            if value and (test_variant := plan.test_users.get(value)):
+                indices[index] = positions[test_variant.variant_key]
+                pending[index] = False
+
+    def _filter_bulk_runtime_rule_matches(
+        self,
+        rollout_plan: RolloutPlan,
+        assigned: Any,
+        custom_properties: Sequence[dict[str, Any] | None] | None,
+    ) -> None:
+        for index in assigned.nonzero()[0]:
+            properties = (
+                custom_properties[index] if custom_properties is not None else None
+            )
+            if not self._is_runtime_rules_engine_satisfied(
+                rollout_plan, _EvaluationContext({"custom_properties": properties})
+            ):
+                assigned[index] = False
+
     def track_exposure_event(
         self, flag_key: str, variant: SelectedVariant, context: dict[str, Any]
     ):
@@ -285,131 +870,74 @@ class LocalFeatureFlagsProvider:
         """
         self._track_exposure(flag_key, variant, context)
 
+    def _select_variant(
+        self, plan: FlagPlan, context_value: Any, evaluation: _EvaluationContext
+    ) -> SelectedVariant | None:
+        """Return the plan's shared variant for this context, or None if no rollout matches."""
+        if test_user_variant := self._get_variant_override_for_test_user(
+            plan, evaluation.context
+        ):
+            return test_user_variant
+
+        hash_state = evaluation.hash_state(context_value)
+        if rollout_plan := self._get_assigned_rollout(plan, hash_state, evaluation):
+            return self._get_assigned_variant(plan, hash_state, rollout_plan)
+        return None
+
     def _get_variant_override_for_test_user(
-        self, flag_definition: ExperimentationFlag, context: dict[str, Any]
+        self, plan: FlagPlan, context: dict[str, Any]
     ) -> SelectedVariant | None:
         """Check if user has a test variant override."""
-        if not flag_definition.ruleset.test or not flag_definition.ruleset.test.users:
+        if not plan.test_users:
             return None
 
         if not (distinct_id := context.get("distinct_id")):
             return None
 
-        if not (variant_key := flag_definition.ruleset.test.users.get(distinct_id)):
-            return None
-
-        return self._get_matching_variant(variant_key, flag_definition)
+        return plan.test_users.get(distinct_id)
 
     def _get_assigned_variant(
-        self,
-        flag_definition: ExperimentationFlag,
-        context_value: Any,
-        flag_name: str,
-        rollout: Rollout,
+        self, plan: FlagPlan, hash_state: int, rollout_plan: RolloutPlan
     ) -> SelectedVariant:
-        if rollout.variant_override and (
-            variant := self._get_matching_variant(
-                rollout.variant_override.key, flag_definition
-            )
-        ):
-            return variant
+        if rollout_plan.override is not None:
+            return rollout_plan.override
 
-        stored_salt = (
-            flag_definition.hash_salt if flag_definition.hash_salt is not None else ""
-        )
-        salt = flag_name + stored_salt + "variant"
-        variant_hash = normalized_hash(str(context_value), salt)
-
-        variants = [
-            variant.model_copy(deep=True)
-            for variant in flag_definition.ruleset.variants
-        ]
-        if rollout.variant_splits:
-            for variant in variants:
-                if variant.key in rollout.variant_splits:
-                    variant.split = rollout.variant_splits[variant.key]
-
-        selected = variants[0]
-        cumulative = 0.0
-        for variant in variants:
-            selected = variant
-            cumulative += variant.split
-            if variant_hash < cumulative:
-                break
-
-        return SelectedVariant(
-            variant_key=selected.key,
-            variant_value=selected.value,
-            experiment_id=flag_definition.experiment_id,
-            is_experiment_active=flag_definition.is_experiment_active,
-        )
+        variant_hash = normalized_hash_from_state(hash_state, plan.variant_salt)
+        return select_variant(rollout_plan, variant_hash)
 
     def _get_assigned_rollout(
-        self,
-        flag_definition: ExperimentationFlag,
-        context_value: Any,
-        context: dict[str, Any],
-    ) -> Rollout | None:
-        for index, rollout in enumerate(flag_definition.ruleset.rollout):
-            if flag_definition.hash_salt is not None:
-                salt = flag_definition.key + flag_definition.hash_salt + str(index)
-            else:
-                salt = flag_definition.key + "rollout"
-
-            rollout_hash = normalized_hash(str(context_value), salt)
+        self, plan: FlagPlan, hash_state: int, evaluation: _EvaluationContext
+    ) -> RolloutPlan | None:
+        for rollout_plan in plan.rollouts:
+            rollout_hash = normalized_hash_from_state(hash_state, rollout_plan.salt)
 
             if (
-                rollout_hash < rollout.rollout_percentage
-                and self._is_runtime_rules_engine_satisfied(rollout, context)
+                rollout_hash < rollout_plan.rollout_percentage
+                and self._is_runtime_rules_engine_satisfied(rollout_plan, evaluation)
             ):
-                return rollout
+                return rollout_plan
 
         return None
 
     def lowercase_keys_and_values(self, val: Any) -> Any:
-        if isinstance(val, str):
-            return val.casefold()
-        if isinstance(val, list):
-            return [self.lowercase_keys_and_values(item) for item in val]
-        if isinstance(val, dict):
-            return {
-                (
-                    key.casefold() if isinstance(key, str) else key
-                ): self.lowercase_keys_and_values(value)
-                for key, value in val.items()
-            }
-        return val
+        return casefold_keys_and_values(val)
 
     def lowercase_only_leaf_nodes(self, val: Any) -> dict[str, Any]:
-        if isinstance(val, str):
-            return val.casefold()
-        if isinstance(val, list):
-            return [self.lowercase_only_leaf_nodes(item) for item in val]
-        if isinstance(val, dict):
-            return {
-                key: self.lowercase_only_leaf_nodes(value) for key, value in val.items()
-            }
-        return val
-
-    def _get_runtime_parameters(self, context: dict[str, Any]) -> dict[str, Any] | None:
-        if not (custom_properties := context.get("custom_properties")):
-            return None
-        if not isinstance(custom_properties, dict):
-            return None
-        return self.lowercase_keys_and_values(custom_properties)
+        return casefold_leaf_nodes(val)
 
     def _is_runtime_rules_engine_satisfied(
-        self, rollout: Rollout, context: dict[str, Any]
+        self, rollout_plan: RolloutPlan, evaluation: _EvaluationContext
     ) -> bool:
-        if rollout.runtime_evaluation_rule:
-            parameters_for_runtime_rule = self._get_runtime_parameters(context)
+        rollout = rollout_plan.rollout
+        if rollout_plan.rule is not None:
+            parameters_for_runtime_rule = evaluation.runtime_parameters(
+                rollout_plan.runtime_properties
+            )
             if parameters_for_runtime_rule is None:
                 return False
 
             try:
-                rule = self.lowercase_only_leaf_nodes(rollout.runtime_evaluation_rule)
-                result = json_logic.jsonLogic(rule, parameters_for_runtime_rule)
-                return bool(result)
+                return bool(rollout_plan.rule(parameters_for_runtime_rule))
             except Exception:
                 logger.exception("Error evaluating runtime evaluation rule")
                 return False
@@ -417,18 +945,22 @@ class LocalFeatureFlagsProvider:
         elif (
             rollout.runtime_evaluation_definition
         ):  # legacy field supporting only exact match conditions
-            return self._is_legacy_runtime_evaluation_rule_satisfied(rollout, context)
+            return self._is_legacy_runtime_evaluation_rule_satisfied(
+                rollout, evaluation
+            )
 
         else:
             return True
 
     def _is_legacy_runtime_evaluation_rule_satisfied(
-        self, rollout: Rollout, context: dict[str, Any]
+        self, rollout: Rollout, evaluation: _EvaluationContext
     ) -> bool:
         if not rollout.runtime_evaluation_definition:
             return True
 
-        parameters_for_runtime_rule = self._get_runtime_parameters(context)
+        parameters_for_runtime_rule = evaluation.runtime_parameters(
+            rollout.runtime_evaluation_definition.keys()
+        )
         if parameters_for_runtime_rule is None:
             return False
 
@@ -442,51 +974,77 @@ class LocalFeatureFlagsProvider:
 
         return True
 
-    def _get_matching_variant(
-        self, variant_key: str, flag: ExperimentationFlag
-    ) -> SelectedVariant | None:
-        for variant in flag.ruleset.variants:
-            if variant_key.casefold() == variant.key.casefold():
-                return SelectedVariant(
-                    variant_key=variant.key,
-                    variant_value=variant.value,
-                    experiment_id=flag.experiment_id,
-                    is_experiment_active=flag.is_experiment_active,
-                    is_qa_tester=True,
+    async def _afetch_flag_definitions(self) -> bool:
+        """Refresh the flag definitions from their configured source.
+
+        :return: Whether the definitions in use are up to date
+        """
+        if self._has_local_definitions():
+            current = self._reload_local_definitions()
+        else:
+            try:
+                start_time = datetime.now()  # noqa: DTZ005
+                headers = self._definitions_request_headers()
+                response = await self._async_client.get(
+                    self.FLAGS_DEFINITIONS_URL_PATH,
+                    params=self._request_params,
+                    headers=headers,
                 )
-        return None
+                end_time = datetime.now()  # noqa: DTZ005
+                current = self._handle_response(response, start_time, end_time)
+            except Exception:
+                logger.exception("Failed to fetch feature flag definitions")
+                if self._metrics is not None:
+                    self._metrics.increment(DEFINITIONS_FETCH_ERRORS)
+                current = False
+        self._record_definitions_age()
+        return current
 
-    async def _afetch_flag_definitions(self) -> None:
-        try:
-            start_time = datetime.now()  # noqa: DTZ005
-            headers = {"traceparent": generate_traceparent()}
-            response = await self._async_client.get(
-                self.FLAGS_DEFINITIONS_URL_PATH,
-                params=self._request_params,
-                headers=headers,
-            )
-            end_time = datetime.now()  # noqa: DTZ005
-            self._handle_response(response, start_time, end_time)
-        except Exception:
-            logger.exception("Failed to fetch feature flag definitions")
+    def _fetch_flag_definitions(self) -> bool:
+        """Refresh the flag definitions from their configured source.
 
-    def _fetch_flag_definitions(self) -> None:
-        try:
-            start_time = datetime.now()  # noqa: DTZ005
-            headers = {"traceparent": generate_traceparent()}
-            response = self._sync_client.get(
-                self.FLAGS_DEFINITIONS_URL_PATH,
-                params=self._request_params,
-                headers=headers,
-            )
-            end_time = datetime.now()  # noqa: DTZ005
-            self._handle_response(response, start_time, end_time)
-        except Exception:
-            logger.exception("Failed to fetch feature flag definitions")
+        :return: Whether the definitions in use are up to date
+        """
+        if self._has_local_definitions():
+            current = self._reload_local_definitions()
+        else:
+            try:
+                start_time = datetime.now()  # noqa: DTZ005
+                headers = self._definitions_request_headers()
+                response = self._sync_client.get(
+                    self.FLAGS_DEFINITIONS_URL_PATH,
+                    params=self._request_params,
+                    headers=headers,
+                    auth=self._request_auth,
+                )
+                end_time = datetime.now()  # noqa: DTZ005
+                current = self._handle_response(response, start_time, end_time)
+            except Exception:
+                logger.exception("Failed to fetch feature flag definitions")
+                if self._metrics is not None:
+                    self._metrics.increment(DEFINITIONS_FETCH_ERRORS)
+                current = False
+        self._record_definitions_age()
+        return current
+
+    def _record_definitions_age(self) -> None:
+        if self._metrics is not None and (
+            (age_in_seconds := self.definitions_age_in_seconds()) is not None
+        ):
+            self._metrics.gauge(DEFINITIONS_AGE, age_in_seconds)
+
+    def _definitions_request_headers(self) -> dict[str, str]:
+        headers = {"traceparent": generate_traceparent()}
+        # Conditional request: the server answers 304 when nothing changed.
+        if self._definitions_etag is not None:
+            headers["If-None-Match"] = self._definitions_etag
+        if self._definitions_last_modified is not None:
+            headers["If-Modified-Since"] = self._definitions_last_modified
+        return headers
 
     def _handle_response(
         self, response: httpx.Response, start_time: datetime, end_time: datetime
-    ) -> None:
+    ) -> bool:
         request_duration: timedelta = end_time - start_time
         logger.debug(
             "Request started at '%s', completed at '%s', duration: '%.3fs'",
@@ -494,26 +1052,257 @@ class LocalFeatureFlagsProvider:
             end_time.isoformat(),
             request_duration.total_seconds(),
         )
+        if self._metrics is not None:
+            self._metrics.observe(
+                DEFINITIONS_FETCH_DURATION,
+                request_duration.total_seconds(),
+                {"status": str(response.status_code)},
+            )
+
+        if response.status_code == httpx.codes.NOT_MODIFIED:
+            logger.debug("Flag definitions not modified, keeping current definitions")
+            self._mark_definitions_current()
+            if self._published_content is not None:
+                self._publish_definitions(self._published_content)
+            return True
 
         response.raise_for_status()
+        if self._metrics is not None:
+            self._metrics.observe(DEFINITIONS_PAYLOAD_SIZE, len(response.content))
 
-        flags = {}
         try:
-            json_data = response.json()
-            experimentation_flags = ExperimentationFlags.model_validate(json_data)
-            for flag in experimentation_flags.flags:
-                flag.ruleset.variants.sort(key=lambda variant: variant.key)
-                flags[flag.key] = flag
+            changed = self._load_definitions(response.content)
         except Exception:
             logger.exception("Failed to parse flag definitions")
+            # Keep serving the last good definitions, but fetch unconditionally
+            # next time instead of matching the old validators.
+            self._definitions_etag = None
+            self._definitions_last_modified = None
+            self._are_flags_ready = True
+            return False
 
-        self._flag_definitions = flags
-        self._are_flags_ready = True
+        self._definitions_etag = response.headers.get("ETag")
+        self._definitions_last_modified = response.headers.get("Last-Modified")
+        if changed:
+            self._write_snapshot(response.content)
+        self._publish_definitions(response.content)
+        self._mark_definitions_current()
+        return True
+
+    def _load_definitions(self, content: bytes) -> bool:
+        """Compile and swap in a definitions payload.
+
+        :param bytes content: The raw definitions payload
+        :return: False if no loaded flag changed, e.g. because the payload is the one already loaded
+        :raises Exception: If the payload fails to parse or has no flags while flags are loaded; the current definitions are kept
+        """
+        content_hash = hashlib.blake2b(content, digest_size=16).digest()
+        if content_hash == self._definitions_content_hash:
+            logger.debug("Flag definitions unchanged, keeping current definitions")
+            return False
+
+        parse_start_time = time.perf_counter()
+        # An empty payload is most likely a backend fault, so it is refused
+        # while flags are loaded. The check is on the payload before the
+        # flag_keys filter: a payload without allowlisted flags is valid.
+        definitions = self._definitions_compiler.compile_payload(
+            content, require_flags=bool(self._definitions.flags)
+        )
+        if self._metrics is not None:
+            self._metrics.observe(
+                DEFINITIONS_PARSE_DURATION, time.perf_counter() - parse_start_time
+            )
+
+        definitions = definitions._replace(version=self._definitions.version + 1)
+        change = diff_definitions(self._definitions, definitions)
+        self._definitions_content_hash = content_hash
+        if not change.flag_keys:
+            # E.g. reordered flags, or edits to flags the flag_keys filter
+            # drops: the loaded plans are all still current.
+            logger.debug("No loaded flag definition changed, keeping them")
+            return False
+
+        self._definitions = definitions
+        if self._evaluation_cache is not None:
+            # Results are keyed on the version, so old ones can never hit.
+            self._evaluation_cache.clear()
         logger.debug(
-            "Successfully fetched %s flag definitions",
-            len(self._flag_definitions),
+            "Successfully loaded %s flag definitions",
+            len(self._definitions.flags),
+        )
+        if self._definitions_listeners:
+            self._notify_definitions_listeners(change)
+        return True
+
+    def add_definitions_listener(
+        self, listener: Callable[[DefinitionsChange], Any]
+    ) -> None:
+        """Call a listener each time changed flag definitions are loaded.
+
+        The listener receives a DefinitionsChange with the keys of the added,
+        removed and changed flags and the new definitions version. Functions
+        are called on the thread that loaded the definitions and should return
+        quickly. Coroutine functions are scheduled on the event loop running
+        when they are added, or else on the loop that loaded the definitions.
+
+        :param Callable listener: A function or coroutine function taking a DefinitionsChange
+        """
+        loop = None
+        if inspect.iscoroutinefunction(listener):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+        self._definitions_listeners.append((listener, loop))
+
+    def remove_definitions_listener(
+        self, listener: Callable[[DefinitionsChange], Any]
+    ) -> None:
+        """Stop calling a listener added with add_definitions_listener."""
+        self._definitions_listeners = [
+            entry for entry in self._definitions_listeners if entry[0] is not listener
+        ]
+
+    def _notify_definitions_listeners(self, change: DefinitionsChange) -> None:
+        for listener, loop in self._definitions_listeners:
+            try:
+                result = listener(change)
+            except Exception:
+                logger.exception("Flag definitions listener failed")
+                continue
+            if inspect.isawaitable(result):
+                self._schedule_listener(result, loop)
+
+    def _schedule_listener(
+        self, awaitable: Any, loop: asyncio.AbstractEventLoop | None
+    ) -> None:
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if loop is not None and loop is not running_loop:
+            future = asyncio.run_coroutine_threadsafe(awaitable, loop)
+            future.add_done_callback(_log_listener_failure)
+        elif running_loop is not None:
+            task = running_loop.create_task(awaitable)
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            task.add_done_callback(_log_listener_failure)
+        else:
+            logger.error("No event loop to run the async flag definitions listener on")
+            awaitable.close()
+
+    def _load_snapshot(self) -> bool:
+        """Load definitions from the configured snapshot, if there is a valid one."""
+        path = self._config.snapshot_path
+        if path is None:
+            return False
+
+        snapshot = Path(path)
+        try:
+            self._load_definitions(snapshot.read_bytes())
+            # The snapshot is as old as the fetch that wrote it.
+            age_in_seconds = max(0.0, time.time() - snapshot.stat().st_mtime)
+        except FileNotFoundError:
+            logger.info("No flag definitions snapshot found at '%s'", path)
+            return False
+        except Exception:
+            logger.exception("Failed to load flag definitions snapshot '%s'", path)
+            return False
+
+        self._mark_definitions_current(age_in_seconds)
+        logger.info("Loaded flag definitions snapshot '%s'", path)
+        return True
+
+    def _write_snapshot(self, content: bytes) -> None:
+        """Write newly fetched definitions to the configured snapshot."""
+        if (path := self._config.snapshot_path) is not None:
+            try:
+                write_file_atomically(path, content)
+            except Exception:
+                logger.exception("Failed to write flag definitions snapshot '%s'", path)
+
+    def _publish_definitions(self, content: bytes) -> None:
+        """Publish fetched definitions unless the shared file already holds them.
+
+        The file is checked on every fetch rather than only when the payload
+        changed, so it is also published when the payload matches a loaded
+        snapshot and republished when the file is deleted.
+        """
+        config = self._config
+        if not (config.publish_shared_definitions and config.shared_definitions_path):
+            return
+
+        path = config.shared_definitions_path
+        try:
+            shared = read_shared_definitions(path)
+        except (OSError, ValueError):
+            shared = None
+        if shared is None or shared.content != content:
+            try:
+                version = publish_shared_definitions(path, content)
+            except Exception:
+                logger.exception("Failed to publish shared flag definitions '%s'", path)
+                return
+            logger.debug("Published shared flag definitions version %s", version)
+        self._published_content = content
+
+    def _reload_local_definitions(self) -> bool:
+        """Reload definitions from a file or another process instead of the API.
+
+        :return: Whether the definitions in use are up to date
+        """
+        if self._config.definitions_file_path is not None:
+            return self._reload_definitions_file(self._config.definitions_file_path)
+        return self._reload_shared_definitions(self._config.shared_definitions_path)
+
+    def _has_local_definitions(self) -> bool:
+        """Whether definitions come from a file or another process, not the API."""
+        config = self._config
+        return config.definitions_file_path is not None or (
+            config.shared_definitions_path is not None
+            and not config.publish_shared_definitions
         )
 
+    def _reload_shared_definitions(self, path: str) -> bool:
+        """Load the shared definitions if a newer version was published."""
+        try:
+            shared = read_shared_definitions(path, self._shared_definitions_version)
+            if shared is not None:
+                self._load_definitions(shared.content)
+        except FileNotFoundError:
+            logger.info("Shared flag definitions '%s' are not published yet", path)
+            return False
+        except Exception:
+            logger.exception("Failed to load shared flag definitions '%s'", path)
+            return False
+
+        if shared is not None:
+            self._shared_definitions_version = shared.version
+        self._mark_definitions_current()
+        return True
+
+    def _reload_definitions_file(self, path: str) -> bool:
+        """Load definitions from a file if it changed since it was last loaded.
+
+        A file that fails to load leaves the current definitions in place and
+        is retried on the next poll.
+        """
+        definitions_file = Path(path)
+        try:
+            stat = definitions_file.stat()
+            file_version = (stat.st_mtime_ns, stat.st_size)
+            if file_version != self._definitions_file_version:
+                self._load_definitions(definitions_file.read_bytes())
+        except Exception:
+            logger.exception("Failed to load flag definitions from '%s'", path)
+            return False
+
+        self._definitions_file_version = file_version
+        self._mark_definitions_current()
+        return True
+
     def _track_exposure(
         self,
         flag_key: str,
@@ -522,6 +1311,8 @@ class LocalFeatureFlagsProvider:
         latency_in_seconds: float | None = None,
     ):
         if distinct_id := context.get("distinct_id"):
+            if not self._exposures.first_exposure(distinct_id, flag_key, variant):
+                return
             properties = {
                 "Experiment name": flag_key,
                 "Variant name": variant.variant_key,
@@ -541,7 +1332,19 @@ class LocalFeatureFlagsProvider:
                 "Cannot track exposure event without a distinct_id in the context"
             )
 
+    def exposure_stats(self) -> ExposurePipelineStats | None:
+        """Counts of exposure events queued, sent, dropped and failed.
+
+        :return: The counts, or None unless exposures are queued (see exposure_queue_size)
+        """
+        if self._exposure_pipeline is None:
+            return None
+        return self._exposure_pipeline.stats()
+
     def _dispatch_exposure(self, distinct_id: str, properties: dict[str, Any]) -> None:
+        if self._exposure_pipeline is not None:
+            self._exposure_pipeline.submit(distinct_id, properties)
+            return
         dispatch_exposure(
             self._tracker, self._config.exposure_executor, distinct_id, properties
         )
@@ -553,8 +1356,11 @@ class LocalFeatureFlagsProvider:
         # SDK-85: close both clients. close_async_client_from_sync raises
         # if a loop is already running — async callers should use __aexit__.
         self.stop_polling_for_definitions()
-        self._sync_client.close()
-        close_async_client_from_sync(self._async_client)
+        if self._exposure_pipeline is not None:
+            self._exposure_pipeline.close()
+        if self._manager is None:
+            self._sync_client.close()
+            close_async_client_from_sync(self._async_client)
 
     def __enter__(self):
         return self
@@ -562,9 +1368,96 @@ class LocalFeatureFlagsProvider:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         logger.info("Exiting the LocalFeatureFlagsProvider and cleaning up resources")
         await self.astop_polling_for_definitions()
-        await self._async_client.aclose()
-        self._sync_client.close()
+        if self._exposure_pipeline is not None:
+            await sync_to_async(self._exposure_pipeline.close, thread_sensitive=False)()
+        if self._manager is None:
+            await self._async_client.aclose()
+            self._sync_client.close()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         logger.info("Exiting the LocalFeatureFlagsProvider and cleaning up resources")
         self.shutdown()
+
+
+def _resolve_ready_waiter(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _log_listener_failure(future: Any) -> None:
+    if not future.cancelled() and (exc := future.exception()) is not None:
+        logger.error("Flag definitions listener failed", exc_info=exc)
+
+
+_UNRESOLVED: Any = object()
+_FAILED: Any = object()
+
+
+class _EvaluationContext:
+    """Per-call view of a context dictionary.
+
+    Hash states and the casefolded custom properties are computed at most
+    once, however many flags and rollouts the call evaluates. Custom
+    properties may be any mapping, and values that are callables are
+    called, only once a rule reads their key.
+    """
+
+    __slots__ = ("_hash_states", "_property_keys", "_resolved", "context")
+
+    def __init__(self, context: dict[str, Any]) -> None:
+        self.context = context
+        self._hash_states: dict[str, int] = {}
+        # Casefolded key -> key of the custom properties, or None if there
+        # are none.
+        self._property_keys: dict[Any, Any] | None = _UNRESOLVED
+        # Casefolded key -> casefolded value, for the properties resolved.
+        self._resolved: dict[Any, Any] = {}
+
+    def hash_state(self, context_value: Any) -> int:
+        key = str(context_value)
+        if (state := self._hash_states.get(key)) is None:
+            state = self._hash_states[key] = fnv1a64_state(key)
+        return state
+
+    def runtime_parameters(
+        self, keys: Collection[str] | None = None
+    ) -> dict[str, Any] | None:
+        """Casefolded custom properties a rule reading ``keys`` is evaluated on.
+
+        :param Collection[str] keys: Casefolded keys the rule reads, or None if it may read any
+        :return: The resolved properties among ``keys``, or None if there are no custom properties or one of them failed to resolve
+        """
+        if self._property_keys is _UNRESOLVED:
+            custom_properties = self.context.get("custom_properties")
+            if not custom_properties or not isinstance(custom_properties, Mapping):
+                self._property_keys = None
+            else:
+                self._property_keys = {
+                    (key.casefold() if isinstance(key, str) else key): key
+                    for key in custom_properties
+                }
+        if self._property_keys is None:
+            return None
+
+        if keys is None:
+            keys = self._property_keys
+        parameters = {}
+        for key in keys:
+            if key not in self._resolved:
+                if key not in self._property_keys:
+                    continue
+                self._resolved[key] = self._resolve(self._property_keys[key])
+            if (value := self._resolved[key]) is _FAILED:
+                return None
+            parameters[key] = value
+        return parameters
+
+    def _resolve(self, key: Any) -> Any:
+        value = self.context["custom_properties"][key]
+        if callable(value):
+            try:
+                value = value()
+            except Exception:
+                logger.exception("Failed to resolve custom property '%s'", key)
+                return _FAILED
+        return casefold_keys_and_values(value)
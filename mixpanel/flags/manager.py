@@ -0,0 +1,197 @@
+"""Local flag definitions for many projects served from one thread and pool."""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Callable
+
+import httpx
+
+from .local_feature_flags import LocalFeatureFlagsProvider
+from .utils import REQUEST_HEADERS, polling_delay
+
+if TYPE_CHECKING:
+    from mixpanel.credentials import ServiceAccountCredentials
+
+    from .types import LocalFlagsConfig
+
+logger = logging.getLogger(__name__)
+
+
+class _Polling:
+    __slots__ = ("failures", "interval_in_seconds", "sequence")
+
+    def __init__(self, interval_in_seconds: float, sequence: int) -> None:
+        self.interval_in_seconds = interval_in_seconds
+        self.sequence = sequence
+        self.failures = 0
+
+
+class LocalFlagsManager:
+    """Shares one polling thread and one HTTP connection pool between projects.
+
+    Each ``add_project`` call returns a ``LocalFeatureFlagsProvider`` that
+    fetches definitions through the manager's client (one per API host)
+    and, once ``start_polling_for_definitions`` is called, is polled by the
+    manager's scheduler thread. First polls are spread across each
+    project's polling interval so projects do not fetch at the same time.
+    Managed projects are always polled; ``enable_streaming`` is ignored.
+    """
+
+    def __init__(
+        self, request_timeout_in_seconds: float = 10, max_connections: int = 10
+    ) -> None:
+        """Initialize the LocalFlagsManager.
+
+        :param float request_timeout_in_seconds: Timeout of every definitions request
+        :param int max_connections: Maximum number of connections per API host
+        """
+        self._request_timeout_in_seconds = request_timeout_in_seconds
+        self._max_connections = max_connections
+        self._clients: dict[str, httpx.Client] = {}
+        self._polling: dict[LocalFeatureFlagsProvider, _Polling] = {}
+        # (due time, sequence, provider); entries whose sequence no longer
+        # matches the provider's _Polling were cancelled.
+        self._queue: list[tuple[float, int, LocalFeatureFlagsProvider]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._scheduler: threading.Thread | None = None
+        self._closed = False
+
+    def add_project(
+        self,
+        token: str,
+        config: LocalFlagsConfig,
+        version: str,
+        tracker: Callable,
+        credentials: ServiceAccountCredentials | None = None,
+        batch_tracker: Callable | None = None,
+    ) -> LocalFeatureFlagsProvider:
+        """Create a provider for one project whose definitions this manager polls.
+
+        Takes the same arguments as ``LocalFeatureFlagsProvider``.
+        """
+        return LocalFeatureFlagsProvider(
+            token,
+            config,
+            version,
+            tracker,
+            credentials,
+            batch_tracker=batch_tracker,
+            manager=self,
+        )
+
+    def http_client(self, api_host: str) -> httpx.Client:
+        """The shared client for requests to ``api_host``, used by managed providers."""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The flags manager is closed")
+            if (client := self._clients.get(api_host)) is None:
+                client = self._clients[api_host] = httpx.Client(
+                    base_url=f"https://{api_host}",
+                    headers=REQUEST_HEADERS,
+                    timeout=httpx.Timeout(self._request_timeout_in_seconds),
+                    limits=httpx.Limits(max_connections=self._max_connections),
+                )
+            return client
+
+    def schedule_polling(
+        self,
+        provider: LocalFeatureFlagsProvider,
+        interval_in_seconds: float,
+        immediately: bool = False,
+    ) -> None:
+        """Start polling a provider's definitions every ``interval_in_seconds``.
+
+        :param LocalFeatureFlagsProvider provider: A provider created by add_project
+        :param float interval_in_seconds: The provider's polling interval
+        :param bool immediately: Poll right away instead of at a random point within the first interval
+        """
+        first_delay = 0.0 if immediately else random.uniform(0, interval_in_seconds)  # noqa: S311 - not used for security
+        with self._condition:
+            if provider in self._polling:
+                logger.warning("A polling task is already running")
+                return
+            polling = _Polling(interval_in_seconds, next(self._sequence))
+            self._polling[provider] = polling
+            self._push(provider, polling, first_delay)
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._run, daemon=True)
+                self._scheduler.start()
+
+    def cancel_polling(self, provider: LocalFeatureFlagsProvider) -> bool:
+        """Stop polling a provider's definitions.
+
+        :return: Whether the provider was being polled
+        """
+        with self._condition:
+            return self._polling.pop(provider, None) is not None
+
+    def polled_project_count(self) -> int:
+        with self._condition:
+            return len(self._polling)
+
+    def close(self) -> None:
+        """Stop the scheduler thread and close the shared clients."""
+        with self._condition:
+            self._closed = True
+            self._polling.clear()
+            self._queue.clear()
+            self._condition.notify_all()
+            scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None and scheduler is not threading.current_thread():
+            scheduler.join()
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _push(
+        self, provider: LocalFeatureFlagsProvider, polling: _Polling, delay: float
+    ) -> None:
+        heapq.heappush(
+            self._queue, (time.monotonic() + delay, polling.sequence, provider)
+        )
+        self._condition.notify()
+
+    def _next_due(self) -> tuple[LocalFeatureFlagsProvider, _Polling] | None:
+        """Wait for the next provider that is due, or None once closed."""
+        with self._condition:
+            while not self._closed:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                due, sequence, provider = self._queue[0]
+                if (delay := due - time.monotonic()) > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                polling = self._polling.get(provider)
+                if polling is not None and polling.sequence == sequence:
+                    return provider, polling
+            return None
+
+    def _run(self) -> None:
+        while (due := self._next_due()) is not None:
+            provider, polling = due
+            try:
+                current = provider.refresh_definitions()
+            except Exception:
+                logger.exception("Failed to refresh flag definitions")
+                current = False
+            polling.failures = 0 if current else polling.failures + 1
+
+            with self._condition:
+                if self._polling.get(provider) is polling:
+                    delay = polling_delay(polling.interval_in_seconds, polling.failures)
+                    self._push(provider, polling, delay)
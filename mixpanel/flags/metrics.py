@@ -0,0 +1,117 @@
+"""Metrics emitted by the flag providers through a configured callback.
+
+Set ``FlagsConfig.metrics_callback`` to a function receiving each
+``Metric`` and forward it to a sink such as a Prometheus registry or a
+StatsD client. Without a callback no metrics are built.
+
+Counters:
+
+- ``EVALUATIONS``: tagged with ``mode``, ``flag``, ``source`` and
+  ``reason`` (the fallback reason kind, or ``"none"``).
+- ``DEFINITIONS_FETCH_ERRORS``: definitions fetches that failed before a
+  response was handled.
+- ``REMOTE_REQUESTS``: tagged with ``result``, ``"success"`` or ``"error"``.
+- ``REMOTE_CACHE_LOOKUPS``: response cache lookups, tagged with ``result``:
+  ``"hit"``, ``"miss"`` or ``"stale"`` (served after a failed request).
+
+Histograms:
+
+- ``EVALUATION_DURATION``: seconds, tagged with ``mode``.
+- ``DEFINITIONS_FETCH_DURATION``: seconds, tagged with ``status``.
+- ``DEFINITIONS_PAYLOAD_SIZE``: bytes of each definitions payload received.
+- ``DEFINITIONS_PARSE_DURATION``: seconds spent compiling changed definitions.
+- ``REMOTE_REQUEST_DURATION``: seconds of each remote /flags request.
+
+Gauges:
+
+- ``DEFINITIONS_AGE``: seconds since the definitions were last known to be
+  up to date, sampled after each refresh.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Callable, Literal, NamedTuple
+
+if TYPE_CHECKING:
+    from .types import FlagsConfig, SelectedVariant
+
+logger = logging.getLogger(__name__)
+
+EVALUATIONS = "mixpanel.flags.evaluations"
+EVALUATION_DURATION = "mixpanel.flags.evaluation.duration"
+DEFINITIONS_FETCH_DURATION = "mixpanel.flags.definitions.fetch.duration"
+DEFINITIONS_FETCH_ERRORS = "mixpanel.flags.definitions.fetch.errors"
+DEFINITIONS_PAYLOAD_SIZE = "mixpanel.flags.definitions.payload.size"
+DEFINITIONS_PARSE_DURATION = "mixpanel.flags.definitions.parse.duration"
+DEFINITIONS_AGE = "mixpanel.flags.definitions.age"
+REMOTE_REQUESTS = "mixpanel.flags.remote.requests"
+REMOTE_REQUEST_DURATION = "mixpanel.flags.remote.request.duration"
+REMOTE_CACHE_LOOKUPS = "mixpanel.flags.remote.cache.lookups"
+
+
+class Metric(NamedTuple):
+    name: str
+    kind: Literal["counter", "histogram", "gauge"]
+    value: float
+    tags: dict[str, str]
+
+
+def create_flag_metrics(config: FlagsConfig) -> FlagMetrics | None:
+    """Create the metrics recorder configured by ``config``, if any."""
+    if config.metrics_callback is None:
+        return None
+    return FlagMetrics(config.metrics_callback)
+
+
+class FlagMetrics:
+    """Builds metrics and hands them to a callback.
+
+    A failing callback is logged once and otherwise ignored, so metrics
+    never break flag evaluation.
+    """
+
+    def __init__(self, callback: Callable[[Metric], None]) -> None:
+        self._callback = callback
+        self._callback_failed = False
+
+    def increment(self, name: str, tags: dict[str, str] | None = None) -> None:
+        self._emit(Metric(name, "counter", 1, tags or {}))
+
+    def observe(
+        self, name: str, value: float, tags: dict[str, str] | None = None
+    ) -> None:
+        self._emit(Metric(name, "histogram", value, tags or {}))
+
+    def gauge(
+        self, name: str, value: float, tags: dict[str, str] | None = None
+    ) -> None:
+        self._emit(Metric(name, "gauge", value, tags or {}))
+
+    def evaluation(
+        self,
+        mode: str,
+        flag_key: str,
+        variant: SelectedVariant,
+        duration_in_seconds: float,
+    ) -> None:
+        """Record one flag evaluation and its duration."""
+        reason = variant.fallback_reason
+        self.increment(
+            EVALUATIONS,
+            {
+                "mode": mode,
+                "flag": flag_key,
+                "source": variant.variant_source or "",
+                "reason": reason.kind if reason is not None else "none",
+            },
+        )
+        self.observe(EVALUATION_DURATION, duration_in_seconds, {"mode": mode})
+
+    def _emit(self, metric: Metric) -> None:
+        try:
+            self._callback(metric)
+        except Exception:
+            if not self._callback_failed:
+                self._callback_failed = True
+                logger.exception("Flag metrics callback failed")
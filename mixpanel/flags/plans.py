@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+from pydantic_core import to_json
+
+try:
+    from pydantic_core import from_json
+except ImportError:  # pydantic-core < 2.14 (pydantic < 2.5)
+    from_json = None
+
+from .rules import (
+    CompiledRule,
+    casefold_leaf_nodes,
+    compile_rule,
+    referenced_variables,
+)
+from .types import (
+    ExperimentationFlag,
+    ExperimentationFlags,
+    Rollout,
+    SelectedVariant,
+    VariantSource,
+)
+from .utils import encode_salt
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class RolloutPlan(NamedTuple):
+    """Precomputed state for a single rollout of a flag."""
+
+    rollout: Rollout
+    rollout_percentage: float
+    salt: bytes
+    # ``runtime_evaluation_rule`` with its string leaves casefolded, compiled
+    # once; None when the rollout has no rule.
+    rule: CompiledRule | None
+    # Variant forced by ``rollout.variant_override``; None when the override
+    # is absent or names a variant that does not exist on the flag.
+    override: SelectedVariant | None
+    # (cumulative split, variant) pairs in variant-key order, with the
+    # rollout's ``variant_splits`` already applied.
+    split_table: tuple[tuple[float, SelectedVariant], ...]
+    # Whether eligibility depends on the context's custom properties, i.e.
+    # the rollout has a runtime rule or legacy runtime definition.
+    has_runtime_rule: bool
+    # Casefolded custom property keys the runtime rule reads (legacy
+    # definition keys as written); None if it may read any.
+    runtime_properties: frozenset[str] | None
+
+
+class FlagPlan(NamedTuple):
+    """Immutable evaluation plan compiled from an ``ExperimentationFlag``.
+
+    Built once per definitions refresh so that ``get_variant`` only has to
+    hash the context value and walk precomputed tables. Salts are stored
+    UTF-8 encoded, ready to resume a context value's FNV-1a state. The
+    variants held by the plan are shared between evaluations and must not
+    be mutated.
+    """
+
+    flag: ExperimentationFlag
+    context: str
+    variant_salt: bytes
+    rollouts: tuple[RolloutPlan, ...]
+    # distinct_id -> QA variant, only for test users whose variant exists.
+    test_users: dict[str, SelectedVariant]
+    # Whether any rollout has a runtime rule.
+    has_runtime_rules: bool
+    # Custom property keys read by any rollout's runtime rule; None if the
+    # rules may read any.
+    runtime_properties: frozenset[str] | None
+
+
+class CompiledDefinitions(NamedTuple):
+    """Evaluation plans for every flag of one definitions payload.
+
+    A snapshot is never mutated once built: a refresh builds a new one and
+    swaps it in, so an evaluation that reads it once sees consistent plans.
+    """
+
+    flags: dict[str, FlagPlan]
+    # Plans grouped by context attribute, so evaluating all flags looks up
+    # and hashes each context value once per group.
+    by_context: dict[str, tuple[FlagPlan, ...]]
+    # Increases by one with every changed payload a provider loads; 0 until
+    # the first one.
+    version: int = 0
+
+
+EMPTY_DEFINITIONS = CompiledDefinitions(flags={}, by_context={})
+
+
+class DefinitionsChange(NamedTuple):
+    """Flags that differ between two definitions snapshots."""
+
+    # Version of the new definitions.
+    version: int
+    added: frozenset[str]
+    removed: frozenset[str]
+    changed: frozenset[str]
+
+    @property
+    def flag_keys(self) -> frozenset[str]:
+        """Keys of every added, removed or changed flag."""
+        return self.added | self.removed | self.changed
+
+
+def diff_definitions(
+    old: CompiledDefinitions, new: CompiledDefinitions
+) -> DefinitionsChange:
+    """Compare two snapshots flag by flag.
+
+    Plans are compared by identity: ``DefinitionsCompiler`` reuses the plan
+    of every flag whose definition is unchanged, so any other plan is a
+    change.
+    """
+    old_keys, new_keys = old.flags.keys(), new.flags.keys()
+    return DefinitionsChange(
+        version=new.version,
+        added=frozenset(new_keys - old_keys),
+        removed=frozenset(old_keys - new_keys),
+        changed=frozenset(
+            key for key in old_keys & new_keys if old.flags[key] is not new.flags[key]
+        ),
+    )
+
+
+def flag_key_filter(
+    keys: Collection[str] | None, prefixes: Collection[str] | None
+) -> Callable[[str], bool] | None:
+    """Predicate matching flag keys in ``keys`` or starting with one of ``prefixes``.
+
+    :return: The predicate, or None if neither is given and every flag matches
+    """
+    if keys is None and prefixes is None:
+        return None
+    key_set = frozenset(keys or ())
+    prefix_tuple = tuple(prefixes or ())
+    return lambda key: key in key_set or key.startswith(prefix_tuple)
+
+
+class DefinitionsCompiler:
+    """Compiles definitions payloads, reusing plans of unchanged flags.
+
+    Each flag's raw JSON is fingerprinted; flags whose fingerprint was seen
+    in the previous payload keep their validated ``ExperimentationFlag`` and
+    compiled plan, so a refresh only validates and compiles what changed.
+    Flags whose key ``key_filter`` rejects are dropped before validation.
+    """
+
+    def __init__(self, key_filter: Callable[[str], bool] | None = None) -> None:
+        self._key_filter = key_filter
+        self._plans_by_fingerprint: dict[bytes, FlagPlan] = {}
+
+    def compile_payload(
+        self, content: bytes, require_flags: bool = False
+    ) -> CompiledDefinitions:
+        """Decode a raw ``/flags/definitions`` response body and compile it."""
+        return self.compile(decode_json(content), require_flags)
+
+    def compile(
+        self, json_data: Any, require_flags: bool = False
+    ) -> CompiledDefinitions:
+        """Validate and compile a decoded ``/flags/definitions`` payload.
+
+        Raises if the payload or any flag fails validation, or if
+        ``require_flags`` is set and the payload has no flags at all, in
+        which case the plans of the previous payload remain available for
+        reuse. A payload whose flags are all rejected by ``key_filter`` is
+        valid and compiles to no flags.
+        """
+        raw_flags = json_data.get("flags") if isinstance(json_data, dict) else None
+        if not isinstance(raw_flags, list):
+            # Let pydantic describe what is wrong with the payload.
+            flags = ExperimentationFlags.model_validate(json_data).flags
+            return compile_definitions(flags)
+        if require_flags and not raw_flags:
+            raise ValueError("Received no flag definitions")
+
+        if self._key_filter is not None:
+            raw_flags = [raw_flag for raw_flag in raw_flags if self._wanted(raw_flag)]
+
+        plans_by_fingerprint: dict[bytes, FlagPlan] = {}
+        plans = []
+        for raw_flag in raw_flags:
+            fingerprint = _fingerprint(raw_flag)
+            plan = self._plans_by_fingerprint.get(fingerprint)
+            if plan is None:
+                plan = _sort_and_compile(ExperimentationFlag.model_validate(raw_flag))
+            plans_by_fingerprint[fingerprint] = plan
+            plans.append(plan)
+
+        logger.debug(
+            "Compiled %s of %s flag definitions, reused the rest",
+            len(plans_by_fingerprint.keys() - self._plans_by_fingerprint.keys()),
+            len(plans),
+        )
+        self._plans_by_fingerprint = plans_by_fingerprint
+        return index_plans(plans)
+
+    def _wanted(self, raw_flag: Any) -> bool:
+        key = raw_flag.get("key") if isinstance(raw_flag, dict) else None
+        # Keep malformed flags so that validation reports them.
+        return not isinstance(key, str) or self._key_filter(key)
+
+
+def compile_definitions(flags: Iterable[ExperimentationFlag]) -> CompiledDefinitions:
+    """Sort each flag's variants by key and compile the flags into plans."""
+    return index_plans(_sort_and_compile(flag) for flag in flags)
+
+
+def index_plans(plans: Iterable[FlagPlan]) -> CompiledDefinitions:
+    """Index plans by flag key and by context attribute; later keys win."""
+    flags = {plan.flag.key: plan for plan in plans}
+
+    by_context: dict[str, list[FlagPlan]] = {}
+    for plan in flags.values():
+        by_context.setdefault(plan.context, []).append(plan)
+
+    return CompiledDefinitions(
+        flags=flags,
+        by_context={context: tuple(group) for context, group in by_context.items()},
+    )
+
+
+def _sort_and_compile(flag: ExperimentationFlag) -> FlagPlan:
+    flag.ruleset.variants.sort(key=lambda variant: variant.key)
+    return compile_flag(flag)
+
+
+def decode_json(content: bytes) -> Any:
+    """Decode JSON straight from bytes.
+
+    Uses pydantic-core's parser where available, which shares repeated
+    strings (keys, variant names) between objects instead of allocating
+    one copy per occurrence.
+    """
+    if from_json is None:
+        return json.loads(content)
+    return from_json(content)
+
+
+def _fingerprint(raw_flag: Any) -> bytes:
+    # Key order is taken as sent; a server reordering keys only costs a
+    # recompile, never a stale plan.
+    return hashlib.blake2b(to_json(raw_flag), digest_size=16).digest()
+
+
+def compile_flag(flag: ExperimentationFlag) -> FlagPlan:
+    """Compile a flag definition into an evaluation plan.
+
+    Variants must already be sorted by key, as done when definitions load.
+    """
+    qa_variants: dict[str, SelectedVariant] = {}
+    for variant in flag.ruleset.variants:
+        qa_variants.setdefault(
+            variant.key.casefold(),
+            SelectedVariant(
+                variant_key=variant.key,
+                variant_value=variant.value,
+                experiment_id=flag.experiment_id,
+                is_experiment_active=flag.is_experiment_active,
+                is_qa_tester=True,
+                variant_source=VariantSource.LOCAL,
+            ),
+        )
+
+    test_users: dict[str, SelectedVariant] = {}
+    if flag.ruleset.test and flag.ruleset.test.users:
+        for distinct_id, variant_key in flag.ruleset.test.users.items():
+            if variant_key and (qa_variant := qa_variants.get(variant_key.casefold())):
+                test_users[distinct_id] = qa_variant
+
+    stored_salt = flag.hash_salt if flag.hash_salt is not None else ""
+    rollouts = tuple(
+        _compile_rollout(flag, index, rollout, qa_variants)
+        for index, rollout in enumerate(flag.ruleset.rollout)
+    )
+
+    runtime_properties: frozenset[str] | None = frozenset()
+    for rollout_plan in rollouts:
+        if runtime_properties is None or rollout_plan.runtime_properties is None:
+            runtime_properties = None
+        else:
+            runtime_properties |= rollout_plan.runtime_properties
+
+    return FlagPlan(
+        flag=flag,
+        context=flag.context,
+        variant_salt=encode_salt(flag.key + stored_salt + "variant"),
+        rollouts=rollouts,
+        test_users=test_users,
+        has_runtime_rules=any(plan.has_runtime_rule for plan in rollouts),
+        runtime_properties=runtime_properties,
+    )
+
+
+def select_variant(rollout_plan: RolloutPlan, variant_hash: float) -> SelectedVariant:
+    """Pick the variant whose cumulative split bucket contains ``variant_hash``."""
+    selected = rollout_plan.split_table[0][1]
+    for cumulative, variant in rollout_plan.split_table:
+        selected = variant
+        if variant_hash < cumulative:
+            break
+    return selected
+
+
+def _compile_rollout(
+    flag: ExperimentationFlag,
+    index: int,
+    rollout: Rollout,
+    qa_variants: dict[str, SelectedVariant],
+) -> RolloutPlan:
+    if flag.hash_salt is not None:
+        salt = flag.key + flag.hash_salt + str(index)
+    else:
+        salt = flag.key + "rollout"
+
+    rule = None
+    runtime_properties: frozenset[str] | None = frozenset()
+    if rollout.runtime_evaluation_rule:
+        casefolded_rule = casefold_leaf_nodes(rollout.runtime_evaluation_rule)
+        rule = compile_rule(casefolded_rule)
+        runtime_properties = referenced_variables(casefolded_rule)
+    elif rollout.runtime_evaluation_definition:
+        runtime_properties = frozenset(rollout.runtime_evaluation_definition)
+
+    override = None
+    if rollout.variant_override:
+        override = qa_variants.get(rollout.variant_override.key.casefold())
+
+    splits = rollout.variant_splits or {}
+    split_table = []
+    cumulative = 0.0
+    for variant in flag.ruleset.variants:
+        split = splits.get(variant.key, variant.split)
+        cumulative += split or 0.0
+        split_table.append(
+            (
+                cumulative,
+                SelectedVariant(
+                    variant_key=variant.key,
+                    variant_value=variant.value,
+                    experiment_id=flag.experiment_id,
+                    is_experiment_active=flag.is_experiment_active,
+                    variant_source=VariantSource.LOCAL,
+                ),
+            )
+        )
+
+    return RolloutPlan(
+        rollout=rollout,
+        rollout_percentage=rollout.rollout_percentage,
+        salt=encode_salt(salt),
+        rule=rule,
+        override=override,
+        split_table=tuple(split_table),
+        has_runtime_rule=bool(
+            rollout.runtime_evaluation_rule or rollout.runtime_evaluation_definition
+        ),
+        runtime_properties=runtime_properties,
+    )
@@ -3,6 +3,7 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import time
 from datetime import datetime
 from typing import Any, Callable
 
@@ -11,6 +12,18 @@ from asgiref.sync import sync_to_async
 
 from mixpanel.credentials import ServiceAccountCredentials
 
+from .cache import ResponseCache, canonical_context
+from .exposures import (
+    ExposureDeduplicator,
+    ExposurePipelineStats,
+    create_exposure_pipeline,
+)
+from .metrics import (
+    REMOTE_CACHE_LOOKUPS,
+    REMOTE_REQUEST_DURATION,
+    REMOTE_REQUESTS,
+    create_flag_metrics,
+)
 from .types import (
     FallbackReason,
     RemoteFlagsConfig,
@@ -41,6 +54,7 @@ class RemoteFeatureFlagsProvider:
         version: str,
         tracker: Callable,
         credentials: ServiceAccountCredentials | None = None,
+        batch_tracker: Callable | None = None,
     ) -> None:
         """Initialize the RemoteFeatureFlagsProvider.
 
@@ -49,6 +63,7 @@ class RemoteFeatureFlagsProvider:
         :param str version: the version of the Mixpanel library being used, just for tracking
         :param Callable tracker: A function used to track flags exposure events to mixpanel
         :param ServiceAccountCredentials credentials: Optional service account credentials for authentication.
+        :param Callable batch_tracker: Optional function tracking a list of (distinct_id, properties) events with one name at once, used to send queued exposure events
         """
         self._token: str = token
         self._config: RemoteFlagsConfig = config
@@ -56,6 +71,21 @@ class RemoteFeatureFlagsProvider:
         self._tracker: Callable = tracker
         self._credentials = credentials
         self._project_id: str | None = credentials.project_id if credentials else None
+        self._exposures = ExposureDeduplicator(
+            config.exposure_dedup_ttl_in_seconds, config.exposure_dedup_max_entries
+        )
+        self._exposure_pipeline = create_exposure_pipeline(
+            config, tracker, batch_tracker
+        )
+        self._metrics = create_flag_metrics(config)
+
+        self._response_cache: ResponseCache | None = None
+        if config.response_cache_max_entries is not None:
+            self._response_cache = ResponseCache(
+                config.response_cache_max_entries,
+                config.response_cache_ttl_in_seconds,
+                config.response_cache_stale_if_error_in_seconds,
+            )
 
         # Build httpx client parameters
         if credentials:
@@ -88,23 +118,12 @@ class RemoteFeatureFlagsProvider:
         :param Dict[str, Any] context: Context dictionary containing user attributes and rollout context
         :return: A dictionary mapping flag keys to their selected variants, or None if the call fails
         """
-        flags: dict[str, SelectedVariant] | None = None
         try:
-            params = self._prepare_query_params(context)
-            start_time = datetime.now()  # noqa: DTZ005
-            headers = {"traceparent": generate_traceparent()}
-            response = await self._async_client.get(
-                self.FLAGS_URL_PATH, params=params, headers=headers
-            )
-            end_time = datetime.now()  # noqa: DTZ005
-            self._instrument_call(start_time, end_time)
-            flags = self._handle_response(response)
+            flags, _, _ = await self._aget_flags(context)
         except Exception:
             logger.exception("Failed to get remote variants")
-
-        if flags is not None:
-            flags = {k: v.with_source(VariantSource.REMOTE) for k, v in flags.items()}
-        return flags
+            return None
+        return self._hand_out(flags)
 
     async def aget_variant_value(
         self, flag_key: str, fallback_value: Any, context: dict[str, Any]
@@ -134,33 +153,52 @@ class RemoteFeatureFlagsProvider:
         :param Dict[str, Any] context: Context dictionary containing user attributes and rollout context
         :param bool reportExposure: Whether to report an exposure event if a variant is successfully retrieved
         """
-        try:
-            params = self._prepare_query_params(context, flag_key)
-            start_time = datetime.now()  # noqa: DTZ005
-            headers = {"traceparent": generate_traceparent()}
-            response = await self._async_client.get(
-                self.FLAGS_URL_PATH, params=params, headers=headers
+        if self._metrics is None:
+            return await self._aget_variant(
+                flag_key, fallback_value, context, reportExposure
             )
-            end_time = datetime.now()  # noqa: DTZ005
-            self._instrument_call(start_time, end_time)
-            flags = self._handle_response(response)
+
+        start_time = time.perf_counter()
+        variant = await self._aget_variant(
+            flag_key, fallback_value, context, reportExposure
+        )
+        self._metrics.evaluation(
+            "remote", flag_key, variant, time.perf_counter() - start_time
+        )
+        return variant
+
+    async def _aget_variant(
+        self,
+        flag_key: str,
+        fallback_value: SelectedVariant,
+        context: dict[str, Any],
+        report_exposure: bool,
+    ) -> SelectedVariant:
+        try:
+            flags, start_time, end_time = await self._aget_flags(context, flag_key)
             selected_variant, is_fallback = self._lookup_flag_in_response(
                 flag_key, flags, fallback_value
             )
 
             if (
                 not is_fallback
-                and reportExposure
+                and report_exposure
                 and (distinct_id := context.get("distinct_id"))
+                and self._exposures.first_exposure(
+                    distinct_id, flag_key, selected_variant
+                )
             ):
                 properties = self._build_tracking_properties(
                     flag_key, selected_variant, start_time, end_time
                 )
-                asyncio.create_task(  # noqa: RUF006 - intentional fire-and-forget for exposure tracking
-                    sync_to_async(self._tracker, thread_sensitive=False)(
-                        distinct_id, EXPOSURE_EVENT, properties
+                if self._exposure_pipeline is not None:
+                    self._exposure_pipeline.submit(distinct_id, properties)
+                else:
+                    asyncio.create_task(  # noqa: RUF006 - intentional fire-and-forget for exposure tracking
+                        sync_to_async(self._tracker, thread_sensitive=False)(
+                            distinct_id, EXPOSURE_EVENT, properties
+                        )
                     )
-                )
         except Exception as exc:
             logger.exception("Failed to get remote variant for flag '%s'", flag_key)
             # SDK-83: attach the exception message so the OpenFeature wrapper
@@ -194,8 +232,13 @@ class RemoteFeatureFlagsProvider:
         :param Dict[str, Any] context: The user context used to evaluate the feature flag
         """
         if distinct_id := context.get("distinct_id"):
+            if not self._exposures.first_exposure(distinct_id, flag_key, variant):
+                return
             properties = self._build_tracking_properties(flag_key, variant)
 
+            if self._exposure_pipeline is not None:
+                self._exposure_pipeline.submit(distinct_id, properties)
+                return
             await sync_to_async(self._tracker, thread_sensitive=False)(
                 distinct_id, EXPOSURE_EVENT, properties
             )
@@ -212,23 +255,12 @@ class RemoteFeatureFlagsProvider:
         :param Dict[str, Any] context: Context dictionary containing user attributes and rollout context
         :return: A dictionary mapping flag keys to their selected variants, or None if the call fails
         """
-        flags: dict[str, SelectedVariant] | None = None
         try:
-            params = self._prepare_query_params(context)
-            start_time = datetime.now()  # noqa: DTZ005
-            headers = {"traceparent": generate_traceparent()}
-            response = self._sync_client.get(
-                self.FLAGS_URL_PATH, params=params, headers=headers
-            )
-            end_time = datetime.now()  # noqa: DTZ005
-            self._instrument_call(start_time, end_time)
-            flags = self._handle_response(response)
+            flags, _, _ = self._get_flags(context)
         except Exception:
             logger.exception("Failed to get remote variants")
-
-        if flags is not None:
-            flags = {k: v.with_source(VariantSource.REMOTE) for k, v in flags.items()}
-        return flags
+            return None
+        return self._hand_out(flags)
 
     def get_variant_value(
         self, flag_key: str, fallback_value: Any, context: dict[str, Any]
@@ -258,25 +290,36 @@ class RemoteFeatureFlagsProvider:
         :param Dict[str, Any] context: Context dictionary containing user attributes and rollout context
         :param bool reportExposure: Whether to report an exposure event if a variant is successfully retrieved
         """
-        try:
-            params = self._prepare_query_params(context, flag_key)
-            start_time = datetime.now()  # noqa: DTZ005
-            headers = {"traceparent": generate_traceparent()}
-            response = self._sync_client.get(
-                self.FLAGS_URL_PATH, params=params, headers=headers
-            )
-            end_time = datetime.now()  # noqa: DTZ005
-            self._instrument_call(start_time, end_time)
+        if self._metrics is None:
+            return self._get_variant(flag_key, fallback_value, context, reportExposure)
 
-            flags = self._handle_response(response)
+        start_time = time.perf_counter()
+        variant = self._get_variant(flag_key, fallback_value, context, reportExposure)
+        self._metrics.evaluation(
+            "remote", flag_key, variant, time.perf_counter() - start_time
+        )
+        return variant
+
+    def _get_variant(
+        self,
+        flag_key: str,
+        fallback_value: SelectedVariant,
+        context: dict[str, Any],
+        report_exposure: bool,
+    ) -> SelectedVariant:
+        try:
+            flags, start_time, end_time = self._get_flags(context, flag_key)
             selected_variant, is_fallback = self._lookup_flag_in_response(
                 flag_key, flags, fallback_value
             )
 
             if (
                 not is_fallback
-                and reportExposure
+                and report_exposure
                 and (distinct_id := context.get("distinct_id"))
+                and self._exposures.first_exposure(
+                    distinct_id, flag_key, selected_variant
+                )
             ):
                 properties = self._build_tracking_properties(
                     flag_key, selected_variant, start_time, end_time
@@ -314,6 +357,8 @@ class RemoteFeatureFlagsProvider:
         :param Dict[str, Any] context: The user context used to evaluate the feature flag
         """
         if distinct_id := context.get("distinct_id"):
+            if not self._exposures.first_exposure(distinct_id, flag_key, variant):
+                return
             properties = self._build_tracking_properties(flag_key, variant)
             self._dispatch_exposure(distinct_id, properties)
         else:
@@ -321,11 +366,131 @@ class RemoteFeatureFlagsProvider:
                 "Cannot track exposure event without a distinct_id in the context"
             )
 
+    def exposure_stats(self) -> ExposurePipelineStats | None:
+        """Counts of exposure events queued, sent, dropped and failed.
+
+        :return: The counts, or None unless exposures are queued (see exposure_queue_size)
+        """
+        if self._exposure_pipeline is None:
+            return None
+        return self._exposure_pipeline.stats()
+
     def _dispatch_exposure(self, distinct_id: str, properties: dict[str, Any]) -> None:
+        if self._exposure_pipeline is not None:
+            self._exposure_pipeline.submit(distinct_id, properties)
+            return
         dispatch_exposure(
             self._tracker, self._config.exposure_executor, distinct_id, properties
         )
 
+    async def _aget_flags(
+        self, context: dict[str, Any], flag_key: str | None = None
+    ) -> tuple[dict[str, SelectedVariant], datetime | None, datetime | None]:
+        """Asynchronous version of _get_flags."""
+        if self._response_cache is None:
+            return await self._arequest_flags(context, flag_key)
+
+        key = canonical_context(context)
+        if (flags := self._response_cache.get(key)) is not None:
+            self._record_cache_lookup("hit")
+            return flags, None, None
+        try:
+            flags, start_time, end_time = await self._arequest_flags(context)
+        except Exception as exc:
+            if (flags := self._stale_flags(key, exc)) is None:
+                raise
+            return flags, None, None
+        self._record_cache_lookup("miss")
+        self._response_cache.put(key, flags)
+        return flags, start_time, end_time
+
+    def _get_flags(
+        self, context: dict[str, Any], flag_key: str | None = None
+    ) -> tuple[dict[str, SelectedVariant], datetime | None, datetime | None]:
+        """Variants of the context's flags, from the response cache or a request.
+
+        With the cache enabled, all flags are requested even for a single
+        ``flag_key``, and the returned variants are shared with the cache;
+        hand them out through _hand_out or _lookup_flag_in_response.
+
+        :return: The variants and the start and end time of the request, which are None for cached responses
+        """
+        if self._response_cache is None:
+            return self._request_flags(context, flag_key)
+
+        key = canonical_context(context)
+        if (flags := self._response_cache.get(key)) is not None:
+            self._record_cache_lookup("hit")
+            return flags, None, None
+        try:
+            flags, start_time, end_time = self._request_flags(context)
+        except Exception as exc:
+            if (flags := self._stale_flags(key, exc)) is None:
+                raise
+            return flags, None, None
+        self._record_cache_lookup("miss")
+        self._response_cache.put(key, flags)
+        return flags, start_time, end_time
+
+    def _stale_flags(
+        self, key: str, error: Exception
+    ) -> dict[str, SelectedVariant] | None:
+        """The expired response for ``key``, if it may be served after a failed request."""
+        flags = self._response_cache.get_stale(key)
+        if flags is not None:
+            logger.warning(
+                "Failed to get remote variants, serving a cached response",
+                exc_info=error,
+            )
+            self._record_cache_lookup("stale")
+        return flags
+
+    async def _arequest_flags(
+        self, context: dict[str, Any], flag_key: str | None = None
+    ) -> tuple[dict[str, SelectedVariant], datetime, datetime]:
+        try:
+            params = self._prepare_query_params(context, flag_key)
+            start_time = datetime.now()  # noqa: DTZ005
+            headers = {"traceparent": generate_traceparent()}
+            response = await self._async_client.get(
+                self.FLAGS_URL_PATH, params=params, headers=headers
+            )
+            end_time = datetime.now()  # noqa: DTZ005
+            self._instrument_call(start_time, end_time)
+            flags = self._handle_response(response)
+        except Exception:
+            self._record_remote_request(success=False)
+            raise
+        self._record_remote_request(success=True)
+        return flags, start_time, end_time
+
+    def _request_flags(
+        self, context: dict[str, Any], flag_key: str | None = None
+    ) -> tuple[dict[str, SelectedVariant], datetime, datetime]:
+        try:
+            params = self._prepare_query_params(context, flag_key)
+            start_time = datetime.now()  # noqa: DTZ005
+            headers = {"traceparent": generate_traceparent()}
+            response = self._sync_client.get(
+                self.FLAGS_URL_PATH, params=params, headers=headers
+            )
+            end_time = datetime.now()  # noqa: DTZ005
+            self._instrument_call(start_time, end_time)
+            flags = self._handle_response(response)
+        except Exception:
+            self._record_remote_request(success=False)
+            raise
+        self._record_remote_request(success=True)
+        return flags, start_time, end_time
+
+    def _hand_out(
+        self, flags: dict[str, SelectedVariant]
+    ) -> dict[str, SelectedVariant]:
+        if self._response_cache is None:
+            return flags
+        # Cached variants are shared by every lookup of the context.
+        return {key: variant.detached_copy() for key, variant in flags.items()}
+
     def _prepare_query_params(
         self, context: dict[str, Any], flag_key: str | None = None
     ) -> dict[str, str]:
@@ -346,6 +511,20 @@ class RemoteFeatureFlagsProvider:
             end_time.isoformat(),
             request_duration.total_seconds(),
         )
+        if self._metrics is not None:
+            self._metrics.observe(
+                REMOTE_REQUEST_DURATION, request_duration.total_seconds()
+            )
+
+    def _record_cache_lookup(self, result: str) -> None:
+        if self._metrics is not None:
+            self._metrics.increment(REMOTE_CACHE_LOOKUPS, {"result": result})
+
+    def _record_remote_request(self, *, success: bool) -> None:
+        if self._metrics is not None:
+            self._metrics.increment(
+                REMOTE_REQUESTS, {"result": "success" if success else "error"}
+            )
 
     def _build_tracking_properties(
         self,
@@ -378,8 +557,16 @@ class RemoteFeatureFlagsProvider:
         return tracking_properties
 
     def _handle_response(self, response: httpx.Response) -> dict[str, SelectedVariant]:
+        """Validate a /flags response into variants tagged as remote.
+
+        Each call returns new variants, so they are tagged in place rather
+        than copied.
+        """
         response.raise_for_status()
-        flags_response = RemoteFlagsResponse.model_validate(response.json())
+        flags_response = RemoteFlagsResponse.model_validate_json(response.content)
+        for variant in flags_response.flags.values():
+            variant.variant_source = VariantSource.REMOTE
+            variant.fallback_reason = None
         return flags_response.flags
 
     @staticmethod
@@ -411,7 +598,10 @@ class RemoteFeatureFlagsProvider:
         fallback_value: SelectedVariant,
     ) -> tuple[SelectedVariant, bool]:
         if flag_key in flags:
-            return flags[flag_key].with_source(VariantSource.REMOTE), False
+            if self._response_cache is not None:
+                # Cached variants are shared by every lookup of the context.
+                return flags[flag_key].detached_copy(), False
+            return flags[flag_key], False
         logger.debug(
             "Flag '%s' not found in remote response. Returning fallback, '%s'",
             flag_key,
@@ -426,6 +616,8 @@ class RemoteFeatureFlagsProvider:
     def shutdown(self):
         # SDK-85: close both clients. close_async_client_from_sync raises
         # if a loop is already running — async callers should use __aexit__.
+        if self._exposure_pipeline is not None:
+            self._exposure_pipeline.close()
         self._sync_client.close()
         close_async_client_from_sync(self._async_client)
 
@@ -441,5 +633,7 @@ class RemoteFeatureFlagsProvider:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         logger.info("Exiting the RemoteFeatureFlagsProvider and cleaning up resources")
+        if self._exposure_pipeline is not None:
+            await sync_to_async(self._exposure_pipeline.close, thread_sensitive=False)()
         await self._async_client.aclose()
         self._sync_client.close()
@@ -0,0 +1,264 @@
+"""Compilation of json-logic runtime evaluation rules into Python closures.
+
+``compile_rule`` turns a rule into a callable taking the (casefolded) custom
+properties and returning exactly what ``json_logic.jsonLogic`` would, so a
+rollout's rule is parsed once per definitions refresh instead of on every
+evaluation. Like the interpreter, every operand is evaluated before its
+operator runs. Rules using operators the compiler does not know are left to
+the interpreter.
+"""
+
+from __future__ import annotations
+
+import contextlib
+from typing import Any, Callable
+
+import json_logic
+
+CompiledRule = Callable[[dict[str, Any]], Any]
+
+# Operators whose result depends on the data beyond their operands.
+_DATA_OPERATORS = {
+    "missing": json_logic.missing,
+    "missing_some": json_logic.missing_some,
+}
+# json_logic's operators, with reduce-free equivalents for and/or.
+_OPERATORS: dict[str, Callable] = {
+    **json_logic.operations,
+    "and": lambda *args: _and(args),
+    "or": lambda *args: _or(args),
+}
+# Operators not worth folding at compile time.
+_SIDE_EFFECT_OPERATORS = frozenset({"log"})
+
+
+class _UnsupportedRuleError(Exception):
+    pass
+
+
+def compile_rule(rule: Any) -> CompiledRule:
+    """Compile a json-logic rule, falling back to the interpreter if needed."""
+    try:
+        is_constant, compiled = _compile(rule)
+    except _UnsupportedRuleError:
+        return lambda data: json_logic.jsonLogic(rule, data)
+    if is_constant:
+        return lambda _data: compiled
+    return compiled
+
+
+def referenced_variables(rule: Any) -> frozenset[str] | None:
+    """Top-level data keys a json-logic rule may read.
+
+    Each ``var`` contributes the first segment of its path. Returns None if
+    the rule may read any key: when a ``var`` name is computed, or the rule
+    uses ``missing`` or ``missing_some``.
+    """
+    keys: set[str] = set()
+    if not _collect_variables(rule, keys):
+        return None
+    return frozenset(keys)
+
+
+def casefold_leaf_nodes(val: Any) -> Any:
+    """Casefold every string leaf of a rule, leaving operator keys intact."""
+    if isinstance(val, str):
+        return val.casefold()
+    if isinstance(val, list):
+        return [casefold_leaf_nodes(item) for item in val]
+    if isinstance(val, dict):
+        return {key: casefold_leaf_nodes(value) for key, value in val.items()}
+    return val
+
+
+def casefold_keys_and_values(val: Any) -> Any:
+    """Casefold every string key and value of a context value."""
+    if isinstance(val, str):
+        return val.casefold()
+    if isinstance(val, list):
+        return [casefold_keys_and_values(item) for item in val]
+    if isinstance(val, dict):
+        return {
+            (key.casefold() if isinstance(key, str) else key): casefold_keys_and_values(
+                value
+            )
+            for key, value in val.items()
+        }
+    return val
+
+
+def _compile(node: Any) -> tuple[bool, Any]:
+    """Compile one node into ``(True, value)`` or ``(False, closure)``."""
+    if not isinstance(node, dict):
+        # Primitives and list literals are returned as-is by the interpreter.
+        return True, node
+    if not node:
+        raise _UnsupportedRuleError
+
+    operator = next(iter(node))
+    values = node[operator]
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    operands = [_compile(value) for value in values]
+
+    if operator == "var":
+        return False, _compile_var(operands)
+    if operator in _DATA_OPERATORS:
+        return False, _compile_data_operator(_DATA_OPERATORS[operator], operands)
+    if operator == "in":
+        return _compile_in(operands)
+    if not isinstance(operator, str) or operator not in _OPERATORS:
+        raise _UnsupportedRuleError(operator)
+    return _compile_call(
+        _OPERATORS[operator], operands, fold=operator not in _SIDE_EFFECT_OPERATORS
+    )
+
+
+def _collect_variables(node: Any, keys: set[str]) -> bool:
+    """Add the keys ``node`` reads to ``keys``; False if it may read any key."""
+    if isinstance(node, (list, tuple)):
+        return all(_collect_variables(item, keys) for item in node)
+    if not isinstance(node, dict) or not node:
+        return True
+
+    operator = next(iter(node))
+    values = node[operator]
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+
+    if operator in _DATA_OPERATORS:
+        return False
+    if operator == "var":
+        if not values or isinstance(values[0], (dict, list, tuple)):
+            return False
+        keys.add(str(values[0]).split(".")[0])
+        # The default value may itself be a rule.
+        return _collect_variables(values[1:], keys)
+    return _collect_variables(values, keys)
+
+
+def _and(args: tuple[Any, ...]) -> Any:
+    result: Any = True
+    for arg in args:
+        if not arg:
+            return arg
+        result = arg
+    return result
+
+
+def _or(args: tuple[Any, ...]) -> Any:
+    result: Any = False
+    for arg in args:
+        if arg:
+            return arg
+        result = arg
+    return result
+
+
+def _as_closure(operand: tuple[bool, Any]) -> CompiledRule:
+    is_constant, value = operand
+    if is_constant:
+        return lambda _data: value
+    return value
+
+
+def _compile_call(
+    function: Callable, operands: list[tuple[bool, Any]], fold: bool
+) -> tuple[bool, Any]:
+    if all(is_constant for is_constant, _ in operands):
+        args = [value for _, value in operands]
+        if fold:
+            # Operands that raise are left to raise at evaluation time.
+            with contextlib.suppress(Exception):
+                return True, function(*args)
+        return False, lambda _data: function(*args)
+
+    if len(operands) == 1:
+        only = operands[0][1]
+        return False, lambda data: function(only(data))
+
+    if len(operands) == 2:  # noqa: PLR2004 - binary operators
+        return False, _compile_binary_call(function, *operands)
+
+    closures = [_as_closure(operand) for operand in operands]
+    return False, lambda data: function(*[closure(data) for closure in closures])
+
+
+def _compile_binary_call(
+    function: Callable, left_operand: tuple[bool, Any], right_operand: tuple[bool, Any]
+) -> CompiledRule:
+    (left_is_constant, left), (right_is_constant, right) = left_operand, right_operand
+    if left_is_constant:
+        return lambda data: function(left, right(data))
+    if right_is_constant:
+        return lambda data: function(left(data), right)
+    return lambda data: function(left(data), right(data))
+
+
+def _compile_in(operands: list[tuple[bool, Any]]) -> tuple[bool, Any]:
+    function = json_logic.operations["in"]
+    if len(operands) != 2 or not operands[1][0] or operands[0][0]:  # noqa: PLR2004
+        return _compile_call(function, operands, fold=True)
+
+    needle = operands[0][1]
+    haystack = operands[1][1]
+    if "__contains__" not in dir(haystack):
+
+        def never_contains(data: dict[str, Any]) -> bool:
+            # The needle is still evaluated, as the interpreter does.
+            needle(data)
+            return False
+
+        return False, never_contains
+
+    if isinstance(haystack, list):
+        try:
+            members = frozenset(haystack)
+        except TypeError:
+            pass
+        else:
+
+            def contains(data: dict[str, Any]) -> bool:
+                value = needle(data)
+                try:
+                    return value in members
+                except TypeError:
+                    # Unhashable values still compare element-wise.
+                    return value in haystack
+
+            return False, contains
+
+    return False, lambda data: needle(data) in haystack
+
+
+def _compile_var(operands: list[tuple[bool, Any]]) -> CompiledRule:
+    if not 1 <= len(operands) <= 2 or not all(  # noqa: PLR2004 - name and default
+        is_constant for is_constant, _ in operands
+    ):
+        closures = [_as_closure(operand) for operand in operands]
+        return lambda data: json_logic.get_var(
+            data, *[closure(data) for closure in closures]
+        )
+
+    name = operands[0][1]
+    default = operands[1][1] if len(operands) == 2 else None  # noqa: PLR2004
+    path = str(name).split(".")
+
+    if len(path) == 1:
+        key = path[0]
+
+        def lookup(data: Any) -> Any:
+            if type(data) is dict:
+                return data.get(key, default)
+            return json_logic.get_var(data, name, default)
+
+        return lookup
+
+    return lambda data: json_logic.get_var(data, name, default)
+
+
+def _compile_data_operator(
+    function: Callable, operands: list[tuple[bool, Any]]
+) -> CompiledRule:
+    closures = [_as_closure(operand) for operand in operands]
+    return lambda data: function(data, *[closure(data) for closure in closures])
@@ -0,0 +1,82 @@
+"""Flag definitions shared between processes through a memory-mapped file.
+
+One process fetches definitions and publishes each new payload with
+``publish_shared_definitions``; the other processes on the host read it with
+``read_shared_definitions`` and only copy out and parse the payload when the
+version in the file header changed. Placing the file on a tmpfs such as
+``/dev/shm`` keeps it in shared memory.
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+from .utils import write_file_atomically
+
+# Magic, version, payload length.
+_HEADER = struct.Struct("<8sQQ")
+_MAGIC = b"MPFLAGS1"
+
+
+class SharedDefinitions(NamedTuple):
+    version: int
+    content: bytes
+
+
+def read_shared_definitions(
+    path: str, known_version: int | None = None
+) -> SharedDefinitions | None:
+    """Read the published definitions payload.
+
+    :param str path: Path of the shared definitions file
+    :param int known_version: Version the caller already has loaded
+    :return: The payload and its version, or None if the version is ``known_version``
+    :raises ValueError: If the file is not a complete shared definitions file
+    """
+    with Path(path).open("rb") as shared_file:
+        # mmap raises ValueError for an empty file.
+        mapped = mmap.mmap(shared_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return _read_mapped(mapped, known_version)
+        finally:
+            mapped.close()
+
+
+def _read_mapped(
+    mapped: mmap.mmap, known_version: int | None
+) -> SharedDefinitions | None:
+    if len(mapped) < _HEADER.size:
+        raise ValueError("Not a shared flag definitions file")
+    magic, version, length = _HEADER.unpack_from(mapped)
+    if magic != _MAGIC:
+        raise ValueError("Not a shared flag definitions file")
+    if version == known_version:
+        return None
+
+    end = _HEADER.size + length
+    if len(mapped) < end:
+        raise ValueError("Shared flag definitions file is truncated")
+    return SharedDefinitions(version=version, content=mapped[_HEADER.size : end])
+
+
+def publish_shared_definitions(path: str, content: bytes) -> int:
+    """Publish a definitions payload under the next version.
+
+    The file is replaced atomically, so readers never see a partial payload.
+
+    :param str path: Path of the shared definitions file
+    :param bytes content: The raw definitions payload
+    :return: The version the payload was published under
+    """
+    try:
+        shared = read_shared_definitions(path)
+        previous_version = shared.version if shared is not None else 0
+    except (OSError, ValueError):
+        previous_version = 0
+
+    version = previous_version + 1
+    write_file_atomically(path, _HEADER.pack(_MAGIC, version, len(content)) + content)
+    return version
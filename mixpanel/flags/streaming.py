@@ -0,0 +1,48 @@
+"""Decoding of server-sent event streams of flag definition updates.
+
+The data of each ``put`` event, or of events that name no type, is a
+complete ``/flags/definitions`` payload; other event types carry no
+definitions. Comment lines are keep-alives and carry no event.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+
+class ServerSentEvent(NamedTuple):
+    event: str
+    data: str
+
+
+class ServerSentEventDecoder:
+    """Assemble server-sent events from the lines of a stream.
+
+    https://html.spec.whatwg.org/multipage/server-sent-events.html#event-stream-interpretation
+    """
+
+    def __init__(self) -> None:
+        self._event = ""
+        self._data: list[str] = []
+
+    def feed(self, line: str) -> ServerSentEvent | None:
+        """Consume one line, returning the event it completes, if any."""
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None
+
+        field, _, value = line.partition(":")
+        value = value.removeprefix(" ")
+        if field == "event":
+            self._event = value
+        elif field == "data":
+            self._data.append(value)
+        return None
+
+    def _dispatch(self) -> ServerSentEvent | None:
+        event, data = self._event, self._data
+        self._event, self._data = "", []
+        if not data:
+            return None
+        return ServerSentEvent(event=event or "message", data="\n".join(data))
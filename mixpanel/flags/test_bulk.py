@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from unittest.mock import Mock, patch
+
+import pytest
+import respx
+
+from .local_feature_flags import LocalFeatureFlagsProvider
+from .test_local_feature_flags import create_flags_response, create_test_flag
+from .types import LocalFlagsConfig, SelectedVariant, Variant, VariantOverride
+from .utils import normalized_hash
+
+np = pytest.importorskip("numpy")
+
+from .bulk import (  # noqa: E402 - requires numpy
+    NO_VARIANT,
+    fnv1a64_many,
+    normalized_hash_many,
+)
+
+DISTINCT_IDS = [f"user-{i}" for i in range(500)] + ["", "ünïcødé", "日本"]
+
+
+def test_normalized_hash_many_matches_normalized_hash():
+    states = fnv1a64_many(DISTINCT_IDS)
+
+    hashes = normalized_hash_many(states, b"some_flagvariant")
+
+    assert hashes.tolist() == [
+        normalized_hash(distinct_id, "some_flagvariant") for distinct_id in DISTINCT_IDS
+    ]
+
+
+class TestAssignMany:
+    def setup_method(self):
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+        )
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    def load_flags(self, flags):
+        with respx.mock:
+            respx.get("https://api.mixpanel.com/flags/definitions").mock(
+                return_value=create_flags_response(flags)
+            )
+            self._flags.start_polling_for_definitions()
+
+    def expected_variant_keys(self, flag_key, contexts):
+        fallback = SelectedVariant(variant_value=None)
+        return [
+            self._flags.get_variant(
+                flag_key, fallback, context, report_exposure=False
+            ).variant_key
+            for context in contexts
+        ]
+
+    @staticmethod
+    def assigned_variant_keys(assignment):
+        return [
+            None if index == NO_VARIANT else assignment.variant_keys[index]
+            for index in assignment.variant_indices.tolist()
+        ]
+
+    @pytest.mark.parametrize(
+        "flag_kwargs",
+        [
+            {},
+            {"rollout_percentage": 0.4},
+            {"hash_salt": "abc", "rollout_percentage": 0.7},
+            {
+                "variants": [
+                    Variant(key="A", value="a", is_control=False, split=0.2),
+                    Variant(key="B", value="b", is_control=False, split=0.3),
+                    Variant(key="C", value="c", is_control=False, split=0.5),
+                ],
+                "variant_splits": {"A": 0.5, "C": 0.1},
+            },
+            {"variant_override": VariantOverride(key="TREATMENT")},
+            {"test_users": {"user-1": "treatment", "user-2": "control"}},
+        ],
+    )
+    def test_matches_get_variant(self, flag_kwargs):
+        self.load_flags([create_test_flag(**flag_kwargs)])
+
+        assignment = self._flags.assign_many("test_flag", DISTINCT_IDS)
+
+        contexts = [{"distinct_id": distinct_id} for distinct_id in DISTINCT_IDS]
+        assert self.assigned_variant_keys(assignment) == self.expected_variant_keys(
+            "test_flag", contexts
+        )
+
+    def test_precomputed_context_states_are_not_hashed_again(self):
+        self.load_flags([create_test_flag(rollout_percentage=50.0)])
+        expected = self._flags.assign_many("test_flag", DISTINCT_IDS)
+        states = fnv1a64_many(DISTINCT_IDS)
+
+        with patch("mixpanel.flags.local_feature_flags.fnv1a64_many") as hash_many:
+            assignment = self._flags.assign_many(
+                "test_flag", DISTINCT_IDS, context_states=states
+            )
+
+        hash_many.assert_not_called()
+        assert assignment.variant_indices.tolist() == (
+            expected.variant_indices.tolist()
+        )
+
+    def test_runtime_rules_use_aligned_custom_properties(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        self.load_flags([create_test_flag(runtime_evaluation_rule=rule)])
+        properties = [
+            {"plan": "premium" if i % 3 else "free"} for i in range(len(DISTINCT_IDS))
+        ]
+
+        assignment = self._flags.assign_many("test_flag", DISTINCT_IDS, properties)
+
+        contexts = [
+            {"distinct_id": distinct_id, "custom_properties": props}
+            for distinct_id, props in zip(DISTINCT_IDS, properties)
+        ]
+        assert self.assigned_variant_keys(assignment) == self.expected_variant_keys(
+            "test_flag", contexts
+        )
+
+    def test_runtime_rules_fail_without_custom_properties(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        self.load_flags([create_test_flag(runtime_evaluation_rule=rule)])
+
+        assignment = self._flags.assign_many("test_flag", DISTINCT_IDS)
+
+        assert (assignment.variant_indices == NO_VARIANT).all()
+
+    def test_unknown_flag_assigns_no_variant(self):
+        self.load_flags([])
+
+        assignment = self._flags.assign_many("missing", DISTINCT_IDS)
+
+        assert assignment.variant_keys == ()
+        assert (assignment.variant_indices == NO_VARIANT).all()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+from .cache import (
+    EvaluationCache,
+    ResponseCache,
+    canonical_context,
+    properties_fingerprint,
+)
+
+
+def test_returns_default_on_miss_and_cached_result_on_hit():
+    cache = EvaluationCache(10, 60)
+    missing = object()
+
+    assert cache.get("key", missing) is missing
+    cache.put("key", None)
+
+    assert cache.get("key", missing) is None
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+    assert stats.hit_ratio == 0.5
+    assert stats.approximate_size_in_bytes > 0
+
+
+def test_results_expire_after_ttl():
+    cache = EvaluationCache(10, 60)
+
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=0.0):
+        cache.put("key", "result")
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=59.0):
+        assert cache.get("key") == "result"
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=61.0):
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+
+def test_evicts_least_recently_used_beyond_max_entries():
+    cache = EvaluationCache(2, 60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_fingerprint_covers_only_the_given_keys():
+    first = {"plan": "premium", "country": "us"}
+    second = {"plan": "premium", "country": "ca"}
+
+    plan_only = frozenset({"plan"})
+    assert properties_fingerprint(first, plan_only) == properties_fingerprint(
+        second, plan_only
+    )
+    assert properties_fingerprint(first, None) != properties_fingerprint(second, None)
+
+
+def test_fingerprint_distinguishes_types_and_absent_keys():
+    keys = frozenset({"value"})
+    fingerprints = {
+        properties_fingerprint({"value": 1}, keys),
+        properties_fingerprint({"value": True}, keys),
+        properties_fingerprint({"value": "1"}, keys),
+        properties_fingerprint({"value": None}, keys),
+        properties_fingerprint({}, keys),
+        properties_fingerprint({"value": [1]}, keys),
+    }
+
+    assert len(fingerprints) == 6
+    assert properties_fingerprint(
+        {"value": {"a": 1, "b": 2}}, keys
+    ) == properties_fingerprint({"value": {"b": 2, "a": 1}}, keys)
+
+
+def test_fingerprint_rejects_unserializable_values():
+    with pytest.raises(TypeError):
+        properties_fingerprint({"value": object()}, None)
+
+
+def test_response_cache_serves_expired_responses_only_within_stale_window():
+    cache = ResponseCache(10, 60, stale_if_error_in_seconds=30)
+
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=0.0):
+        cache.put("key", "response")
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=70.0):
+        assert cache.get("key") is None
+        assert cache.get_stale("key") == "response"
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=91.0):
+        assert cache.get_stale("key") is None
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+
+def test_response_cache_without_stale_window_drops_expired_responses():
+    cache = ResponseCache(1, 60)
+
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=0.0):
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") is None
+    with patch("mixpanel.flags.cache.time.monotonic", return_value=61.0):
+        assert cache.get_stale("b") is None
+
+
+def test_canonical_context_ignores_key_order():
+    assert canonical_context({"a": 1, "b": {"d": 2, "c": 3}}) == canonical_context(
+        {"b": {"c": 3, "d": 2}, "a": 1}
+    )
+    assert canonical_context({"a": 1}) != canonical_context({"a": True})
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import csv
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+import pytest
+
+from . import export
+from .bulk import fnv1a64_many
+from .export import (
+    Shard,
+    _initialize_worker,
+    export_assignments,
+    export_shard,
+    load_provider,
+    main,
+    plan_shards,
+    read_shard_ids,
+)
+from .test_local_feature_flags import create_flags_response, create_test_flag
+from .types import SelectedVariant
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def definitions_path(tmp_path: Path) -> str:
+    flags = [
+        create_test_flag(flag_key="half", rollout_percentage=50.0),
+        create_test_flag(flag_key="everyone", test_users={"user-7": "treatment"}),
+        create_test_flag(flag_key="companies", context="company_id"),
+    ]
+    path = tmp_path / "definitions.json"
+    path.write_bytes(create_flags_response(flags).content)
+    return str(path)
+
+
+@pytest.fixture
+def ids_path(tmp_path: Path) -> str:
+    path = tmp_path / "ids.txt"
+    path.write_text("".join(f"user-{index}\n" for index in range(500)))
+    return str(path)
+
+
+@contextmanager
+def worker_provider(definitions_path: str) -> Iterator[None]:
+    """Initialize this process as an export worker for the duration of a test."""
+    _initialize_worker(definitions_path)
+    try:
+        yield
+    finally:
+        export._worker_provider.shutdown()
+        export._worker_provider = None
+
+
+def read_rows(output_dir: Path) -> list[tuple[str, str, str]]:
+    rows = []
+    for part in sorted(output_dir.glob("part-*.csv")):
+        with part.open(newline="") as part_file:
+            reader = csv.reader(part_file)
+            assert next(reader) == ["id", "flag_key", "variant_key"]
+            rows.extend(tuple(row) for row in reader)
+    return rows
+
+
+def test_shards_cover_every_line_once(ids_path):
+    shards = plan_shards(ids_path, 7)
+
+    ids = [value for shard in shards for value in read_shard_ids(ids_path, shard)]
+
+    assert ids == [f"user-{index}" for index in range(500)]
+
+
+def test_shard_starting_on_a_line_boundary_keeps_that_line(tmp_path):
+    path = tmp_path / "ids.txt"
+    path.write_text("a\nb\nc\n")
+
+    assert read_shard_ids(str(path), Shard(0, 0, 2)) == ["a"]
+    assert read_shard_ids(str(path), Shard(1, 2, 6)) == ["b", "c"]
+
+
+def test_export_matches_get_variant(definitions_path, ids_path, tmp_path):
+    output_dir = tmp_path / "assignments"
+
+    rows = export_assignments(
+        definitions_path,
+        ids_path,
+        str(output_dir),
+        workers=2,
+        shard_size_in_bytes=1024,
+    )
+
+    exported = read_rows(output_dir)
+    assert len(exported) == rows
+    assert len(list(output_dir.glob("part-*.csv"))) > 1
+    provider = load_provider(definitions_path)
+    expected = []
+    for index in range(500):
+        distinct_id = f"user-{index}"
+        for flag_key in ("half", "everyone"):
+            variant = provider.get_variant(
+                flag_key,
+                SelectedVariant(variant_value=None),
+                {"distinct_id": distinct_id},
+                report_exposure=False,
+            )
+            if variant.variant_key is not None:
+                expected.append((distinct_id, flag_key, variant.variant_key))
+    provider.shutdown()
+    assert sorted(exported) == sorted(expected)
+    assert ("user-7", "everyone", "treatment") in exported
+
+
+def test_main_exports_selected_flags(definitions_path, ids_path, tmp_path):
+    output_dir = tmp_path / "assignments"
+
+    exit_code = main(
+        [
+            "--definitions",
+            definitions_path,
+            "--ids",
+            ids_path,
+            "--output",
+            str(output_dir),
+            "--flag",
+            "everyone",
+            "--workers",
+            "1",
+        ]
+    )
+
+    assert exit_code == 0
+    exported = read_rows(output_dir)
+    assert len(exported) == 500
+    assert {flag_key for _, flag_key, _ in exported} == {"everyone"}
+
+
+def test_export_shard_hashes_ids_once_for_all_flags(
+    definitions_path, ids_path, tmp_path
+):
+    shard = plan_shards(ids_path, 1 << 20)[0]
+    flag_keys = ["half", "everyone", "missing"]
+
+    with (
+        worker_provider(definitions_path),
+        patch("mixpanel.flags.export.fnv1a64_many", wraps=fnv1a64_many) as shard_hashes,
+        patch("mixpanel.flags.local_feature_flags.fnv1a64_many") as flag_hashes,
+    ):
+        rows = export_shard(ids_path, shard, flag_keys, str(tmp_path), "csv")
+
+    shard_hashes.assert_called_once()
+    flag_hashes.assert_not_called()
+    assert rows == len(read_rows(tmp_path))
+    assert {flag_key for _, flag_key, _ in read_rows(tmp_path)} == {
+        "half",
+        "everyone",
+    }
+
+
+def test_export_writes_parquet_parts(definitions_path, ids_path, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output_dir = tmp_path / "assignments"
+
+    rows = export_assignments(
+        definitions_path,
+        ids_path,
+        str(output_dir),
+        output_format="parquet",
+        workers=1,
+        shard_size_in_bytes=1024,
+    )
+
+    tables = [pq.read_table(part) for part in output_dir.glob("part-*.parquet")]
+    assert sum(table.num_rows for table in tables) == rows
+    assert tables[0].column_names == ["id", "flag_key", "variant_key"]
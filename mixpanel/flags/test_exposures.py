@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+from unittest.mock import Mock, patch
+
+from .exposures import (
+    ExposureDeduplicator,
+    ExposurePipeline,
+    ExposurePipelineStats,
+    create_exposure_pipeline,
+)
+from .types import FlagsConfig, SelectedVariant
+from .utils import EXPOSURE_EVENT
+
+TREATMENT = SelectedVariant(
+    variant_key="treatment", variant_value=True, experiment_id="exp-1"
+)
+CONTROL = SelectedVariant(variant_key="control", variant_value=False)
+
+
+def test_tracks_every_exposure_without_ttl():
+    deduplicator = ExposureDeduplicator(None, 10)
+
+    assert deduplicator.first_exposure("user", "flag", TREATMENT)
+    assert deduplicator.first_exposure("user", "flag", TREATMENT)
+    assert len(deduplicator) == 0
+
+
+def test_skips_repeats_within_ttl():
+    deduplicator = ExposureDeduplicator(60, 10)
+
+    assert deduplicator.first_exposure("user", "flag", TREATMENT)
+    assert not deduplicator.first_exposure("user", "flag", TREATMENT)
+    assert deduplicator.first_exposure("user", "flag", CONTROL)
+    assert deduplicator.first_exposure("other", "flag", TREATMENT)
+    assert deduplicator.first_exposure("user", "other_flag", TREATMENT)
+
+
+def test_tracks_again_after_ttl():
+    deduplicator = ExposureDeduplicator(60, 10)
+
+    with patch("mixpanel.flags.exposures.time.monotonic", return_value=0.0):
+        assert deduplicator.first_exposure("user", "flag", TREATMENT)
+    with patch("mixpanel.flags.exposures.time.monotonic", return_value=59.0):
+        assert not deduplicator.first_exposure("user", "flag", TREATMENT)
+    with patch("mixpanel.flags.exposures.time.monotonic", return_value=61.0):
+        assert deduplicator.first_exposure("user", "flag", TREATMENT)
+        assert len(deduplicator) == 1
+
+
+def test_forgets_oldest_exposures_beyond_max_entries():
+    deduplicator = ExposureDeduplicator(60, 2)
+
+    for distinct_id in ("a", "b", "c"):
+        deduplicator.first_exposure(distinct_id, "flag", TREATMENT)
+
+    assert len(deduplicator) == 2
+    assert deduplicator.first_exposure("a", "flag", TREATMENT)
+    assert not deduplicator.first_exposure("c", "flag", TREATMENT)
+
+
+class TestExposurePipeline:
+    def test_sends_exposures_in_batches(self):
+        batches = []
+        pipeline = ExposurePipeline(batches.append, 100, 3, 60)
+
+        with patch("mixpanel.flags.exposures.time.time", return_value=1000.0):
+            for index in range(7):
+                assert pipeline.submit(f"user{index}", {"index": index})
+        pipeline.close()
+
+        assert [exposure for batch in batches for exposure in batch] == [
+            (f"user{index}", {"index": index, "time": 1000.0}) for index in range(7)
+        ]
+        assert max(len(batch) for batch in batches) == 3
+        assert pipeline.stats() == ExposurePipelineStats(
+            queued=0, sent=7, dropped=0, failed=0
+        )
+
+    def test_keeps_the_time_of_submission_when_sent_later(self):
+        batches = []
+        pipeline = ExposurePipeline(batches.append, 100, 10, 60)
+        properties = {"Experiment name": "flag"}
+
+        with patch("mixpanel.flags.exposures.time.time", return_value=1000.0):
+            pipeline.submit("user", properties)
+            pipeline.submit("other", {"time": 900.0})
+        pipeline.close()
+
+        assert batches == [
+            [("user", {**properties, "time": 1000.0}), ("other", {"time": 900.0})]
+        ]
+        assert "time" not in properties
+
+    def test_drops_exposures_when_queue_is_full(self):
+        sending = threading.Event()
+        release = threading.Event()
+
+        def send_batch(_batch):
+            sending.set()
+            release.wait(timeout=5)
+
+        pipeline = ExposurePipeline(send_batch, 2, 1, 0)
+        pipeline.submit("first", {})
+        assert sending.wait(timeout=5)
+
+        accepted = [pipeline.submit(f"user{index}", {}) for index in range(4)]
+        release.set()
+        pipeline.close()
+
+        assert accepted == [True, True, False, False]
+        assert pipeline.stats().dropped == 2
+        assert pipeline.stats().sent == 3
+
+    def test_counts_failed_batches(self):
+        def send_batch(_batch):
+            raise RuntimeError("network down")
+
+        pipeline = ExposurePipeline(send_batch, 10, 10, 0)
+        pipeline.submit("user", {})
+        pipeline.close()
+
+        assert pipeline.stats().failed == 1
+
+    def test_falls_back_to_tracker_without_batch_tracker(self):
+        tracker = Mock()
+        pipeline = create_exposure_pipeline(
+            FlagsConfig(exposure_queue_size=10), tracker, None
+        )
+
+        pipeline.submit("user", {"flag": "a", "time": 1000.0})
+        pipeline.close()
+
+        tracker.assert_called_once_with(
+            "user", EXPOSURE_EVENT, {"flag": "a", "time": 1000.0}
+        )
+
+    def test_is_disabled_by_default(self):
+        assert create_exposure_pipeline(FlagsConfig(), Mock(), None) is None
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import asyncio
 import threading
+import time
+from collections.abc import Mapping
 from concurrent.futures import ThreadPoolExecutor
 from itertools import chain, repeat
 from typing import Any
@@ -13,7 +15,18 @@ import respx
 
 from mixpanel.credentials import ServiceAccountCredentials
 
+from .exposures import ExposureDeduplicator
 from .local_feature_flags import LocalFeatureFlagsProvider
+from .metrics import (
+    DEFINITIONS_AGE,
+    DEFINITIONS_FETCH_DURATION,
+    DEFINITIONS_PARSE_DURATION,
+    DEFINITIONS_PAYLOAD_SIZE,
+    EVALUATION_DURATION,
+    EVALUATIONS,
+)
+from .rules import casefold_keys_and_values
+from .shared import read_shared_definitions
 from .types import (
     ExperimentationFlag,
     ExperimentationFlags,
@@ -635,6 +648,19 @@ class TestLocalFeatureFlagsProviderAsync:
         else:
             assert properties.get("$is_qa_tester") is None
 
+    @respx.mock
+    async def test_repeated_exposures_are_deduplicated_when_configured(self):
+        await self.setup_flags([create_test_flag()])
+        self._flags._exposures = ExposureDeduplicator(60, 100)
+
+        for _ in range(3):
+            self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", USER_CONTEXT)
+        self._flags.get_variant_value(
+            TEST_FLAG_KEY, "fallback", {"distinct_id": "other_user"}
+        )
+
+        assert self._mock_tracker.call_count == 2
+
     @respx.mock
     async def test_get_variant_value_does_not_track_exposure_on_fallback(self):
         await self.setup_flags([])
@@ -749,6 +775,56 @@ class TestLocalFeatureFlagsProviderAsync:
 
         assert len(result) == 1 and "flag1" in result and "flag2" not in result
 
+    @respx.mock
+    async def test_get_all_variants_matches_get_variant_across_contexts(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        flags = [
+            create_test_flag(flag_key="by_user", rollout_percentage=100.0),
+            create_test_flag(
+                flag_key="by_company", context="company_id", rollout_percentage=100.0
+            ),
+            create_test_flag(
+                flag_key="by_rule",
+                rollout_percentage=100.0,
+                runtime_evaluation_rule=rule,
+            ),
+            create_test_flag(flag_key="by_device", context="device_id"),
+        ]
+        await self.setup_flags(flags)
+        context = {
+            "distinct_id": DISTINCT_ID,
+            "company_id": "acme",
+            "custom_properties": {"Plan": "Premium"},
+        }
+
+        result = self._flags.get_all_variants(context)
+
+        fallback = SelectedVariant(variant_value=None)
+        assert set(result) == {"by_user", "by_company", "by_rule"}
+        for flag_key, variant in result.items():
+            assert variant == self._flags.get_variant(
+                flag_key, fallback, context, report_exposure=False
+            )
+
+    @respx.mock
+    async def test_get_all_variants_normalizes_custom_properties_once(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        flags = [
+            create_test_flag(flag_key=f"flag{i}", runtime_evaluation_rule=rule)
+            for i in range(5)
+        ]
+        await self.setup_flags(flags)
+        context = self.user_context_with_properties({"plan": "premium"})
+
+        with patch(
+            "mixpanel.flags.local_feature_flags.casefold_keys_and_values",
+            wraps=casefold_keys_and_values,
+        ) as casefold:
+            result = self._flags.get_all_variants(context)
+
+        assert len(result) == 5
+        casefold.assert_called_once()
+
     @respx.mock
     async def test_get_all_variants_returns_empty_dict_when_no_flags_configured(self):
         await self.setup_flags([])
@@ -930,6 +1006,819 @@ class TestLocalFeatureFlagsProviderSync:
             assert result2 != "fallback"
 
 
+class TestDefinitionsRefresh:
+    def setup_method(self):
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+        )
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    @respx.mock
+    def test_sends_validators_and_keeps_definitions_on_not_modified(self):
+        first = create_flags_response([create_test_flag()])
+        first.headers["ETag"] = '"v1"'
+        first.headers["Last-Modified"] = "Tue, 01 Sep 2026 00:00:00 GMT"
+        route = respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[first, httpx.Response(status_code=304)]
+        )
+
+        self._flags.start_polling_for_definitions()
+        self._flags.start_polling_for_definitions()
+
+        assert "If-None-Match" not in route.calls[0].request.headers
+        conditional = route.calls[1].request.headers
+        assert conditional["If-None-Match"] == '"v1"'
+        assert conditional["If-Modified-Since"] == "Tue, 01 Sep 2026 00:00:00 GMT"
+        assert self._flags.get_variant_value(
+            TEST_FLAG_KEY, "fallback", USER_CONTEXT
+        ) in {"control", "treatment"}
+
+    @respx.mock
+    def test_skips_parsing_when_payload_is_unchanged(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=lambda _request: create_flags_response([create_test_flag()])
+        )
+
+        with patch.object(
+            ExperimentationFlag,
+            "model_validate",
+            wraps=ExperimentationFlag.model_validate,
+        ) as model_validate:
+            self._flags.start_polling_for_definitions()
+            definitions = self._flags._definitions
+            self._flags.start_polling_for_definitions()
+
+        model_validate.assert_called_once()
+        assert self._flags._definitions is definitions
+
+    @respx.mock
+    def test_refetches_unconditionally_after_parse_failure(self):
+        good = create_flags_response([create_test_flag()])
+        good.headers["ETag"] = '"v1"'
+        broken = httpx.Response(status_code=200, json={"flags": "nope"})
+        route = respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[good, broken, create_flags_response([create_test_flag()])]
+        )
+
+        for _ in range(3):
+            self._flags.start_polling_for_definitions()
+
+        assert route.calls[1].request.headers["If-None-Match"] == '"v1"'
+        assert "If-None-Match" not in route.calls[2].request.headers
+        assert TEST_FLAG_KEY in self._flags._definitions.flags
+
+    @respx.mock
+    def test_keeps_definitions_when_payload_is_broken_or_empty(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                create_flags_response([create_test_flag()]),
+                httpx.Response(status_code=200, content=b"{nope"),
+                create_flags_response([]),
+                httpx.Response(status_code=500),
+            ]
+        )
+
+        assert self._flags._fetch_flag_definitions()
+        for _ in range(3):
+            assert not self._flags._fetch_flag_definitions()
+            assert set(self._flags._definitions.flags) == {TEST_FLAG_KEY}
+
+    @respx.mock
+    def test_version_increases_only_when_definitions_change(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                create_flags_response([create_test_flag()]),
+                create_flags_response([create_test_flag()]),
+                httpx.Response(status_code=304),
+                httpx.Response(status_code=200, content=b"{nope"),
+                create_flags_response([create_test_flag(flag_key="other")]),
+            ]
+        )
+        assert self._flags.definitions_version() == 0
+
+        versions = []
+        for _ in range(5):
+            self._flags._fetch_flag_definitions()
+            versions.append(self._flags.definitions_version())
+
+        assert versions == [1, 1, 1, 1, 2]
+
+    @respx.mock
+    def test_definitions_age_is_not_reset_by_failed_fetches(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                create_flags_response([create_test_flag()]),
+                httpx.Response(status_code=503),
+                httpx.Response(status_code=304),
+            ]
+        )
+        assert self._flags.definitions_age_in_seconds() is None
+
+        self._flags._fetch_flag_definitions()
+        assert self._flags.definitions_age_in_seconds() < 60
+        self._flags._definitions_refreshed_at -= 3600
+
+        self._flags._fetch_flag_definitions()
+        assert self._flags.definitions_age_in_seconds() >= 3600
+
+        self._flags._fetch_flag_definitions()
+        assert self._flags.definitions_age_in_seconds() < 60
+
+    @respx.mock
+    def test_polling_backs_off_while_fetches_fail(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                httpx.Response(status_code=500),
+                httpx.Response(status_code=500),
+                create_flags_response([create_test_flag()]),
+            ]
+        )
+        delays = []
+
+        def polling_delay(consecutive_failures):
+            delays.append(consecutive_failures)
+            if len(delays) == 3:
+                self._flags._sync_stop_event.set()
+            return 0
+
+        with patch.object(self._flags, "_polling_delay", side_effect=polling_delay):
+            self._flags._start_continuous_polling(fetch_first=True)
+
+        assert delays == [1, 2, 0]
+
+    @respx.mock
+    def test_revalidates_only_changed_flags(self):
+        unchanged = create_test_flag(flag_key="unchanged")
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                create_flags_response([unchanged, create_test_flag(flag_key="edited")]),
+                create_flags_response(
+                    [
+                        unchanged,
+                        create_test_flag(flag_key="edited", rollout_percentage=0.0),
+                        create_test_flag(flag_key="added"),
+                    ]
+                ),
+            ]
+        )
+
+        self._flags.start_polling_for_definitions()
+        before = self._flags._definitions.flags
+        with patch.object(
+            ExperimentationFlag,
+            "model_validate",
+            wraps=ExperimentationFlag.model_validate,
+        ) as model_validate:
+            self._flags.start_polling_for_definitions()
+        after = self._flags._definitions.flags
+
+        assert model_validate.call_count == 2
+        assert after["unchanged"] is before["unchanged"]
+        assert after["edited"] is not before["edited"]
+        assert after["edited"].rollouts[0].rollout_percentage == 0.0
+        assert set(after) == {"unchanged", "edited", "added"}
+
+
+class TestDefinitionsSnapshot:
+    @respx.mock
+    def test_saves_fetched_definitions_and_loads_them_when_fetch_fails(self, tmp_path):
+        snapshot_path = str(tmp_path / "definitions.json")
+        config = LocalFlagsConfig(enable_polling=False, snapshot_path=snapshot_path)
+        route = respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                create_flags_response([create_test_flag()]),
+                httpx.Response(status_code=503),
+            ]
+        )
+
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            flags.start_polling_for_definitions()
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            flags.start_polling_for_definitions()
+
+            assert route.call_count == 2
+            assert flags.are_flags_ready()
+            assert TEST_FLAG_KEY in flags._definitions.flags
+
+    @respx.mock
+    @respx.mock
+    def test_serves_snapshot_while_poller_fetches(self, tmp_path):
+        snapshot = tmp_path / "definitions.json"
+        snapshot.write_bytes(create_flags_response([create_test_flag()]).content)
+        release_response = threading.Event()
+
+        def respond(_request):
+            release_response.wait(timeout=5)
+            return create_flags_response([create_test_flag(flag_key="fresh")])
+
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=respond
+        )
+        config = LocalFlagsConfig(
+            snapshot_path=str(snapshot), polling_interval_in_seconds=3600
+        )
+
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            flags.start_polling_for_definitions()
+
+            assert flags.are_flags_ready()
+            assert set(flags._definitions.flags) == {TEST_FLAG_KEY}
+
+            release_response.set()
+            for _ in range(500):
+                if "fresh" in flags._definitions.flags:
+                    break
+                time.sleep(0.01)
+            assert set(flags._definitions.flags) == {"fresh"}
+
+    def test_ignores_corrupt_snapshot(self, tmp_path):
+        snapshot = tmp_path / "definitions.json"
+        snapshot.write_text("{not json")
+        config = LocalFlagsConfig(enable_polling=False, snapshot_path=str(snapshot))
+
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            assert not flags._load_snapshot()
+            assert not flags.are_flags_ready()
+
+
+class TestSharedDefinitions:
+    @respx.mock
+    def test_workers_load_definitions_published_by_poller(self, tmp_path):
+        shared_path = str(tmp_path / "flags.shm")
+        route = respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                create_flags_response([create_test_flag()]),
+                create_flags_response([create_test_flag(flag_key="other")]),
+            ]
+        )
+        poller_config = LocalFlagsConfig(
+            enable_polling=False,
+            shared_definitions_path=shared_path,
+            publish_shared_definitions=True,
+        )
+        worker_config = LocalFlagsConfig(
+            enable_polling=False, shared_definitions_path=shared_path
+        )
+        poller = LocalFeatureFlagsProvider("test-token", poller_config, "1.0.0", Mock())
+        worker = LocalFeatureFlagsProvider("test-token", worker_config, "1.0.0", Mock())
+
+        with poller, worker:
+            worker.start_polling_for_definitions()
+            assert not worker.are_flags_ready()
+
+            poller.start_polling_for_definitions()
+            worker._fetch_flag_definitions()
+            assert set(worker._definitions.flags) == {TEST_FLAG_KEY}
+
+            with patch.object(
+                worker._definitions_compiler,
+                "compile_payload",
+                wraps=worker._definitions_compiler.compile_payload,
+            ) as compile_payload:
+                worker._fetch_flag_definitions()
+                compile_payload.assert_not_called()
+
+            poller._fetch_flag_definitions()
+            worker._fetch_flag_definitions()
+            assert set(worker._definitions.flags) == {"other"}
+
+        assert route.call_count == 2
+
+    @respx.mock
+    def test_publishes_fetched_payload_matching_the_snapshot(self, tmp_path):
+        shared_path = tmp_path / "flags.shm"
+        snapshot_path = tmp_path / "definitions.json"
+        content = create_flags_response([create_test_flag()]).content
+        snapshot_path.write_bytes(content)
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                httpx.Response(status_code=200, content=content),
+                httpx.Response(status_code=304),
+            ]
+        )
+        poller_config = LocalFlagsConfig(
+            enable_polling=False,
+            snapshot_path=str(snapshot_path),
+            shared_definitions_path=str(shared_path),
+            publish_shared_definitions=True,
+        )
+        worker_config = LocalFlagsConfig(
+            enable_polling=False, shared_definitions_path=str(shared_path)
+        )
+        poller = LocalFeatureFlagsProvider("test-token", poller_config, "1.0.0", Mock())
+        worker = LocalFeatureFlagsProvider("test-token", worker_config, "1.0.0", Mock())
+
+        with poller, worker:
+            poller.start_polling_for_definitions()
+            worker.start_polling_for_definitions()
+            assert worker.are_flags_ready()
+            assert worker.flag_keys() == [TEST_FLAG_KEY]
+
+            shared_path.unlink()
+            poller.refresh_definitions()
+            assert read_shared_definitions(str(shared_path)).content == content
+
+
+def create_stream_response(*payloads: list[ExperimentationFlag]) -> httpx.Response:
+    lines = [": connected\n\n"]
+    for flags in payloads:
+        content = create_flags_response(flags).text
+        lines.append(f"event: put\ndata: {content}\n\n")
+    return httpx.Response(status_code=200, content="".join(lines).encode())
+
+
+class TestDefinitionsStreaming:
+    STREAM_URL = "https://api.mixpanel.com/flags/definitions/stream"
+
+    def setup_method(self):
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token",
+            LocalFlagsConfig(enable_streaming=True, polling_interval_in_seconds=0),
+            "1.0.0",
+            Mock(),
+        )
+        self._flags.STREAM_RECONNECT_BASE_DELAY_IN_SECONDS = 0.01
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    @respx.mock
+    def test_applies_each_streamed_payload(self):
+        respx.get(self.STREAM_URL).mock(
+            return_value=create_stream_response(
+                [create_test_flag()], [create_test_flag(flag_key="other")]
+            )
+        )
+
+        assert self._flags._stream_flag_definitions()
+
+        assert self._flags.are_flags_ready()
+        assert set(self._flags._definitions.flags) == {"other"}
+
+    @respx.mock
+    async def test_applies_streamed_payload_async(self):
+        respx.get(self.STREAM_URL).mock(
+            return_value=create_stream_response([create_test_flag()])
+        )
+
+        assert await self._flags._astream_flag_definitions()
+
+        assert set(self._flags._definitions.flags) == {TEST_FLAG_KEY}
+        await self._flags._async_client.aclose()
+
+    @respx.mock
+    def test_keeps_definitions_when_streamed_payload_is_invalid(self):
+        broken = httpx.Response(status_code=200, content=b"data: {nope\n\n")
+        respx.get(self.STREAM_URL).mock(
+            side_effect=[create_stream_response([create_test_flag()]), broken]
+        )
+
+        self._flags._stream_flag_definitions()
+        self._flags._stream_flag_definitions()
+
+        assert set(self._flags._definitions.flags) == {TEST_FLAG_KEY}
+
+    @respx.mock
+    def test_fetch_after_streamed_payload_is_unconditional(self):
+        fetched = create_flags_response([create_test_flag()])
+        fetched.headers["ETag"] = '"a"'
+        definitions_route = respx.get(
+            "https://api.mixpanel.com/flags/definitions"
+        ).mock(
+            side_effect=[
+                fetched,
+                create_flags_response([create_test_flag()]),
+            ]
+        )
+        respx.get(self.STREAM_URL).mock(
+            return_value=create_stream_response([create_test_flag(flag_key="b")])
+        )
+
+        self._flags._fetch_flag_definitions()
+        self._flags._stream_flag_definitions()
+        self._flags._fetch_flag_definitions()
+
+        assert "If-None-Match" not in definitions_route.calls[1].request.headers
+        assert set(self._flags._definitions.flags) == {TEST_FLAG_KEY}
+
+    @respx.mock
+    def test_ignores_events_that_are_not_definitions(self):
+        content = create_flags_response([create_test_flag()]).text
+        respx.get(self.STREAM_URL).mock(
+            return_value=httpx.Response(
+                status_code=200,
+                content=(
+                    'event: error\ndata: {"message": "overloaded"}\n\n'
+                    "event: ping\ndata: 1\n\n"
+                    f"data: {content}\n\n"
+                ).encode(),
+            )
+        )
+
+        with patch.object(
+            self._flags, "_load_definitions", wraps=self._flags._load_definitions
+        ) as load_definitions:
+            assert self._flags._stream_flag_definitions()
+
+        load_definitions.assert_called_once()
+        assert set(self._flags._definitions.flags) == {TEST_FLAG_KEY}
+
+    @respx.mock
+    def test_polls_and_reconnects_after_stream_failure(self):
+        updated = threading.Event()
+        definitions_route = respx.get(
+            "https://api.mixpanel.com/flags/definitions"
+        ).mock(return_value=create_flags_response([create_test_flag()]))
+
+        stream_attempts = []
+
+        def stream(_request):
+            stream_attempts.append(True)
+            if len(stream_attempts) == 1:
+                raise httpx.ConnectError("connection refused")
+            updated.set()
+            return create_stream_response([create_test_flag(flag_key="pushed")])
+
+        respx.get(self.STREAM_URL).mock(side_effect=stream)
+
+        self._flags.start_polling_for_definitions()
+        assert updated.wait(timeout=5)
+        self._flags.stop_polling_for_definitions()
+
+        assert definitions_route.call_count >= 2
+        assert len(stream_attempts) >= 2
+
+    @respx.mock
+    def test_falls_back_to_polling_when_streaming_is_unavailable(self):
+        polled = threading.Event()
+
+        fetches = []
+
+        def definitions(_request):
+            fetches.append(True)
+            if len(fetches) > 1:
+                polled.set()
+            return create_flags_response([create_test_flag()])
+
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=definitions
+        )
+        stream_route = respx.get(self.STREAM_URL).mock(
+            return_value=httpx.Response(status_code=404)
+        )
+
+        self._flags.start_polling_for_definitions()
+        assert polled.wait(timeout=5)
+        self._flags.stop_polling_for_definitions()
+
+        assert stream_route.call_count == 1
+
+
+class TestDefinitionsFile:
+    def test_reloads_definitions_when_file_changes(self, tmp_path):
+        definitions_file = tmp_path / "definitions.json"
+        definitions_file.write_bytes(
+            create_flags_response([create_test_flag()]).content
+        )
+        config = LocalFlagsConfig(
+            enable_polling=False, definitions_file_path=str(definitions_file)
+        )
+
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            flags.start_polling_for_definitions()
+            assert flags.are_flags_ready()
+            assert set(flags._definitions.flags) == {TEST_FLAG_KEY}
+
+            definitions_file.write_bytes(
+                create_flags_response([create_test_flag(flag_key="other")]).content
+            )
+            flags._fetch_flag_definitions()
+
+            assert set(flags._definitions.flags) == {"other"}
+
+    def test_keeps_definitions_when_file_is_invalid(self, tmp_path):
+        definitions_file = tmp_path / "definitions.json"
+        definitions_file.write_bytes(
+            create_flags_response([create_test_flag()]).content
+        )
+        config = LocalFlagsConfig(
+            enable_polling=False, definitions_file_path=str(definitions_file)
+        )
+
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            flags.start_polling_for_definitions()
+            definitions_file.write_text('{"flags": "half-written')
+            flags._fetch_flag_definitions()
+
+            assert set(flags._definitions.flags) == {TEST_FLAG_KEY}
+
+
+@respx.mock
+def test_loads_only_flags_matching_the_key_filter():
+    route = respx.get("https://api.mixpanel.com/flags/definitions").mock(
+        return_value=create_flags_response(
+            [
+                create_test_flag(flag_key="checkout_v2"),
+                create_test_flag(flag_key="search_ranking"),
+                create_test_flag(flag_key="billing"),
+            ]
+        )
+    )
+    config = LocalFlagsConfig(
+        enable_polling=False, flag_keys=["billing"], flag_key_prefixes=["checkout_"]
+    )
+    flags = LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock())
+
+    flags.start_polling_for_definitions()
+
+    params = route.calls[0].request.url.params
+    assert params["flag_keys"] == "billing"
+    assert params["flag_key_prefixes"] == "checkout_"
+    assert set(flags.get_all_variants(USER_CONTEXT)) == {"checkout_v2", "billing"}
+    assert (
+        flags.get_variant_value("search_ranking", "fallback", USER_CONTEXT)
+        == "fallback"
+    )
+    flags.shutdown()
+
+
+def test_edits_to_filtered_out_flags_keep_version_and_cached_results():
+    config = LocalFlagsConfig(
+        enable_polling=False, flag_keys=["checkout"], evaluation_cache_max_entries=10
+    )
+    flags = LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock())
+
+    for rollout_percentage in (100.0, 10.0):
+        flags._load_definitions(
+            create_flags_response(
+                [
+                    create_test_flag(flag_key="checkout"),
+                    create_test_flag(
+                        flag_key="other", rollout_percentage=rollout_percentage
+                    ),
+                ]
+            ).content
+        )
+        flags.get_variant_value("checkout", "fallback", USER_CONTEXT)
+
+    assert flags.definitions_version() == 1
+    assert flags.evaluation_cache_stats().hits == 1
+    flags.shutdown()
+
+
+def test_unloads_allowlisted_flags_removed_from_the_payload():
+    config = LocalFlagsConfig(enable_polling=False, flag_keys=["checkout"])
+    flags = LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock())
+
+    for payload in (
+        [create_test_flag(flag_key="checkout"), create_test_flag(flag_key="other")],
+        [create_test_flag(flag_key="other")],
+    ):
+        flags._load_definitions(create_flags_response(payload).content)
+    assert flags.flag_keys() == []
+
+    flags._load_definitions(
+        create_flags_response([create_test_flag(flag_key="checkout")]).content
+    )
+    with pytest.raises(ValueError, match="no flag definitions"):
+        flags._load_definitions(create_flags_response([]).content)
+    assert flags.flag_keys() == ["checkout"]
+    flags.shutdown()
+
+
+class TestLazyCustomProperties:
+    def setup_method(self):
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+        )
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    def load_flags(self, flags: list[ExperimentationFlag]):
+        self._flags._load_definitions(create_flags_response(flags).content)
+
+    def test_resolves_only_properties_the_rule_reads(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        self.load_flags([create_test_flag(runtime_evaluation_rule=rule)])
+        plan = Mock(return_value="Premium")
+        account_age = Mock(return_value=30)
+        context = {
+            "distinct_id": DISTINCT_ID,
+            "custom_properties": {"Plan": plan, "account_age": account_age},
+        }
+
+        result = self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", context)
+
+        assert result != "fallback"
+        plan.assert_called_once_with()
+        account_age.assert_not_called()
+
+    def test_flags_without_runtime_rules_resolve_nothing(self):
+        self.load_flags([create_test_flag()])
+        plan = Mock(return_value="premium")
+        context = {"distinct_id": DISTINCT_ID, "custom_properties": {"plan": plan}}
+
+        self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", context)
+
+        plan.assert_not_called()
+
+    def test_lazy_values_resolve_once_per_call(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        self.load_flags(
+            [
+                create_test_flag(flag_key="first", runtime_evaluation_rule=rule),
+                create_test_flag(
+                    flag_key="legacy",
+                    runtime_evaluation_legacy_definition={"plan": "premium"},
+                ),
+            ]
+        )
+        plan = Mock(return_value="premium")
+        context = {"distinct_id": DISTINCT_ID, "custom_properties": {"plan": plan}}
+
+        variants = self._flags.get_all_variants(context)
+
+        assert set(variants) == {"first", "legacy"}
+        plan.assert_called_once_with()
+
+    def test_accepts_lazy_mappings(self):
+        class LazyProperties(Mapping):
+            def __init__(self):
+                self.reads = []
+
+            def __getitem__(self, key):
+                self.reads.append(key)
+                return {"plan": "premium", "tier": "gold"}[key]
+
+            def __iter__(self):
+                return iter(["plan", "tier"])
+
+            def __len__(self):
+                return 2
+
+        self.load_flags(
+            [create_test_flag(runtime_evaluation_legacy_definition={"plan": "premium"})]
+        )
+        properties = LazyProperties()
+        context = {"distinct_id": DISTINCT_ID, "custom_properties": properties}
+
+        result = self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", context)
+
+        assert result != "fallback"
+        assert properties.reads == ["plan"]
+
+    def test_failing_resolver_does_not_match(self):
+        rule = {"!": [{"var": "plan"}]}
+        self.load_flags([create_test_flag(runtime_evaluation_rule=rule)])
+        context = {
+            "distinct_id": DISTINCT_ID,
+            "custom_properties": {"plan": Mock(side_effect=LookupError)},
+        }
+
+        result = self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", context)
+
+        assert result == "fallback"
+
+
+class TestEvaluationCache:
+    def setup_method(self):
+        self.mock_tracker = Mock()
+        config = LocalFlagsConfig(
+            enable_polling=False, evaluation_cache_max_entries=100
+        )
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token", config, "1.0.0", self.mock_tracker
+        )
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    def load_flags(self, flags: list[ExperimentationFlag]):
+        self._flags._load_definitions(create_flags_response(flags).content)
+
+    def test_repeated_evaluations_hit_and_still_track_exposures(self):
+        self.load_flags([create_test_flag()])
+
+        with patch.object(
+            self._flags, "_select_variant", wraps=self._flags._select_variant
+        ) as select_variant:
+            results = [
+                self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", USER_CONTEXT)
+                for _ in range(3)
+            ]
+
+        assert select_variant.call_count == 1
+        assert len(set(results)) == 1
+        assert self.mock_tracker.call_count == 3
+        stats = self._flags.evaluation_cache_stats()
+        assert (stats.hits, stats.misses, stats.entries) == (2, 1, 1)
+
+    def test_caches_no_rollout_match(self):
+        self.load_flags([create_test_flag(rollout_percentage=0.0)])
+
+        for _ in range(2):
+            result = self._flags.get_variant_value(
+                TEST_FLAG_KEY, "fallback", USER_CONTEXT
+            )
+
+        assert result == "fallback"
+        assert self._flags.evaluation_cache_stats().hits == 1
+        self.mock_tracker.assert_not_called()
+
+    def test_key_includes_referenced_custom_properties_only(self):
+        rule = {"==": [{"var": "plan"}, "premium"]}
+        self.load_flags([create_test_flag(runtime_evaluation_rule=rule)])
+
+        def evaluate(**custom_properties):
+            context = {"distinct_id": "user", "custom_properties": custom_properties}
+            return self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", context)
+
+        premium = evaluate(plan="premium", country="us")
+        assert evaluate(plan="Premium", country="ca") == premium
+        assert evaluate(plan="free", country="us") == "fallback"
+        assert evaluate() == "fallback"
+        assert self._flags.evaluation_cache_stats().hits == 1
+
+    def test_changed_definitions_are_not_served_from_cache(self):
+        self.load_flags([create_test_flag(rollout_percentage=0.0)])
+        assert (
+            self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", USER_CONTEXT)
+            == "fallback"
+        )
+
+        self.load_flags([create_test_flag(rollout_percentage=100.0)])
+
+        assert (
+            self._flags.get_variant_value(TEST_FLAG_KEY, "fallback", USER_CONTEXT)
+            != "fallback"
+        )
+
+    def test_cache_is_disabled_by_default(self):
+        flags = LocalFeatureFlagsProvider(
+            "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+        )
+
+        assert flags.evaluation_cache_stats() is None
+
+
+@respx.mock
+def test_records_metrics_when_configured():
+    respx.get("https://api.mixpanel.com/flags/definitions").mock(
+        return_value=create_flags_response([create_test_flag()])
+    )
+    metrics = []
+    config = LocalFlagsConfig(enable_polling=False, metrics_callback=metrics.append)
+    flags = LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock())
+    flags.start_polling_for_definitions()
+
+    flags.get_variant_value(TEST_FLAG_KEY, "fallback", USER_CONTEXT)
+    flags.get_variant_value("missing_flag", "fallback", USER_CONTEXT)
+    flags.shutdown()
+
+    names = [metric.name for metric in metrics]
+    for name in (
+        DEFINITIONS_FETCH_DURATION,
+        DEFINITIONS_PAYLOAD_SIZE,
+        DEFINITIONS_PARSE_DURATION,
+        DEFINITIONS_AGE,
+    ):
+        assert names.count(name) == 1
+    evaluations = [metric.tags for metric in metrics if metric.name == EVALUATIONS]
+    assert [(tags["flag"], tags["reason"]) for tags in evaluations] == [
+        (TEST_FLAG_KEY, "none"),
+        ("missing_flag", "FLAG_NOT_FOUND"),
+    ]
+    assert names.count(EVALUATION_DURATION) == 2
+
+
+@respx.mock
+def test_queued_exposures_are_sent_in_batches():
+    respx.get("https://api.mixpanel.com/flags/definitions").mock(
+        return_value=create_flags_response([create_test_flag()])
+    )
+    tracker = Mock()
+    batch_tracker = Mock()
+    config = LocalFlagsConfig(enable_polling=False, exposure_queue_size=100)
+    flags = LocalFeatureFlagsProvider(
+        "test-token", config, "1.0.0", tracker, batch_tracker=batch_tracker
+    )
+    flags.start_polling_for_definitions()
+
+    for index in range(3):
+        flags.get_variant_value(TEST_FLAG_KEY, "fallback", {"distinct_id": f"u{index}"})
+    flags.shutdown()
+
+    tracker.assert_not_called()
+    exposures = [
+        exposure for call in batch_tracker.call_args_list for exposure in call.args[1]
+    ]
+    assert [distinct_id for distinct_id, _ in exposures] == ["u0", "u1", "u2"]
+    assert flags.exposure_stats().sent == 3
+
+
 def test_local_flags_with_service_account_credentials():
     """Test LocalFeatureFlagsProvider accepts httpx client params with service account auth."""
     config = LocalFlagsConfig(
@@ -1030,6 +1919,225 @@ def test_local_flags_fallback_to_token_without_credentials():
     provider.shutdown()
 
 
+def test_mutating_a_returned_json_value_does_not_affect_later_evaluations():
+    flags = LocalFeatureFlagsProvider(
+        "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+    )
+    variants = [Variant(key="on", value={"color": "red"}, is_control=False, split=100)]
+    flags._load_definitions(
+        create_flags_response([create_test_flag(variants=variants)]).content
+    )
+
+    variant = flags.get_variant(
+        TEST_FLAG_KEY, SelectedVariant(variant_value=None), USER_CONTEXT
+    )
+    variant.variant_value["color"] = "blue"
+    flags.get_all_variants(USER_CONTEXT)[TEST_FLAG_KEY].variant_value["size"] = 1
+
+    assert flags.get_variant_value(TEST_FLAG_KEY, None, {"distinct_id": "other"}) == {
+        "color": "red"
+    }
+    assert flags.get_variant_value(TEST_FLAG_KEY, None, USER_CONTEXT) == {
+        "color": "red"
+    }
+    flags.shutdown()
+
+
+class TestReadiness:
+    def setup_method(self):
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+        )
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    def test_wait_until_ready_times_out_before_the_first_fetch(self):
+        assert self._flags.wait_until_ready(timeout=0.01) is False
+
+    @respx.mock
+    def test_malformed_first_payload_does_not_make_flags_ready(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=[
+                httpx.Response(status_code=200, content=b"{nope"),
+                create_flags_response([create_test_flag()]),
+            ]
+        )
+
+        self._flags.start_polling_for_definitions()
+        assert self._flags.wait_until_ready(timeout=0.01) is False
+        assert self._flags.definitions_age_in_seconds() is None
+
+        self._flags.refresh_definitions()
+        assert self._flags.wait_until_ready(timeout=0.01) is True
+        assert self._flags.flag_keys() == [TEST_FLAG_KEY]
+
+    @respx.mock
+    def test_non_blocking_start_fetches_in_the_background(self):
+        release = threading.Event()
+
+        def respond(_request):
+            release.wait(timeout=5)
+            return create_flags_response([create_test_flag()])
+
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            side_effect=respond
+        )
+
+        self._flags.start_polling_for_definitions(blocking=False)
+        assert not self._flags.are_flags_ready()
+        release.set()
+
+        assert self._flags.wait_until_ready(timeout=5)
+        assert self._flags.flag_keys() == [TEST_FLAG_KEY]
+
+    @respx.mock
+    @pytest.mark.asyncio
+    async def test_await_ready_resolves_when_a_thread_loads_definitions(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            return_value=create_flags_response([create_test_flag()])
+        )
+
+        assert await self._flags.await_ready(timeout=0.01) is False
+        waiting = asyncio.create_task(self._flags.await_ready(timeout=5))
+        await asyncio.sleep(0)
+        self._flags.start_polling_for_definitions(blocking=False)
+
+        assert await waiting is True
+        assert self._flags._ready_waiters == []
+
+    @respx.mock
+    @pytest.mark.asyncio
+    async def test_async_non_blocking_start(self):
+        respx.get("https://api.mixpanel.com/flags/definitions").mock(
+            return_value=create_flags_response([create_test_flag()])
+        )
+
+        await self._flags.astart_polling_for_definitions(blocking=False)
+        assert not self._flags.are_flags_ready()
+
+        assert await self._flags.await_ready(timeout=5)
+        assert self._flags.flag_keys() == [TEST_FLAG_KEY]
+
+
+class TestDefinitionsListeners:
+    def setup_method(self):
+        self._flags = LocalFeatureFlagsProvider(
+            "test-token", LocalFlagsConfig(enable_polling=False), "1.0.0", Mock()
+        )
+
+    def teardown_method(self):
+        self._flags.shutdown()
+
+    def load_flags(self, flags: list[ExperimentationFlag]):
+        self._flags._load_definitions(create_flags_response(flags).content)
+
+    def test_listener_receives_per_flag_diff(self):
+        changes = []
+        self._flags.add_definitions_listener(changes.append)
+
+        self.load_flags([create_test_flag("a"), create_test_flag("b")])
+        self.load_flags(
+            [
+                create_test_flag("a"),
+                create_test_flag("b", rollout_percentage=50.0),
+                create_test_flag("c"),
+            ]
+        )
+        self.load_flags([create_test_flag("a"), create_test_flag("c")])
+
+        assert [(c.added, c.removed, c.changed) for c in changes] == [
+            ({"a", "b"}, set(), set()),
+            ({"c"}, set(), {"b"}),
+            (set(), {"b"}, set()),
+        ]
+        assert [c.version for c in changes] == [1, 2, 3]
+        assert changes[-1].version == self._flags.definitions_version()
+
+    def test_unchanged_payload_and_removed_listener_are_not_notified(self):
+        listener = Mock()
+        self._flags.add_definitions_listener(listener)
+        self.load_flags([create_test_flag()])
+        self.load_flags([create_test_flag()])
+        self._flags.remove_definitions_listener(listener)
+        self.load_flags([create_test_flag(rollout_percentage=0.0)])
+
+        listener.assert_called_once()
+
+    def test_payloads_without_flag_changes_are_not_notified(self):
+        listener = Mock()
+        self._flags.add_definitions_listener(listener)
+        a, b = create_test_flag("a"), create_test_flag("b")
+
+        self.load_flags([a, b])
+        self.load_flags([b, a])
+
+        listener.assert_called_once()
+        assert self._flags.definitions_version() == 1
+
+    def test_edits_to_filtered_out_flags_are_not_notified(self):
+        config = LocalFlagsConfig(enable_polling=False, flag_keys=["a"])
+        listener = Mock()
+        with LocalFeatureFlagsProvider("test-token", config, "1.0.0", Mock()) as flags:
+            flags.add_definitions_listener(listener)
+            for rollout_percentage in (100.0, 50.0):
+                flags._load_definitions(
+                    create_flags_response(
+                        [
+                            create_test_flag("a"),
+                            create_test_flag(
+                                "b", rollout_percentage=rollout_percentage
+                            ),
+                        ]
+                    ).content
+                )
+
+        listener.assert_called_once()
+        assert listener.call_args.args[0].added == {"a"}
+
+    def test_failing_listener_does_not_block_others_or_the_load(self):
+        other = Mock()
+        self._flags.add_definitions_listener(Mock(side_effect=RuntimeError))
+        self._flags.add_definitions_listener(other)
+
+        self.load_flags([create_test_flag()])
+
+        other.assert_called_once()
+        assert self._flags.flag_keys() == [TEST_FLAG_KEY]
+
+    @pytest.mark.asyncio
+    async def test_async_listener_runs_on_the_running_loop(self):
+        received = asyncio.Event()
+        changes = []
+
+        async def listener(change):
+            changes.append(change)
+            received.set()
+
+        self._flags.add_definitions_listener(listener)
+        self.load_flags([create_test_flag()])
+        await asyncio.wait_for(received.wait(), timeout=1)
+
+        assert changes[0].flag_keys == {TEST_FLAG_KEY}
+
+    @pytest.mark.asyncio
+    async def test_async_listener_runs_on_its_loop_when_loaded_from_a_thread(self):
+        received = asyncio.Event()
+        loops = []
+
+        async def listener(_change):
+            loops.append(asyncio.get_running_loop())
+            received.set()
+
+        self._flags.add_definitions_listener(listener)
+        thread = threading.Thread(target=self.load_flags, args=([create_test_flag()],))
+        thread.start()
+        thread.join()
+        await asyncio.wait_for(received.wait(), timeout=1)
+
+        assert loops == [asyncio.get_running_loop()]
+
+
 # SDK-85: sync __exit__ and shutdown() historically only closed
 # _sync_client, leaking _async_client's connection pool + background
 # transport. The two tests below fail on the pre-fix code.
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import base64
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+import respx
+
+import mixpanel
+from mixpanel.credentials import ServiceAccountCredentials
+
+from .manager import LocalFlagsManager
+from .test_local_feature_flags import (
+    TEST_FLAG_KEY,
+    USER_CONTEXT,
+    create_flags_response,
+    create_test_flag,
+)
+from .types import LocalFlagsConfig
+
+DEFINITIONS_URL = "https://api.mixpanel.com/flags/definitions"
+
+
+def basic_auth(username: str, password: str) -> str:
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def manager():
+    with LocalFlagsManager() as flags_manager:
+        yield flags_manager
+
+
+@respx.mock
+def test_projects_share_one_client_and_send_their_own_credentials(manager):
+    route = respx.get(DEFINITIONS_URL).mock(
+        return_value=create_flags_response([create_test_flag()])
+    )
+    config = LocalFlagsConfig(enable_polling=False)
+    first = manager.add_project("token-a", config, "1.0.0", Mock())
+    credentials = ServiceAccountCredentials("user", "secret", "42")
+    second = manager.add_project("token-b", config, "1.0.0", Mock(), credentials)
+
+    first.start_polling_for_definitions()
+    second.start_polling_for_definitions()
+
+    assert first._sync_client is second._sync_client
+    authorizations = [call.request.headers["Authorization"] for call in route.calls]
+    assert authorizations == [
+        basic_auth("token-a", ""),
+        basic_auth("user", "secret"),
+    ]
+    assert route.calls[1].request.url.params["project_id"] == "42"
+    assert first.get_variant_value(TEST_FLAG_KEY, "fallback", USER_CONTEXT) in {
+        "control",
+        "treatment",
+    }
+
+
+@respx.mock
+def test_polls_every_project_from_one_thread(manager):
+    polled_tokens = []
+    polling_threads = set()
+
+    def respond(request):
+        polled_tokens.append(request.url.params["token"])
+        polling_threads.add(threading.current_thread())
+        return create_flags_response([create_test_flag()])
+
+    respx.get(DEFINITIONS_URL).mock(side_effect=respond)
+    config = LocalFlagsConfig(polling_interval_in_seconds=0)
+    threads_before = threading.active_count()
+
+    providers = [
+        manager.add_project(f"token-{index}", config, "1.0.0", Mock())
+        for index in range(5)
+    ]
+    for provider in providers:
+        provider.start_polling_for_definitions()
+    wait_for(lambda: len(set(polled_tokens)) == 5 and len(polled_tokens) >= 15)
+
+    assert threading.active_count() == threads_before + 1
+    assert manager.polled_project_count() == 5
+    # The initial fetches ran on this thread, the polls on the scheduler's.
+    assert len(polling_threads) == 2
+
+
+@respx.mock
+def test_stopped_projects_are_no_longer_polled(manager):
+    route = respx.get(DEFINITIONS_URL).mock(
+        side_effect=lambda _request: create_flags_response([create_test_flag()])
+    )
+    config = LocalFlagsConfig(polling_interval_in_seconds=0)
+    provider = manager.add_project("token", config, "1.0.0", Mock())
+    provider.start_polling_for_definitions()
+    wait_for(lambda: route.call_count >= 3)
+
+    provider.shutdown()
+    calls_after_stop = route.call_count
+    time.sleep(0.05)
+
+    assert manager.polled_project_count() == 0
+    assert route.call_count <= calls_after_stop + 1
+    assert not manager.http_client("api.mixpanel.com").is_closed
+
+
+def test_close_stops_the_scheduler_and_closes_clients():
+    manager = LocalFlagsManager()
+    client = manager.http_client("api.mixpanel.com")
+    provider = manager.add_project(
+        "token", LocalFlagsConfig(polling_interval_in_seconds=60), "1.0.0", Mock()
+    )
+    manager.schedule_polling(provider, 60)
+
+    manager.close()
+
+    assert client.is_closed
+    assert manager.polled_project_count() == 0
+    with pytest.raises(RuntimeError):
+        manager.http_client("api.mixpanel.com")
+
+
+def test_mixpanel_instances_use_the_manager(manager):
+    config = LocalFlagsConfig(enable_polling=False)
+    first = mixpanel.Mixpanel(
+        "token-a", local_flags_config=config, flags_manager=manager
+    )
+    second = mixpanel.Mixpanel(
+        "token-b", local_flags_config=config, flags_manager=manager
+    )
+
+    assert first.local_flags._sync_client is second.local_flags._sync_client
+    assert first.local_flags._async_client is None
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import logging
+from unittest.mock import Mock
+
+from .metrics import EVALUATION_DURATION, EVALUATIONS, FlagMetrics, Metric
+from .types import FallbackReason, SelectedVariant, VariantSource
+
+
+def test_evaluation_emits_counter_and_histogram():
+    metrics = []
+    variant = SelectedVariant(variant_value=False).as_fallback(
+        FallbackReason.no_rollout_match()
+    )
+
+    FlagMetrics(metrics.append).evaluation("local", "flag", variant, 0.002)
+
+    assert metrics == [
+        Metric(
+            EVALUATIONS,
+            "counter",
+            1,
+            {
+                "mode": "local",
+                "flag": "flag",
+                "source": VariantSource.FALLBACK,
+                "reason": "NO_ROLLOUT_MATCH",
+            },
+        ),
+        Metric(EVALUATION_DURATION, "histogram", 0.002, {"mode": "local"}),
+    ]
+
+
+def test_failing_callback_is_logged_once(caplog):
+    callback = Mock(side_effect=RuntimeError("sink down"))
+    metrics = FlagMetrics(callback)
+
+    with caplog.at_level(logging.ERROR, logger="mixpanel.flags.metrics"):
+        metrics.increment("counter")
+        metrics.gauge("gauge", 1.0)
+
+    assert callback.call_count == 2
+    assert len(caplog.records) == 1
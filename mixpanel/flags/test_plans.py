@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import pytest
+
+from .plans import (
+    EMPTY_DEFINITIONS,
+    DefinitionsCompiler,
+    compile_flag,
+    diff_definitions,
+    flag_key_filter,
+    select_variant,
+)
+from .test_local_feature_flags import create_flags_response, create_test_flag
+from .types import Variant, VariantOverride, VariantSource
+
+
+class TestCompileFlag:
+    def test_split_table_applies_variant_splits(self):
+        variants = [
+            Variant(key="A", value="a", is_control=False, split=100.0),
+            Variant(key="B", value="b", is_control=False, split=0.0),
+            Variant(key="C", value="c", is_control=False, split=0.0),
+        ]
+        flag = create_test_flag(
+            variants=variants, variant_splits={"A": 0.25, "B": 0.25, "C": 0.5}
+        )
+
+        rollout_plan = compile_flag(flag).rollouts[0]
+
+        thresholds = [cumulative for cumulative, _ in rollout_plan.split_table]
+        assert thresholds == [0.25, 0.5, 1.0]
+        assert select_variant(rollout_plan, 0.1).variant_key == "A"
+        assert select_variant(rollout_plan, 0.3).variant_key == "B"
+        assert select_variant(rollout_plan, 0.99).variant_key == "C"
+
+    def test_select_variant_falls_through_to_last_variant(self):
+        variants = [
+            Variant(key="A", value="a", is_control=False, split=0.0),
+            Variant(key="B", value="b", is_control=False, split=0.0),
+        ]
+        rollout_plan = compile_flag(create_test_flag(variants=variants)).rollouts[0]
+
+        assert select_variant(rollout_plan, 0.5).variant_key == "B"
+
+    def test_salts_are_prebuilt(self):
+        plan = compile_flag(create_test_flag(flag_key="f"))
+        salted_plan = compile_flag(create_test_flag(flag_key="f", hash_salt="xyz"))
+
+        assert plan.variant_salt == b"fvariant"
+        assert plan.rollouts[0].salt == b"frollout"
+        assert salted_plan.variant_salt == b"fxyzvariant"
+        assert salted_plan.rollouts[0].salt == b"fxyz0"
+
+    def test_test_users_are_matched_case_insensitively(self):
+        flag = create_test_flag(
+            test_users={"qa": "TREATMENT", "ghost": "missing_variant"}
+        )
+
+        plan = compile_flag(flag)
+
+        assert set(plan.test_users) == {"qa"}
+        qa_variant = plan.test_users["qa"]
+        assert qa_variant.variant_key == "treatment"
+        assert qa_variant.is_qa_tester is True
+        assert qa_variant.variant_source == VariantSource.LOCAL
+
+    def test_variant_override_resolves_at_compile_time(self):
+        flag = create_test_flag(variant_override=VariantOverride(key="Control"))
+
+        override = compile_flag(flag).rollouts[0].override
+
+        assert override is not None
+        assert override.variant_key == "control"
+
+    def test_unknown_variant_override_is_dropped(self):
+        flag = create_test_flag(variant_override=VariantOverride(key="nope"))
+
+        assert compile_flag(flag).rollouts[0].override is None
+
+    def test_runtime_properties_are_indexed(self):
+        rule = {"==": [{"var": "Plan"}, "premium"]}
+
+        plain = compile_flag(create_test_flag())
+        ruled = compile_flag(create_test_flag(runtime_evaluation_rule=rule))
+        legacy = compile_flag(
+            create_test_flag(runtime_evaluation_legacy_definition={"tier": "gold"})
+        )
+
+        assert not plain.has_runtime_rules
+        assert plain.runtime_properties == frozenset()
+        assert ruled.has_runtime_rules
+        assert ruled.runtime_properties == frozenset({"plan"})
+        assert legacy.runtime_properties == frozenset({"tier"})
+
+
+class TestDefinitionsCompiler:
+    def test_compile_payload_decodes_bytes_and_reuses_unchanged_plans(self):
+        content = create_flags_response(
+            [create_test_flag(flag_key="a"), create_test_flag(flag_key="b")]
+        ).content
+        compiler = DefinitionsCompiler()
+
+        first = compiler.compile_payload(content)
+        second = compiler.compile_payload(content)
+
+        assert set(first.flags) == {"a", "b"}
+        assert second.flags["a"] is first.flags["a"]
+        assert second.flags["b"] is first.flags["b"]
+
+    def test_diff_definitions_compares_reused_plans_by_identity(self):
+        compiler = DefinitionsCompiler()
+        first = compiler.compile_payload(
+            create_flags_response(
+                [create_test_flag(flag_key="a"), create_test_flag(flag_key="b")]
+            ).content
+        )
+        second = compiler.compile_payload(
+            create_flags_response(
+                [
+                    create_test_flag(flag_key="a"),
+                    create_test_flag(flag_key="b", rollout_percentage=10.0),
+                    create_test_flag(flag_key="c"),
+                ]
+            ).content
+        )._replace(version=2)
+
+        change = diff_definitions(first, second)
+
+        assert change == (2, {"c"}, set(), {"b"})
+        assert change.flag_keys == {"b", "c"}
+        assert diff_definitions(second, EMPTY_DEFINITIONS).removed == {"a", "b", "c"}
+
+    def test_key_filter_drops_flags_before_validation(self):
+        payload = {
+            "flags": [
+                create_test_flag(flag_key="checkout_v2").model_dump(),
+                create_test_flag(flag_key="search_ranking").model_dump(),
+                create_test_flag(flag_key="billing").model_dump(),
+                {"key": "broken_but_unused"},
+            ]
+        }
+        compiler = DefinitionsCompiler(flag_key_filter(["billing"], ["checkout_"]))
+
+        definitions = compiler.compile(payload)
+
+        assert set(definitions.flags) == {"checkout_v2", "billing"}
+
+    def test_require_flags_checks_the_payload_before_the_key_filter(self):
+        compiler = DefinitionsCompiler(flag_key_filter(["billing"], None))
+        payload = {"flags": [create_test_flag(flag_key="other").model_dump()]}
+
+        assert compiler.compile(payload, require_flags=True).flags == {}
+        with pytest.raises(ValueError, match="no flag definitions"):
+            compiler.compile({"flags": []}, require_flags=True)
+
+    def test_no_key_filter_without_keys_or_prefixes(self):
+        assert flag_key_filter(None, None) is None
+        assert flag_key_filter([], None)("anything") is False
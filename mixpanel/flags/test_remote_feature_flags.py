@@ -3,7 +3,7 @@ from __future__ import annotations
 import asyncio
 import threading
 from concurrent.futures import ThreadPoolExecutor
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import httpx
 import pytest
@@ -11,6 +11,12 @@ import respx
 
 from mixpanel.credentials import ServiceAccountCredentials
 
+from .metrics import (
+    EVALUATIONS,
+    REMOTE_CACHE_LOOKUPS,
+    REMOTE_REQUEST_DURATION,
+    REMOTE_REQUESTS,
+)
 from .remote_feature_flags import RemoteFeatureFlagsProvider
 from .types import (
     RemoteFlagsConfig,
@@ -377,6 +383,56 @@ class TestRemoteFeatureFlagsProviderSync:
         )
         self.mock_tracker.assert_not_called()
 
+    @respx.mock
+    def test_repeated_exposures_are_deduplicated_when_configured(self):
+        respx.get(ENDPOINT).mock(
+            return_value=create_success_response(
+                {
+                    "test_flag": SelectedVariant(
+                        variant_key="treatment", variant_value="treatment"
+                    )
+                }
+            )
+        )
+        config = RemoteFlagsConfig(exposure_dedup_ttl_in_seconds=60)
+        with RemoteFeatureFlagsProvider(
+            "test-token", config, "1.0.0", self.mock_tracker
+        ) as flags:
+            for _ in range(3):
+                flags.get_variant_value(
+                    "test_flag", "control", {"distinct_id": "user123"}
+                )
+            flags.get_variant_value("test_flag", "control", {"distinct_id": "other"})
+
+        assert self.mock_tracker.call_count == 2
+
+    @respx.mock
+    def test_records_evaluation_and_request_metrics_when_configured(self):
+        respx.get(ENDPOINT).mock(
+            side_effect=[
+                create_success_response(
+                    {"test_flag": SelectedVariant(variant_key="on", variant_value=True)}
+                ),
+                httpx.RequestError("Network error"),
+            ]
+        )
+        metrics = []
+        config = RemoteFlagsConfig(metrics_callback=metrics.append)
+        with RemoteFeatureFlagsProvider(
+            "test-token", config, "1.0.0", self.mock_tracker
+        ) as flags:
+            for _ in range(2):
+                flags.get_variant_value(
+                    "test_flag", "control", {"distinct_id": "user123"}
+                )
+
+        requests = [m.tags["result"] for m in metrics if m.name == REMOTE_REQUESTS]
+        assert requests == ["success", "error"]
+        assert [m.name for m in metrics].count(REMOTE_REQUEST_DURATION) == 1
+        evaluations = [m.tags for m in metrics if m.name == EVALUATIONS]
+        assert [tags["reason"] for tags in evaluations] == ["none", "BACKEND_ERROR"]
+        assert {tags["mode"] for tags in evaluations} == {"remote"}
+
     def test_default_exposure_runs_inline_on_calling_thread(self):
         """Smoke test: exposure_executor defaults to None, tracker runs inline."""
         called_on: list[threading.Thread] = []
@@ -551,6 +607,142 @@ class TestRemoteFeatureFlagsProviderSync:
         self.mock_tracker.assert_called_once()
 
 
+class TestResponseCache:
+    def setup_method(self):
+        self.mock_tracker = Mock()
+        self.metrics = []
+        config = RemoteFlagsConfig(
+            response_cache_max_entries=100,
+            response_cache_stale_if_error_in_seconds=300,
+            metrics_callback=self.metrics.append,
+        )
+        self._flags = RemoteFeatureFlagsProvider(
+            "test-token", config, "1.0.0", self.mock_tracker
+        )
+
+    def teardown_method(self):
+        self._flags.__exit__(None, None, None)
+
+    def cache_lookups(self) -> list[str]:
+        return [
+            m.tags["result"] for m in self.metrics if m.name == REMOTE_CACHE_LOOKUPS
+        ]
+
+    @respx.mock
+    def test_lookups_of_any_flag_are_answered_from_one_all_flags_response(self):
+        route = respx.get(ENDPOINT).mock(
+            return_value=create_success_response(
+                {
+                    "flag_a": SelectedVariant(variant_key="on", variant_value=True),
+                    "flag_b": SelectedVariant(variant_key="blue", variant_value="blue"),
+                }
+            )
+        )
+
+        first = self._flags.get_variant_value(
+            "flag_a", False, {"distinct_id": "user123", "plan": "pro"}
+        )
+        second = self._flags.get_variant_value(
+            "flag_b", "red", {"plan": "pro", "distinct_id": "user123"}
+        )
+        variants = self._flags.get_all_variants(
+            {"distinct_id": "user123", "plan": "pro"}
+        )
+
+        assert (first, second) == (True, "blue")
+        assert set(variants) == {"flag_a", "flag_b"}
+        assert route.call_count == 1
+        assert "flag_key" not in route.calls[0].request.url.params
+        assert self.cache_lookups() == ["miss", "hit", "hit"]
+        assert self.mock_tracker.call_count == 2
+
+    @respx.mock
+    def test_contexts_are_cached_separately_and_responses_expire(self):
+        route = respx.get(ENDPOINT).mock(
+            side_effect=lambda _request: create_success_response(
+                {"flag_a": SelectedVariant(variant_key="on", variant_value=True)}
+            )
+        )
+
+        with patch("mixpanel.flags.cache.time.monotonic", return_value=0.0):
+            self._flags.get_variant_value("flag_a", False, {"distinct_id": "a"})
+            self._flags.get_variant_value("flag_a", False, {"distinct_id": "b"})
+            self._flags.get_variant_value("flag_a", False, {"distinct_id": "a"})
+        with patch("mixpanel.flags.cache.time.monotonic", return_value=61.0):
+            self._flags.get_variant_value("flag_a", False, {"distinct_id": "a"})
+
+        assert route.call_count == 3
+
+    @respx.mock
+    def test_serves_stale_response_when_the_backend_fails(self):
+        respx.get(ENDPOINT).mock(
+            side_effect=[
+                create_success_response(
+                    {"flag_a": SelectedVariant(variant_key="on", variant_value=True)}
+                ),
+                httpx.ReadTimeout("timed out"),
+                httpx.Response(status_code=503),
+            ]
+        )
+        context = {"distinct_id": "user123"}
+
+        with patch("mixpanel.flags.cache.time.monotonic", return_value=0.0):
+            self._flags.get_variant_value("flag_a", False, context)
+        with patch("mixpanel.flags.cache.time.monotonic", return_value=120.0):
+            stale = self._flags.get_variant(
+                "flag_a", SelectedVariant(variant_value=None), context
+            )
+        with patch("mixpanel.flags.cache.time.monotonic", return_value=400.0):
+            failed = self._flags.get_variant(
+                "flag_a", SelectedVariant(variant_value=None), context
+            )
+
+        assert stale.variant_value is True
+        assert stale.variant_source == VariantSource.REMOTE
+        assert failed.variant_source == VariantSource.FALLBACK
+        assert self.cache_lookups() == ["miss", "stale"]
+
+    @respx.mock
+    def test_handed_out_variants_do_not_share_state_with_the_cache(self):
+        respx.get(ENDPOINT).mock(
+            return_value=create_success_response(
+                {
+                    "flag_a": SelectedVariant(
+                        variant_key="on", variant_value={"color": "red"}
+                    )
+                }
+            )
+        )
+        context = {"distinct_id": "user123"}
+
+        variant = self._flags.get_variant(
+            "flag_a", SelectedVariant(variant_value=None), context
+        )
+        variant.variant_key = "mutated"
+        variant.variant_value["color"] = "blue"
+        self._flags.get_all_variants(context)["flag_a"].variant_value["size"] = 1
+
+        again = self._flags.get_variant(
+            "flag_a", SelectedVariant(variant_value=None), context
+        )
+        assert (again.variant_key, again.variant_value) == ("on", {"color": "red"})
+
+    @respx.mock
+    @pytest.mark.asyncio
+    async def test_async_lookups_share_the_cache(self):
+        route = respx.get(ENDPOINT).mock(
+            return_value=create_success_response(
+                {"flag_a": SelectedVariant(variant_key="on", variant_value=True)}
+            )
+        )
+        context = {"distinct_id": "user123"}
+
+        assert await self._flags.aget_variant_value("flag_a", False, context) is True
+        assert set(await self._flags.aget_all_variants(context)) == {"flag_a"}
+        assert self._flags.get_variant_value("flag_a", False, context) is True
+        assert route.call_count == 1
+
+
 def test_remote_flags_with_service_account_credentials():
     """Test RemoteFeatureFlagsProvider uses service account credentials for auth."""
     config = RemoteFlagsConfig(
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json_logic
+import pytest
+
+from .rules import casefold_leaf_nodes, compile_rule, referenced_variables
+
+RULES = [
+    {"==": [{"var": "plan"}, "premium"]},
+    {"!=": [{"var": "plan"}, "premium"]},
+    {"===": [{"var": "age"}, 30]},
+    {">": [{"var": "age"}, 21]},
+    {"<=": [18, {"var": "age"}, 65]},
+    {"in": [{"var": "plan"}, ["premium", "enterprise"]]},
+    {"in": ["prem", {"var": "plan"}]},
+    {"in": [{"var": "tags"}, [["a"], "b"]]},
+    {"in": [{"var": "plan"}, 42]},
+    {
+        "and": [
+            {"in": [{"var": "country"}, ["us", "ca"]]},
+            {
+                "or": [
+                    {"==": [{"var": "plan"}, "premium"]},
+                    {">=": [{"var": "age"}, 40]},
+                ]
+            },
+        ]
+    },
+    {"and": [{"var": "plan"}, {"var": "country"}]},
+    {"or": [{"var": "missing_prop"}, {"var": "age"}]},
+    {"!": {"var": "flagged"}},
+    {"!!": [{"var": "plan"}]},
+    {"var": ["nested.tier", "default"]},
+    {"var": "list.1"},
+    {"if": [{"var": "flagged"}, "yes", {"==": [1, 1]}, "one", "no"]},
+    {"missing": ["plan", "unknown"]},
+    {"missing_some": [1, ["plan", "unknown"]]},
+    {"+": [{"var": "age"}, "2"]},
+    {"cat": ["tier-", {"var": "nested.tier"}]},
+    {"merge": [[1], {"var": "list"}]},
+    {"<": [1, 2]},
+    {"=oops=": [{"var": "plan"}, "premium"]},
+    {"==": [{"var": "plan"}, {}]},
+]
+
+DATA = [
+    {"plan": "premium", "country": "us", "age": 30},
+    {"plan": "basic", "country": "fr", "age": 45, "flagged": True},
+    {"plan": "enterprise", "country": "ca", "age": "50", "tags": ["a"]},
+    {"nested": {"tier": "gold"}, "list": [3, 4], "age": 17},
+    {"plan": None, "age": None},
+]
+
+
+def interpret(rule, data):
+    try:
+        return "ok", json_logic.jsonLogic(rule, data)
+    except Exception as exc:  # noqa: BLE001
+        return "error", type(exc)
+
+
+def evaluate(compiled, data):
+    try:
+        return "ok", compiled(data)
+    except Exception as exc:  # noqa: BLE001
+        return "error", type(exc)
+
+
+@pytest.mark.parametrize("rule", RULES)
+def test_compiled_rule_matches_interpreter(rule):
+    compiled = compile_rule(rule)
+
+    for data in DATA:
+        assert evaluate(compiled, data) == interpret(rule, data), data
+
+
+def test_compiled_rule_is_reusable_across_calls():
+    rule = casefold_leaf_nodes({"in": [{"var": "plan"}, ["Premium", "Gold"]]})
+    compiled = compile_rule(rule)
+
+    assert compiled({"plan": "premium"}) is True
+    assert compiled({"plan": "silver"}) is False
+    assert compiled({"plan": "gold"}) is True
+
+
+def test_casefold_leaf_nodes_keeps_operators():
+    rule = {"==": [{"var": "Plan"}, "PREMIUM"]}
+
+    assert casefold_leaf_nodes(rule) == {"==": [{"var": "plan"}, "premium"]}
+
+
+@pytest.mark.parametrize(
+    ("rule", "expected"),
+    [
+        ({"==": [{"var": "plan"}, "premium"]}, {"plan"}),
+        ({"and": [{">": [{"var": "age"}, 21]}, {"var": "user.tier"}]}, {"age", "user"}),
+        ({"var": []}, None),
+        ({"var": ["plan", {"var": "fallback"}]}, {"plan", "fallback"}),
+        ({"==": [1, 1]}, set()),
+        ({"var": {"cat": ["pl", "an"]}}, None),
+        ({"missing": ["plan"]}, None),
+    ],
+)
+def test_referenced_variables(rule, expected):
+    variables = referenced_variables(rule)
+
+    assert variables == (None if expected is None else frozenset(expected))
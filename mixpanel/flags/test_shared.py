@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import pytest
+
+from .shared import publish_shared_definitions, read_shared_definitions
+
+
+def test_publish_increments_version(tmp_path):
+    path = str(tmp_path / "flags.shm")
+
+    assert publish_shared_definitions(path, b'{"flags": []}') == 1
+    assert publish_shared_definitions(path, b'{"flags": [1]}') == 2
+
+    shared = read_shared_definitions(path)
+    assert shared is not None
+    assert shared.version == 2
+    assert shared.content == b'{"flags": [1]}'
+
+
+def test_read_skips_known_version(tmp_path):
+    path = str(tmp_path / "flags.shm")
+    version = publish_shared_definitions(path, b'{"flags": []}')
+
+    assert read_shared_definitions(path, known_version=version) is None
+
+
+def test_read_rejects_foreign_files(tmp_path):
+    path = tmp_path / "flags.shm"
+    path.write_bytes(b'{"flags": []}')
+
+    with pytest.raises(ValueError, match="Not a shared flag definitions file"):
+        read_shared_definitions(str(path))
+
+
+def test_publish_restarts_versions_over_foreign_files(tmp_path):
+    path = tmp_path / "flags.shm"
+    path.write_bytes(b"")
+
+    assert publish_shared_definitions(str(path), b"{}") == 1
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from .streaming import ServerSentEvent, ServerSentEventDecoder
+
+
+def decode(lines: list[str]) -> list[ServerSentEvent]:
+    decoder = ServerSentEventDecoder()
+    return [event for line in lines if (event := decoder.feed(line))]
+
+
+def test_joins_data_lines_until_blank_line():
+    events = decode(["event: put", 'data: {"flags":', "data: []}", ""])
+
+    assert events == [ServerSentEvent(event="put", data='{"flags":\n[]}')]
+
+
+def test_ignores_comments_and_events_without_data():
+    events = decode([": keep-alive", "", "event: ping", "", "data:x", ""])
+
+    assert events == [ServerSentEvent(event="message", data="x")]
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from .types import FallbackReason, SelectedVariant, VariantSource
+
+
+def test_as_fallback_copies_without_touching_the_original():
+    variant = SelectedVariant(variant_key="a", variant_value=1)
+
+    fallback = variant.as_fallback(FallbackReason.no_rollout_match())
+
+    assert fallback is not variant
+    assert fallback.variant_source == VariantSource.FALLBACK
+    assert fallback.fallback_reason == FallbackReason.no_rollout_match()
+    assert variant.variant_source is None
+    assert variant.fallback_reason is None
+    assert "fallback_reason" not in variant.model_fields_set
+    assert fallback.model_fields_set == {
+        "variant_key",
+        "variant_value",
+        "variant_source",
+        "fallback_reason",
+    }
+
+
+def test_with_source_clears_fallback_reason():
+    fallback = SelectedVariant(variant_value=1).as_fallback(
+        FallbackReason.flag_not_found()
+    )
+
+    variant = fallback.with_source(VariantSource.REMOTE)
+
+    assert variant.variant_source == VariantSource.REMOTE
+    assert variant.fallback_reason is None
+    assert (
+        variant.model_dump()
+        == SelectedVariant(
+            variant_value=1, variant_source=VariantSource.REMOTE
+        ).model_dump()
+    )
+
+
+def test_detached_copy_copies_container_values():
+    variant = SelectedVariant(variant_key="a", variant_value={"colors": ["red"]})
+
+    copied = variant.detached_copy()
+    copied.variant_value["colors"].append("blue")
+
+    assert variant.variant_value == {"colors": ["red"]}
+    assert copied.variant_key == "a"
+    assert copied.model_fields_set == variant.model_fields_set
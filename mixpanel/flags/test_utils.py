@@ -9,11 +9,16 @@ import httpx
 import pytest
 
 from .utils import (
+    MAX_POLLING_BACKOFF_IN_SECONDS,
     _log_tracker_future_exception,
     close_async_client_from_sync,
     dispatch_exposure,
+    encode_salt,
+    fnv1a64_state,
     generate_traceparent,
     normalized_hash,
+    normalized_hash_from_state,
+    polling_delay,
 )
 
 
@@ -42,6 +47,15 @@ class TestUtils:
             f"Expected hash of {expected_hash} for '{key}' with salt '{salt}', got {result}"
         )
 
+    @pytest.mark.parametrize("key", ["abc", "def", "", "ünïcødé-user"])
+    def test_resumed_hash_state_matches_normalized_hash(self, key):
+        state = fnv1a64_state(key)
+
+        for salt in ["variant", "flagrollout", "flagsalt0", ""]:
+            assert normalized_hash_from_state(state, encode_salt(salt)) == (
+                normalized_hash(key, salt)
+            )
+
     def test_dispatch_exposure_runs_inline_when_no_executor(self):
         tracker = MagicMock()
 
@@ -85,6 +99,22 @@ class TestUtils:
         ), "cancelled futures must not produce an error log"
 
 
+class TestPollingDelay:
+    def test_jitters_interval_after_success(self):
+        delays = {polling_delay(60, 0) for _ in range(50)}
+
+        assert all(54 <= delay <= 66 for delay in delays)
+        assert len(delays) > 1
+
+    def test_backs_off_exponentially_after_failures(self):
+        assert 60 <= polling_delay(60, 1) <= 120
+        assert 120 <= polling_delay(60, 2) <= 240
+
+    def test_backoff_is_capped(self):
+        cap = MAX_POLLING_BACKOFF_IN_SECONDS
+        assert cap / 2 <= polling_delay(60, 100) <= cap
+
+
 class TestCloseAsyncClientFromSync:
     # SDK-85: shutdown() and __exit__ need to close the AsyncClient
     # from sync context. Callers already inside a running event loop
@@ -1,8 +1,11 @@
+import copy
 from concurrent.futures import Executor
-from typing import Any, Literal, Optional
+from typing import Any, Callable, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from .metrics import Metric
+
 MIXPANEL_DEFAULT_API_ENDPOINT = "api.mixpanel.com"
 
 
@@ -15,15 +18,67 @@ class FlagsConfig(BaseModel):
     # evaluation does not block on the network round trip. None (default)
     # preserves the existing inline behavior.
     exposure_executor: Optional[Executor] = None
+    # Optional window during which repeated exposures of the same
+    # distinct_id to the same flag variant are tracked only once. None
+    # (default) tracks every exposure. At most exposure_dedup_max_entries
+    # recent exposures are remembered per provider.
+    exposure_dedup_ttl_in_seconds: Optional[float] = None
+    exposure_dedup_max_entries: int = 100_000
+    # Optional size of a queue from which a background thread sends
+    # exposure events in batches, so flag evaluation never waits on the
+    # network. Exposures arriving while the queue is full are dropped and
+    # counted. None (default) dispatches each exposure on its own.
+    exposure_queue_size: Optional[int] = None
+    exposure_batch_size: int = 50
+    exposure_flush_interval_in_seconds: float = 1.0
+    # Optional function receiving evaluation, definitions and request
+    # metrics (see mixpanel.flags.metrics), e.g. to forward them to
+    # Prometheus or StatsD. None (default) records no metrics.
+    metrics_callback: Optional[Callable[[Metric], None]] = None
 
 
 class LocalFlagsConfig(FlagsConfig):
     enable_polling: bool = True
     polling_interval_in_seconds: int = 60
+    # Optional path where the last successfully fetched definitions are
+    # written (atomically). On start they are loaded from it before the
+    # network fetch, so flags are served even if that fetch fails.
+    snapshot_path: Optional[str] = None
+    # Optional path to read definitions from instead of the API. The file is
+    # re-read on every poll in which its modification time or size changed.
+    definitions_file_path: Optional[str] = None
+    # Optional path of a memory-mapped file (e.g. under /dev/shm) through
+    # which processes on one host share definitions. The process with
+    # publish_shared_definitions=True fetches from the API and publishes;
+    # the others only re-read the file when its version changes.
+    shared_definitions_path: Optional[str] = None
+    publish_shared_definitions: bool = False
+    # Receive definition updates over a server-sent events stream instead
+    # of polling every polling_interval_in_seconds. While the stream is
+    # down, definitions are polled and the stream reconnects with backoff.
+    enable_streaming: bool = False
+    # Cache up to this many get_variant results, keyed on the flag, the
+    # context fields its rules read and the definitions version. Exposures
+    # are still tracked on cache hits. None disables the cache.
+    evaluation_cache_max_entries: Optional[int] = None
+    evaluation_cache_ttl_in_seconds: float = 300
+    # Optional allowlist of flag keys and/or key prefixes to load. Other
+    # flags are dropped before validation and evaluate as not found. The
+    # filter is also sent as the flag_keys and flag_key_prefixes query
+    # parameters, so servers supporting them can omit the other flags.
+    flag_keys: Optional[list[str]] = None
+    flag_key_prefixes: Optional[list[str]] = None
 
 
 class RemoteFlagsConfig(FlagsConfig):
-    pass
+    # Cache up to this many /flags responses, keyed on the context. With the
+    # cache enabled every request fetches all flags, so one response answers
+    # the lookups of any flag for the same context until it expires. A
+    # response up to response_cache_stale_if_error_in_seconds past expiry is
+    # served when the request for a new one fails. None disables the cache.
+    response_cache_max_entries: Optional[int] = None
+    response_cache_ttl_in_seconds: float = 60
+    response_cache_stale_if_error_in_seconds: float = 0
 
 
 class Variant(BaseModel):
@@ -146,18 +201,33 @@ class SelectedVariant(BaseModel):
 
         Clears fallback_reason — use as_fallback() if returning a fallback.
         """
-        return self.model_copy(
-            update={"variant_source": source, "fallback_reason": None}
-        )
+        return self._tagged_copy(source, None)
 
     def as_fallback(self, reason: FallbackReason) -> "SelectedVariant":
         """Return a copy of this variant tagged as a fallback with the given reason."""
-        return self.model_copy(
-            update={
-                "variant_source": VariantSource.FALLBACK,
-                "fallback_reason": reason,
-            }
-        )
+        return self._tagged_copy(VariantSource.FALLBACK, reason)
+
+    def detached_copy(self) -> "SelectedVariant":
+        """Return a copy that shares no mutable state with this variant.
+
+        Only dict and list values are deep-copied; other JSON values are
+        immutable.
+        """
+        copied = self.__copy__()
+        if isinstance(self.variant_value, (dict, list)):
+            copied.__dict__["variant_value"] = copy.deepcopy(self.variant_value)
+        return copied
+
+    def _tagged_copy(
+        self, source: str, reason: Optional[FallbackReason]
+    ) -> "SelectedVariant":
+        # Equivalent to model_copy(update=...) without its per-call update
+        # merging; both values are already valid.
+        copied = self.__copy__()
+        copied.__dict__["variant_source"] = source
+        copied.__dict__["fallback_reason"] = reason
+        copied.__pydantic_fields_set__.update(("variant_source", "fallback_reason"))
+        return copied
 
 
 class ExperimentationFlags(BaseModel):
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import functools
 import logging
+import os
+import random
+import tempfile
 import uuid
+from pathlib import Path
 from typing import TYPE_CHECKING, Any, Callable
 
 from asgiref.sync import async_to_sync
@@ -16,6 +22,12 @@ logger = logging.getLogger(__name__)
 
 EXPOSURE_EVENT = "$experiment_started"
 
+FNV1A64_OFFSET_BASIS = 0xCBF29CE484222325
+FNV1A64_PRIME = 0x100000001B3
+
+# Longest wait between polls while fetching definitions keeps failing.
+MAX_POLLING_BACKOFF_IN_SECONDS = 600
+
 
 def close_async_client_from_sync(client: httpx.AsyncClient) -> None:
     """SDK-85: close an ``httpx.AsyncClient`` from sync code.
@@ -55,22 +67,49 @@ def normalized_hash(key: str, salt: str) -> float:
     :param salt: Salt to add to the hash
     :return: Normalized hash value between 0.0 and 1.0
     """
-    hash_value = _fnv1a64(key.encode("utf-8") + salt.encode("utf-8"))
+    return normalized_hash_from_state(fnv1a64_state(key), encode_salt(salt))
+
+
+def fnv1a64_state(key: str) -> int:
+    """FNV-1a 64-bit state after hashing ``key``.
+
+    ``normalized_hash`` hashes the key bytes before the salt, so the state
+    can be computed once per context value and resumed for every salt with
+    ``normalized_hash_from_state``.
+
+    :param key: The key to hash
+    :return: Intermediate 64-bit hash state
+    """
+    return _fnv1a64(key.encode("utf-8"))
+
+
+def normalized_hash_from_state(state: int, salt: bytes) -> float:
+    """Finish a normalized hash from a state returned by ``fnv1a64_state``.
+
+    :param state: Hash state of the key
+    :param salt: UTF-8 encoded salt, see ``encode_salt``
+    :return: Normalized hash value between 0.0 and 1.0
+    """
+    hash_value = _fnv1a64(salt, state)
     return (hash_value % 100) / 100.0
 
 
-def _fnv1a64(data: bytes) -> int:
+@functools.lru_cache(maxsize=4096)
+def encode_salt(salt: str) -> bytes:
+    """UTF-8 encode a salt, caching the result for salts that repeat."""
+    return salt.encode("utf-8")
+
+
+def _fnv1a64(data: bytes, hash_value: int = FNV1A64_OFFSET_BASIS) -> int:
     """FNV-1a 64-bit hash function.
 
     :param data: Bytes to hash
+    :param hash_value: State to resume hashing from
     :return: 64-bit hash value
     """
-    fnv_prime = 0x100000001B3
-    hash_value = 0xCBF29CE484222325
-
     for _byte in data:
         hash_value ^= _byte
-        hash_value *= fnv_prime
+        hash_value *= FNV1A64_PRIME
         hash_value &= 0xFFFFFFFFFFFFFFFF  # Keep it 64-bit
 
     return hash_value
@@ -98,6 +137,60 @@ def prepare_common_query_params(
     return params
 
 
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff delay with jitter.
+
+    :param attempt: Number of consecutive failures so far, starting at 0
+    :param base: Delay after the first failure, before jitter
+    :param cap: Upper bound of the delay, before jitter
+    :return: A random delay between half and all of ``min(cap, base * 2**attempt)``
+    """
+    delay = min(cap, base * 2 ** min(attempt, 32))
+    return delay / 2 + random.uniform(0, delay / 2)  # noqa: S311 - not crypto
+
+
+def polling_delay(interval: float, consecutive_failures: int) -> float:
+    """Delay before the next poll of an endpoint.
+
+    After a success the interval is jittered by up to 10% either way, so
+    instances started together drift apart instead of polling in lockstep.
+    After failures the delay backs off exponentially from the interval, up
+    to ``MAX_POLLING_BACKOFF_IN_SECONDS``.
+
+    :param interval: The configured polling interval
+    :param consecutive_failures: Number of polls that failed in a row
+    :return: Seconds to wait before polling again
+    """
+    if consecutive_failures:
+        cap = max(interval, MAX_POLLING_BACKOFF_IN_SECONDS)
+        return backoff_delay(consecutive_failures, interval, cap)
+    return interval * random.uniform(0.9, 1.1)  # noqa: S311 - not crypto
+
+
+def write_file_atomically(path: str, content: bytes) -> None:
+    """Replace the file at ``path`` with ``content``.
+
+    The content is written to a temporary file in the same directory and
+    renamed over ``path``, so readers see either the old or the new file,
+    never a partial one.
+    """
+    target = Path(path)
+    fd, temp_name = tempfile.mkstemp(
+        dir=target.resolve().parent, prefix=".mixpanel-", suffix=".tmp"
+    )
+    temp_path = Path(temp_name)
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        temp_path.replace(target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            temp_path.unlink()
+        raise
+
+
 def dispatch_exposure(
     tracker: Callable,
     executor: Executor | None,
@@ -155,6 +155,36 @@ class TestMixpanelTracking(TestMixpanelBase):
             )
         ]
 
+    def test_track_batch_sends_events_one_by_one_to_custom_consumer(self):
+        self.mp._track_batch(
+            "exposure", [("a", {"flag": 1, "time": 1000.0}), ("b", None)]
+        )
+
+        assert [
+            entry[1]["properties"]["distinct_id"] for entry in self.consumer.log
+        ] == [
+            "a",
+            "b",
+        ]
+        assert self.consumer.log[0][1]["event"] == "exposure"
+        assert self.consumer.log[0][1]["properties"]["flag"] == 1
+        # Queued exposures keep the time they were recorded at.
+        assert self.consumer.log[0][1]["properties"]["time"] == 1000.0
+        assert self.consumer.log[1][1]["properties"]["time"] == self.mp._now()
+
+    def test_track_batch_sends_arrays_to_default_consumer(self):
+        mp = mixpanel.Mixpanel(self.TOKEN)
+        events = [(f"user{index}", {"index": index}) for index in range(120)]
+
+        with patch.object(mp._consumer, "send") as send:
+            mp._track_batch("exposure", events)
+
+        batches = [json.loads(call.args[1]) for call in send.call_args_list]
+        assert [len(batch) for batch in batches] == [50, 50, 20]
+        assert {call.args[0] for call in send.call_args_list} == {"events"}
+        assert batches[2][-1]["properties"]["distinct_id"] == "user119"
+        assert batches[2][-1]["properties"]["token"] == self.TOKEN
+
 
 class TestMixpanelPeople(TestMixpanelBase):
     def test_people_set(self):